@@ -2,18 +2,38 @@ import sys
 import time
 from PyQt5.QtWidgets import (
     QApplication, QDialog, QLabel, QLineEdit, QPushButton, QVBoxLayout, QHBoxLayout,
-    QFrame, QTextEdit, QWidget, QGridLayout, QInputDialog, QCheckBox,
-    QDialogButtonBox, QSpacerItem, QSizePolicy, QLayout
+    QFrame, QWidget, QGridLayout, QInputDialog, QCheckBox,
+    QDialogButtonBox, QSpacerItem, QSizePolicy, QLayout, QComboBox, QPlainTextEdit, QFileDialog
 )
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QTimer, QObject, pyqtSignal
+from PyQt5.QtGui import QFontDatabase
 import pyqtgraph as pg
 import pyvisa
 import logging
 import threading
+import concurrent.futures
 import csv
+import math
 import os
 import datetime
 from PIL import Image
+from screenshot import ScreenshotCapture, SCREENSHOT_FORMATS
+from scpi import format_channel_list
+from scpi_stats import InstrumentedSession, ScpiStats
+from scpi_trace import DEFAULT_EXTENSION, RecordingSession, SessionRecorder
+from output_console import OutputConsole, infer_level, start_queued_file_logging, stop_queued_file_logging
+from view_model import ViewModel
+from live_dashboard import LiveDashboard, SampleBuffer
+from sample_clock import SampleClock, timed_query
+from session_browser import SessionBrowser
+from acquisition import AcquisitionError, attach_or_start, open_instrument, open_log_sink
+from session_db import SessionDatabase
+from api_server import StreamServer
+from profiles import ProfileError, ProfileStore
+from connection_supervisor import ConnectionSupervisor
+from profiling import DEFAULT_STALL_MS, ProfiledSession, Profiler
+from sweep import SweepEngine, write_csv
+from sweep_window import SweepWindow
 
 
 class ClickableLabel(QLabel):
@@ -29,17 +49,52 @@ class ClickableLabel(QLabel):
         self.parent().edit_channel_name(self.channel)
 
 
+class MainThreadInvoker(QObject):
+    # Lets worker threads hand callables back to the GUI thread
+    invoke = pyqtSignal(object)
+
+    def __init__(self):
+        super(MainThreadInvoker, self).__init__()
+        self.invoke.connect(lambda fn: fn())
+
+    def call(self, fn, *args):
+        self.invoke.emit(lambda: fn(*args))
+
+
 class PowerSupplyControlPanel:
     def __init__(self, dialog):
-        logging.basicConfig(filename='power_supply.log', level=logging.INFO)
+        start_queued_file_logging('power_supply.log')  # File writes happen on a background thread
         self.logger = logging.getLogger(__name__)
         self.dialog = dialog
-        self.graph_dialogs = {}
-        self.update_timers = {}  # Store timers separately for each graph window
-        self.last_markers = {}  # Store last markers separately for each channel
+        self.samples = {i: SampleBuffer() for i in range(1, 5)}  # In-memory history shown by the dashboard
+        self.dashboard = None  # Created on first use by show_live_graph
+        self.session_browsers = []  # Open History windows
+        self.sweep_window = None  # Created on first use by show_sweep_window
+        self.unrestored_sweep = None  # SweepEngine whose failed sweep could not restore the outputs
         self.dialog.setWindowTitle("Control Panel N6705B")
         self.instrument = None
-        self.rm = pyvisa.ResourceManager()  # Resource manager to handle VISA instruments
+        self.instrument_lock = threading.RLock()  # Serializes background transfers with the poll timers
+        self.gui_invoker = MainThreadInvoker()
+        # Slot timing and event-loop stall detection; KEYSIGHT_PROFILE=1 or the Profiler dialog turns it on
+        profile_mode = os.environ.get("KEYSIGHT_PROFILE", "")
+        self.profiler = Profiler(enabled=profile_mode not in ("", "0"), on_stall=self.on_event_loop_stall,
+                                 stall_ms=float(os.environ.get("KEYSIGHT_PROFILE_STALL_MS", DEFAULT_STALL_MS)))
+        self.view = ViewModel()  # Change-only widget updates, applied at most once per frame
+        self.protection_status = {}  # Last STAT:QUES:COND? value per channel
+        self.screenshots = ScreenshotCapture(lambda: self.instrument, self.instrument_lock)
+        # SCPI traffic statistics; off unless KEYSIGHT_SCPI_STATS=1 or enabled in the Stats dialog
+        self.scpi_stats = ScpiStats(enabled=os.environ.get("KEYSIGHT_SCPI_STATS") == "1")
+        self.session_recorder = SessionRecorder()  # SCPI trace recording, toggled by the REC button
+        # Resource manager to handle VISA instruments; KEYSIGHT_VISA_LIBRARY selects e.g. '@py' or 'profile.yaml@sim'
+        self.rm = pyvisa.ResourceManager(os.environ.get("KEYSIGHT_VISA_LIBRARY", ""))
+        self.clock = SampleClock()  # Timestamps for this session's samples
+        # KEYSIGHT_ACQUISITION=process polls and logs in a separate process that outlives a GUI crash
+        self.process_acquisition = os.environ.get("KEYSIGHT_ACQUISITION") == "process"
+        self.acquisition = None  # AcquisitionClient while connected in process mode
+        self.ring_seq = 0  # Next acquisition ring record to display
+        # Reconnects a dead session in the background; the acquisition process does this for itself
+        self.supervisor = ConnectionSupervisor(None, self.instrument_lock, now=self.clock.now,
+                                               on_lost=self.on_connection_lost, on_restored=self.on_connection_restored)
         self.csv_filename = "power_supply_data.csv"
         self.initialize_csv()
 
@@ -61,14 +116,25 @@ class PowerSupplyControlPanel:
         self.channel_frames = {}
 
         self.setup_ui()
+        if self.api_server is not None:
+            # Console only: add_to_output would also write the token to power_supply.log
+            self.output_window.post(f"API server on port {self.api_server.port}; "
+                                    f"POST /control needs 'Authorization: Bearer {self.api_server.token}'")
+        self.profiler.attach(self.view.frame_timer, "view.flush", self.view.flush)
+        self.profiler.attach(self.output_window.flush_timer, "console.flush", self.output_window.flush)
         self.timer = QTimer(self.dialog)
-        self.timer.timeout.connect(self.update_live_data)
+        self.timer.timeout.connect(self.profiler.wrap("update_live_data", self.update_live_data))
         self.timer.start(1000)  # Update every second
 
         self.protection_status_timer = QTimer(self.dialog)
-        self.protection_status_timer.timeout.connect(self.check_protection_statuses)
+        self.protection_status_timer.timeout.connect(
+            self.profiler.wrap("check_protection_statuses", self.check_protection_statuses))
         self.protection_status_timer.start(15000)  # Check every 15 seconds
 
+        self.heartbeat_timer = QTimer(self.dialog)
+        self.heartbeat_timer.timeout.connect(self.supervisor.heartbeat)  # Probes idle sessions off the GUI thread
+        self.heartbeat_timer.start(5000)
+
         # Thread control dictionary to manage monitoring threads
         self.thread_control = {}
         self.monitoring_threads = {}
@@ -76,12 +142,9 @@ class PowerSupplyControlPanel:
         # Start monitoring threads for each channel
         # Monitoring threads are now started after channels are selected and instrument is connected
 
-        # Create a CSV file to store the data
-        self.csv_filename = "power_supply_data.csv"
-        with open(self.csv_filename, mode='w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(["Time", "Voltage", "Current"])  # Write header
         QTimer.singleShot(100, self.toggle_channels_button.click)
+        if profile_mode in ("cprofile", "sample"):
+            self.start_profile_capture(profile_mode, float(os.environ.get("KEYSIGHT_PROFILE_SECONDS", 30)))
 
         QApplication.instance().aboutToQuit.connect(self.cleanup_on_exit)  # Connect cleanup function
 
@@ -128,12 +191,20 @@ class PowerSupplyControlPanel:
             self.add_to_output("Instrument is not connected.")
             return
 
-        for channel in self.selected_channels:
-            try:
-                status = int(self.instrument.query(f"STAT:QUES:COND? (@{channel})").strip())
-                self.update_protection_status_ui(channel, status)
-            except Exception as e:
-                self.add_to_output(f"Failed to check protection statuses for channel {channel}: {str(e)}")
+        # Skip this check rather than block the GUI while a background transfer owns the session
+        if not self.instrument_lock.acquire(blocking=False):
+            return
+        try:
+            for channel in self.selected_channels:
+                try:
+                    status = int(self.instrument.query(f"STAT:QUES:COND? (@{channel})").strip())
+                    self.update_protection_status_ui(channel, status)
+                except Exception as e:
+                    if not self.supervisor.available():
+                        break
+                    self.add_to_output(f"Failed to check protection statuses for channel {channel}: {str(e)}")
+        finally:
+            self.instrument_lock.release()
 
     def update_indicator_ui(self, channel, message, color):
         # This function updates the UI based on the status and the color
@@ -143,38 +214,114 @@ class PowerSupplyControlPanel:
             self.channel_settings[channel]['status_label'].setText(message)
 
     def update_protection_status_ui(self, channel, status):
-        # Initial reset of indicators to green
-        self.channel_settings[channel]['ovp_indicator'].setStyleSheet("background-color: green;")
-        self.channel_settings[channel]['ocp_indicator'].setStyleSheet("background-color: green;")
-
         # Check specific bits for OVP and OCP
-        if status & 1:  # Bit for OVP
-            self.channel_settings[channel]['ovp_indicator'].setStyleSheet("background-color: red;")
-            self.add_to_output(f"Channel {channel} protection status updated with code: {status}")
-        if status & 2:  # Bit for OCP
-            self.channel_settings[channel]['ocp_indicator'].setStyleSheet("background-color: red;")
+        self.view.set_indicator(self.channel_settings[channel]['ovp_indicator'], "red" if status & 1 else "green")
+        self.view.set_indicator(self.channel_settings[channel]['ocp_indicator'], "red" if status & 2 else "green")
 
-            # Log the status for debug
-            self.add_to_output(f"Channel {channel} protection status updated with code: {status}")
+        # Log only when the protection state actually changes
+        if self.protection_status.get(channel, 0) != status:
+            self.record_event("protection", channel, f"STAT:QUES:COND {status}")
+            if status & 3:
+                self.add_to_output(f"Channel {channel} protection status updated with code: {status}")
+        self.protection_status[channel] = status
 
     def close_graph(self, channel):
-        if channel in self.graph_dialogs:
-            self.graph_dialogs[channel].close()
-            del self.graph_dialogs[channel]
+        if self.dashboard is not None:
+            self.dashboard.set_channel_visible(channel, False)
 
     def initialize_csv(self):
-        # Initialize CSV file with headers if it does not exist
+        # Every logged sample goes to each sink; in process mode the acquisition process writes the data log
+        self.log_sinks = [] if self.process_acquisition else [open_log_sink(self.csv_filename, self.clock.header())]
+        # KEYSIGHT_SESSION_DB=<file> also keeps samples, settings and events in SQLite across runs
+        self.session_db = None
+        db_path = os.environ.get("KEYSIGHT_SESSION_DB")
+        if db_path:
+            self.session_db = SessionDatabase(db_path, self.clock, on_error=self.on_session_db_error)
+            self.log_sinks.append(self.session_db)
+        # KEYSIGHT_API_PORT=<port> serves snapshots, control and live streams to local clients,
+        # all fed from this panel's single acquisition loop
+        self.api_server = None
+        api_port = os.environ.get("KEYSIGHT_API_PORT")
+        if api_port:
+            try:
+                self.api_server = StreamServer(os.environ.get("KEYSIGHT_API_HOST", "127.0.0.1"), int(api_port),
+                                               snapshot=self.api_state, control=self.remote_control,
+                                               token=os.environ.get("KEYSIGHT_API_TOKEN")).start()
+                self.log_sinks.append(self.api_server)
+                self.logger.info(f"API server listening on port {self.api_server.port}")
+            except (OSError, ValueError) as e:
+                self.logger.error(f"API server not started: {e}")
+
+    def api_state(self):
+        # Called on the API server thread; only reads plain attributes
+        return {
+            "connected": self.instrument is not None,
+            "selected_channels": list(self.selected_channels),
+            "names": dict(self.channel_names),
+        }
+
+    def remote_control(self, command):
+        # Called from the API server's worker threads; the command runs on the GUI thread like a button press
+        future = concurrent.futures.Future()
+
+        def run():
+            try:
+                future.set_result(self.apply_remote_command(command))
+            except Exception as e:
+                future.set_exception(e)
+        self.gui_invoker.call(run)
+        return future.result(timeout=30)
+
+    def apply_remote_command(self, command):
+        if self.instrument is None:
+            raise ValueError("Instrument is not connected")
         try:
-            with open(self.csv_filename, 'x',
-                      newline='') as file:  # 'x' mode for creating and writing; fails if file exists
-                writer = csv.writer(file)
-                writer.writerow(["Channel", "Time", "Voltage", "Current"])  # Writing header with channel included
-        except FileExistsError:
-            pass  # File already exists, headers should already be there
+            channel = int(command["channel"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("'channel' must be a channel number") from None
+        if channel not in self.selected_channels:
+            raise ValueError(f"Channel {channel} is not selected")
+        output = str(command.get("output", "")).upper()
+        if output not in ("", "ON", "OFF"):
+            raise ValueError("'output' must be ON or OFF")
+        settings = {}
+        for setting, unit in (("voltage", "VOLT"), ("current", "CURR")):
+            if setting in command:
+                try:
+                    settings[setting] = (unit, float(command[setting]))
+                except (TypeError, ValueError):
+                    raise ValueError(f"'{setting}' must be a number") from None
+
+        applied = {}
+        with self.instrument_lock:
+            for setting, (unit, value) in settings.items():
+                self.instrument.write(f"{unit} {value}, (@{channel})")
+                self.record_setting(channel, setting, value)
+                applied[setting] = value
+            if output:
+                self.instrument.write(f"OUTP {output},(@{channel})")
+                self.update_ui_channel_status(channel, output)
+                self.record_event("output", channel, output)
+                applied["output"] = output
+        self.add_to_output(f"Remote control, Channel {channel}: {applied}")
+        return {"channel": channel, "applied": applied}
+
+    def on_session_db_error(self, error, rows):
+        # From the database writer thread
+        self.add_to_output(f"Session database write failed, {rows} rows not stored: {error}")
+
+    def record_event(self, kind, channel=None, detail=None):
+        if self.session_db is not None:
+            self.session_db.log_event(kind, channel, detail)
+
+    def record_setting(self, channel, setting, value):
+        if self.session_db is not None:
+            self.session_db.log_channel_config(channel, setting, value)
 
     def setup_ui(self):
         self.dialog_layout = QVBoxLayout(self.dialog)
         self.setup_network_controls()
+        self.setup_profile_controls()
         self.setup_channel_controls()  # This should create self.channel_frames
         self.load_channel_names()
         self.setup_output_window()
@@ -248,6 +395,8 @@ class PowerSupplyControlPanel:
         self.channel_names[channel] = new_name
         # Update the label in the UI
         self.channel_labels[channel].setText(new_name)
+        if channel.startswith("CH"):
+            self.record_setting(int(channel[2:]), "name", new_name)
         # Write the updated mapping back to the file
         self.save_channel_names()
 
@@ -350,12 +499,12 @@ class PowerSupplyControlPanel:
         else:
             return None, []
 
-    def add_to_output(self, message):
-        self.output_window.setMaximumHeight(50)  # Adjust the height value as needed
-        self.output_window.setFixedSize(625, 200)  # Adjust the width and height values as needed
-        self.output_window.append(message)
-        # Log the message
-        self.logger.info(message)
+    def add_to_output(self, message, level=None):
+        # Safe from any thread: the console batches messages and flushes them on the GUI thread
+        if level is None:
+            level = infer_level(message)
+        self.output_window.post(message, level)
+        self.logger.log(level, message)
 
     def turn_channel_on(self, channel):
         if not self.instrument:
@@ -436,17 +585,34 @@ class PowerSupplyControlPanel:
         self.idn_button = QPushButton("IDN", self.dialog)
         self.rst_button = QPushButton("RST", self.dialog)
         self.fetch_button = QPushButton("Fetch", self.dialog)
+        self.screenshot_format_combo = QComboBox(self.dialog)  # Screen dump image format
+        self.screenshot_format_combo.addItems(SCREENSHOT_FORMATS)
+        self.auto_fetch_button = QPushButton("Auto", self.dialog)  # Periodic screenshot capture
+        self.auto_fetch_button.setCheckable(True)
         self.error_button = QPushButton("ERROR?", self.dialog)  # Button for querying errors
         self.clear_error_button = QPushButton("CLR", self.dialog)  # Button for clearing errors
+        self.stats_button = QPushButton("Stats", self.dialog)  # SCPI traffic statistics
+        self.profile_button = QPushButton("Profiler", self.dialog)  # Slot timing, stalls and captures
+        self.record_button = QPushButton("REC", self.dialog)  # Record the SCPI session to a trace file
+        self.record_button.setCheckable(True)
+        self.history_button = QPushButton("History", self.dialog)  # Browse past session logs
+        self.sweep_button = QPushButton("Sweep", self.dialog)  # List-driven I-V characterization
 
         # Connect button signals to the appropriate methods
         self.fetch_button.clicked.connect(self.fetch_and_display_image)
+        self.screenshot_format_combo.currentTextChanged.connect(self.screenshots.set_format)
+        self.auto_fetch_button.toggled.connect(self.toggle_periodic_capture)
         self.connect_button.clicked.connect(self.connect_to_instrument)
         self.disconnect_button.clicked.connect(self.disconnect_instrument)
         self.idn_button.clicked.connect(self.query_idn)
         self.rst_button.clicked.connect(self.query_rst)
         self.error_button.clicked.connect(self.query_errors)  # Method to handle error query
         self.clear_error_button.clicked.connect(self.clear_errors)  # Method to clear errors
+        self.stats_button.clicked.connect(self.show_scpi_stats)
+        self.profile_button.clicked.connect(self.show_profiler)
+        self.record_button.toggled.connect(self.toggle_recording)
+        self.history_button.clicked.connect(self.open_session_browser)
+        self.sweep_button.clicked.connect(self.show_sweep_window)
 
         # Add buttons to the layout
         self.ip_button_layout.addWidget(self.connect_button)
@@ -454,10 +620,85 @@ class PowerSupplyControlPanel:
         self.ip_button_layout.addWidget(self.idn_button)
         self.ip_button_layout.addWidget(self.rst_button)
         self.ip_button_layout.addWidget(self.fetch_button)
+        self.ip_button_layout.addWidget(self.screenshot_format_combo)
+        self.ip_button_layout.addWidget(self.auto_fetch_button)
         self.ip_button_layout.addWidget(self.error_button)
         self.ip_button_layout.addWidget(self.clear_error_button)
+        self.ip_button_layout.addWidget(self.stats_button)
+        self.ip_button_layout.addWidget(self.profile_button)
+        self.ip_button_layout.addWidget(self.record_button)
+        self.ip_button_layout.addWidget(self.history_button)
+        self.ip_button_layout.addWidget(self.sweep_button)
         self.dialog_layout.addLayout(self.ip_button_layout)
 
+    def setup_profile_controls(self):
+        self.profiles = ProfileStore()  # Named setups, restored with *RCL or one batched write
+        layout = QHBoxLayout()
+        layout.addWidget(QLabel("Profile:", self.dialog))
+        self.profile_combo = QComboBox(self.dialog)
+        self.profile_combo.addItems(self.profiles.names())
+        self.save_profile_button = QPushButton("Save", self.dialog)
+        self.restore_profile_button = QPushButton("Restore", self.dialog)
+        self.delete_profile_button = QPushButton("Delete", self.dialog)
+        self.save_profile_button.clicked.connect(self.save_profile)
+        self.restore_profile_button.clicked.connect(self.restore_profile)
+        self.delete_profile_button.clicked.connect(self.delete_profile)
+        layout.addWidget(self.profile_combo, 1)
+        layout.addWidget(self.save_profile_button)
+        layout.addWidget(self.restore_profile_button)
+        layout.addWidget(self.delete_profile_button)
+        self.dialog_layout.addLayout(layout)
+
+    def save_profile(self):
+        if not self.instrument:
+            self.add_to_output("Instrument is not connected.")
+            return
+        name, ok = QInputDialog.getText(self.dialog, "Save Profile", "Profile name:",
+                                        text=self.profile_combo.currentText())
+        name = name.strip()
+        if not ok or not name:
+            return
+        try:
+            with self.instrument_lock:
+                profile = self.profiles.capture(self.instrument, name, self.selected_channels)
+        except (pyvisa.VisaIOError, ProfileError, OSError, ValueError) as e:
+            self.add_to_output(f"Error saving profile {name}: {e}")
+            return
+        if self.profile_combo.findText(name) < 0:
+            self.profile_combo.addItem(name)
+        self.profile_combo.setCurrentText(name)
+        slot = f"state slot {profile['slot']}" if profile["slot"] else "no free state slot"
+        self.add_to_output(f"Saved profile {name} ({slot})")
+
+    def restore_profile(self):
+        name = self.profile_combo.currentText()
+        if not self.instrument or not name:
+            self.add_to_output("Instrument is not connected." if name else "No profile selected.")
+            return
+        try:
+            with self.instrument_lock:
+                method, elapsed = self.profiles.restore(self.instrument, name)
+        except (pyvisa.VisaIOError, ProfileError, ValueError) as e:
+            self.add_to_output(f"Error restoring profile {name}: {e}")
+            return
+        self.add_to_output(f"Restored profile {name} via {method} in {elapsed * 1000:.0f} ms")
+        self.record_event("profile", None, f"{name} ({method})")
+        for channel, settings in self.profiles.get(name)["state"].items():
+            if channel not in self.channel_settings:
+                continue
+            for setting, entry in (("voltage", "voltage_entry"), ("current", "current_entry"), ("slew", "slew_entry")):
+                self.channel_settings[channel][entry].setText(f"{settings[setting]:g}")
+                self.record_setting(channel, setting, settings[setting])
+            self.update_ui_channel_status(channel, "ON" if settings["output"] else "OFF")
+
+    def delete_profile(self):
+        name = self.profile_combo.currentText()
+        if not name:
+            return
+        self.profiles.delete(name)
+        self.profile_combo.removeItem(self.profile_combo.currentIndex())
+        self.add_to_output(f"Deleted profile {name}")
+
     def query_errors(self):
         if not self.instrument:
             self.add_to_output("Instrument is not connected.")
@@ -466,11 +707,12 @@ class PowerSupplyControlPanel:
         try:
             while True:  # Keep reading errors until the queue is empty
                 error_message = self.instrument.query("SYST:ERR?").strip()
-                self.add_to_output(f"Error Message: {error_message}")
 
                 # Check if the error queue is empty
                 if error_message.startswith("+0") or "+0," in error_message:
+                    self.add_to_output(f"Error Message: {error_message}", logging.INFO)
                     break  # Exit the loop if "No error" message is found
+                self.add_to_output(f"Error Message: {error_message}", logging.WARNING)
                 # Optional: Add a delay to prevent flooding the communication
                 time.sleep(0.1)
         except Exception as e:
@@ -487,36 +729,273 @@ class PowerSupplyControlPanel:
         except Exception as e:
             self.add_to_output(f"Error clearing errors: {str(e)}")
 
-    def fetch_and_display_image(self):
+    def show_scpi_stats(self):
+        dialog = QDialog(self.dialog)
+        dialog.setWindowTitle("SCPI Statistics")
+        layout = QVBoxLayout(dialog)
+
+        table = QPlainTextEdit()
+        table.setReadOnly(True)
+        table.setLineWrapMode(QPlainTextEdit.NoWrap)
+        table.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        layout.addWidget(table)
+
+        enabled_checkbox = QCheckBox("Collect statistics")
+        enabled_checkbox.setChecked(self.scpi_stats.enabled)
+        reset_button = QPushButton("Reset")
+        save_button = QPushButton("Save JSON...")
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(enabled_checkbox)
+        button_layout.addWidget(reset_button)
+        button_layout.addWidget(save_button)
+        layout.addLayout(button_layout)
+
+        def refresh():
+            table.setPlainText(self.scpi_stats.format_table())
+
+        def set_enabled(enabled):
+            self.scpi_stats.enabled = enabled
+            refresh()
+
+        def reset():
+            self.scpi_stats.reset()
+            refresh()
+
+        def save():
+            path, _ = QFileDialog.getSaveFileName(dialog, "Save SCPI Statistics", "scpi_stats.json", "JSON (*.json)")
+            if path:
+                with open(path, "w") as file:
+                    file.write(self.scpi_stats.to_json())
+                self.add_to_output(f"SCPI statistics saved to {path}")
+
+        enabled_checkbox.toggled.connect(set_enabled)
+        reset_button.clicked.connect(reset)
+        save_button.clicked.connect(save)
+
+        # Refresh while the dialog is open
+        refresh_timer = QTimer(dialog)
+        refresh_timer.timeout.connect(refresh)
+        refresh_timer.start(1000)
+        refresh()
+
+        dialog.resize(760, 360)
+        dialog.exec_()
+        refresh_timer.stop()
+
+    def show_profiler(self):
+        dialog = QDialog(self.dialog)
+        dialog.setWindowTitle("Profiler")
+        layout = QVBoxLayout(dialog)
+
+        table = QPlainTextEdit()
+        table.setReadOnly(True)
+        table.setLineWrapMode(QPlainTextEdit.NoWrap)
+        table.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        layout.addWidget(table)
+
+        enabled_checkbox = QCheckBox("Time slots and detect stalls")
+        enabled_checkbox.setChecked(self.profiler.enabled)
+        reset_button = QPushButton("Reset")
+        save_button = QPushButton("Save Report...")
+        mode_combo = QComboBox()
+        mode_combo.addItem("cProfile GUI thread", "cprofile")
+        mode_combo.addItem("Sample all threads", "sample")
+        seconds_combo = QComboBox()
+        seconds_combo.addItems(["5 s", "10 s", "30 s", "60 s"])
+        capture_button = QPushButton("Capture")
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(enabled_checkbox)
+        button_layout.addWidget(reset_button)
+        button_layout.addWidget(save_button)
+        button_layout.addStretch()
+        button_layout.addWidget(mode_combo)
+        button_layout.addWidget(seconds_combo)
+        button_layout.addWidget(capture_button)
+        layout.addLayout(button_layout)
+
+        def refresh():
+            table.setPlainText(self.profiler.format_table())
+            capture_button.setEnabled(self.profiler.capture is None)
+
+        def set_enabled(enabled):
+            self.profiler.set_enabled(enabled)
+            refresh()
+
+        def reset():
+            self.profiler.reset()
+            refresh()
+
+        def save():
+            path, _ = QFileDialog.getSaveFileName(dialog, "Save Profiler Report", "profile_report.json",
+                                                  "JSON (*.json)")
+            if path:
+                with open(path, "w") as file:
+                    file.write(self.profiler.to_json())
+                self.add_to_output(f"Profiler report saved to {path}")
+
+        def capture():
+            self.start_profile_capture(mode_combo.currentData(), float(seconds_combo.currentText().split()[0]))
+            refresh()
+
+        enabled_checkbox.toggled.connect(set_enabled)
+        reset_button.clicked.connect(reset)
+        save_button.clicked.connect(save)
+        capture_button.clicked.connect(capture)
+
+        # Refresh while the dialog is open
+        refresh_timer = QTimer(dialog)
+        refresh_timer.timeout.connect(refresh)
+        refresh_timer.start(1000)
+        refresh()
+
+        dialog.resize(820, 420)
+        dialog.exec_()
+        refresh_timer.stop()
+
+    def start_profile_capture(self, mode, seconds):
+        extension = ".prof" if mode == "cprofile" else ".folded"
+        path = "profile_" + datetime.datetime.now().strftime("%Y%m%d_%H%M%S") + extension
         try:
-            self.instrument.write(':HCOPy:SDUMp:DATA:FORM GIF')
-            time.sleep(2)
-            self.instrument.write(':HCOPy:SDUMp:DATA?')
-            time.sleep(2)
-
-            response = bytearray()
-            while True:
-                chunk = self.instrument.read_raw()
-                if not chunk:  # Check if chunk is empty (possibly end of data)
-                    break
-                response.extend(chunk)
-                if b'\n' in chunk:  # Assuming newline denotes the end of the binary data
-                    break
-
-            # Remove the initial '#0' if it is part of the protocol and not part of the actual image data
-            if response.startswith(b'#0'):
-                response = response[2:]  # adjust the slice if more bytes need to be removed
-
-            # Save the corrected binary data
-            image_path = "instrument_display.gif"
-            with open(image_path, "wb") as file:
-                file.write(response)
-
-            print("Display image has been fetched and saved.")
-            self.display_image(image_path)
+            self.profiler.start_capture(mode, seconds, path, self.on_profile_captured)
+        except ValueError as e:
+            self.add_to_output(str(e))
+            return
+        self.add_to_output(f"Profiling for {seconds:g} s ({mode})")
+
+    def on_profile_captured(self, path, summary):
+        self.add_to_output(f"Profiler capture saved to {path}")
+        self.logger.info(f"Profiler capture summary for {path}:\n{summary}")
+
+    def on_event_loop_stall(self, stall):
+        where = f" in {stall['slot']}" if stall["slot"] else ""
+        self.add_to_output(f"Event loop stalled for {stall['duration_ms']:.0f} ms{where}", logging.WARNING)
+        if stall["stack"]:
+            self.logger.warning("GUI thread during the stall:\n" + "\n".join(stall["stack"]))
+
+    def toggle_recording(self, enabled):
+        if not enabled:
+            writer = self.session_recorder.stop()
+            if writer is not None:
+                self.add_to_output(f"Stopped recording: {writer.records} records saved to {writer.path}")
+            return
 
-        except Exception as e:
-            self.add_to_output(f"Error fetching/displaying image: {str(e)}")
+        if not self.instrument:
+            self.add_to_output("Instrument is not connected.")
+            self.record_button.setChecked(False)
+            return
+
+        path = "session_" + datetime.datetime.now().strftime("%Y%m%d_%H%M%S") + DEFAULT_EXTENSION
+        with self.instrument_lock:  # Start on a transaction boundary
+            self.session_recorder.start(path, {"address": self.ip_address, "channels": self.selected_channels})
+        self.add_to_output(f"Recording SCPI session to {path}")
+
+    def open_session_browser(self):
+        path, _ = QFileDialog.getOpenFileName(self.dialog, "Open Session Log", self.csv_filename,
+                                              "CSV logs (*.csv);;All files (*)")
+        if not path:
+            return
+        browser = SessionBrowser(path)
+        browser.destroyed.connect(lambda: self.session_browsers.remove(browser))
+        browser.setAttribute(Qt.WA_DeleteOnClose)
+        self.session_browsers.append(browser)
+        browser.show()
+
+    def show_sweep_window(self):
+        if not self.instrument:
+            self.add_to_output("Instrument is not connected.")
+            return
+        if self.sweep_window is None:
+            self.sweep_window = SweepWindow(self.run_sweep, self.selected_channels)
+            self.sweep_window.completed.connect(self.on_sweep_completed)
+        self.sweep_window.show()
+        self.sweep_window.raise_()
+
+    def run_sweep(self, definition, on_chunk, stop_event):
+        # Runs on the sweep window's worker thread; the poll timers skip their ticks while it holds the lock
+        if not self.instrument:
+            raise ValueError("Instrument is not connected")
+
+        def chunk_done(results):
+            on_chunk(results)
+            self.gui_invoker.call(self.on_sweep_chunk, results)
+        with self.instrument_lock:
+            if self.acquisition is not None:
+                self.acquisition.set_channels([])  # Measurements would abort the triggered acquisition
+            engine = SweepEngine(self.instrument, self.clock)
+            try:
+                return engine.run(definition, chunk_done, stop_event)
+            except Exception:
+                if engine.unrestored is not None:
+                    self.unrestored_sweep = engine
+                    self.add_to_output(f"Sweep failed and channels {format_channel_list(list(engine.unrestored))} "
+                                       "could not be restored: their outputs may still be on at a sweep voltage. "
+                                       "Retrying after reconnect.", logging.ERROR)
+                raise
+            finally:
+                if self.acquisition is not None:
+                    self.acquisition.set_channels(self.selected_channels)
+
+    def on_sweep_chunk(self, results):
+        # Sweep points go to the dashboard and the log sinks like polled samples, without a latency
+        for result in results:
+            for timestamp, voltage, current in zip(result.time.tolist(), result.voltage.tolist(),
+                                                   result.current.tolist()):
+                self.samples[result.channel].append(timestamp, voltage, current)
+                self.log_data_to_csv(result.channel, timestamp, voltage, current)
+
+    def on_sweep_completed(self, definition, results):
+        filename = datetime.datetime.now().strftime("sweep_%Y%m%d_%H%M%S.csv")
+        write_csv(results, filename)
+        points = sum(len(result.setpoint) for result in results.values())
+        for channel in results:
+            self.record_event("sweep", channel, f"{definition.describe()}; {filename}")
+        self.add_to_output(f"Sweep {definition.describe()}: {points} points saved to {filename}")
+
+    def fetch_and_display_image(self):
+        if not self.instrument:
+            self.add_to_output("Instrument is not connected.")
+            return
+
+        # The transfer runs on a worker thread; results come back on the GUI thread
+        self.fetch_button.setEnabled(False)
+        self.screenshots.capture_async(
+            lambda result: self.gui_invoker.call(self.on_screenshot_fetched, result, True),
+            lambda error: self.gui_invoker.call(self.on_screenshot_error, error))
+
+    def on_screenshot_fetched(self, result, show=False):
+        self.fetch_button.setEnabled(True)
+        if result.duplicate:
+            self.add_to_output("Display unchanged since last screenshot, frame skipped.")
+            return
+        self.add_to_output(f"Display image saved to {result.path} ({result.size} bytes in {result.elapsed:.2f} s).")
+        if show:
+            self.display_image(result.path)
+
+    def on_screenshot_error(self, error):
+        self.fetch_button.setEnabled(True)
+        self.add_to_output(f"Error fetching/displaying image: {str(error)}")
+
+    def toggle_periodic_capture(self, enabled):
+        if not enabled:
+            self.screenshots.stop_periodic()
+            self.add_to_output("Periodic screenshot capture stopped.")
+            return
+
+        if not self.instrument:
+            self.add_to_output("Instrument is not connected.")
+            self.auto_fetch_button.setChecked(False)
+            return
+
+        interval, ok = QInputDialog.getDouble(self.dialog, "Periodic Capture", "Capture interval (s):", 10.0, 1.0, 3600.0, 1)
+        if not ok:
+            self.auto_fetch_button.setChecked(False)
+            return
+
+        self.screenshots.start_periodic(
+            interval,
+            lambda result: self.gui_invoker.call(self.on_screenshot_fetched, result),
+            lambda error: self.gui_invoker.call(self.on_screenshot_error, error))
+        self.add_to_output(f"Capturing a screenshot every {interval:g} s.")
 
     def display_image(self, image_path):
         image = Image.open(image_path)
@@ -552,12 +1031,12 @@ class PowerSupplyControlPanel:
         ovp_label = QLabel("OVP:")
         ovp_indicator = QLabel()
         ovp_indicator.setFixedSize(20, 20)
-        ovp_indicator.setStyleSheet("background-color: green;")
+        self.view.init_indicator(ovp_indicator, "green")
 
         ocp_label = QLabel("OCP:")
         ocp_indicator = QLabel()
         ocp_indicator.setFixedSize(20, 20)
-        ocp_indicator.setStyleSheet("background-color: green;")
+        self.view.init_indicator(ocp_indicator, "green")
 
         # Add buttons for setting and clearing protections
         set_ovp_button = QPushButton("Set OVP", self.dialog)
@@ -645,9 +1124,9 @@ class PowerSupplyControlPanel:
 
             # Verify and update GUI accordingly
             if self.query_channel_state(channel) == new_state:
-                button.setText("Turn Off" if new_state == "ON" else "Turn On")
-                button.setStyleSheet("background-color: red;" if new_state == "ON" else "background-color: lightgreen;")
-                graph_button.setEnabled(new_state == "ON")
+                self.update_ui_channel_status(channel, new_state)
+                self.view.set_enabled(graph_button, new_state == "ON")
+                self.record_event("output", channel, new_state)
                 self.add_to_output(f"Channel {channel} turned {new_state.lower()}.")
             else:
                 self.add_to_output(f"Failed to toggle Channel {channel}.")
@@ -658,25 +1137,94 @@ class PowerSupplyControlPanel:
         ip_address, self.selected_channels = self.get_ip_address()
         if ip_address and self.selected_channels:  # Check if there are selected channels
             try:
-                rm = pyvisa.ResourceManager()
-                self.instrument = rm.open_resource(f"TCPIP::{ip_address}::INSTR")
-                self.instrument.timeout = 5000
+                if self.process_acquisition:
+                    self.acquisition = attach_or_start(ip_address, self.selected_channels,
+                                                       csv_filename=self.csv_filename)
+                    self.ring_seq = self.acquisition.ring.seq
+                    session = InstrumentedSession(RecordingSession(self.acquisition, self.session_recorder),
+                                                  self.scpi_stats)
+                    self.instrument = ProfiledSession(session, self.profiler)
+                    self.instrument.timeout = 5000
+                else:
+                    self.supervisor.open_session = lambda: self.open_session(ip_address)
+                    self.instrument = self.supervisor.wrap(self.open_session(ip_address))
+                self.screenshots.reset_session()
                 self.selected_channels = self.selected_channels
                 self.add_to_output(f"Connected to instrument. Selected channels: {self.selected_channels}")
+                if self.session_db is not None:
+                    self.start_db_session(ip_address)
                 self.query_initial_channel_statuses()
                 self.connect_button.setEnabled(False)  # Disable the connect button after connection
                 self.disconnect_button.setEnabled(True)  # Enable the disconnect button after connection
-            except pyvisa.VisaIOError as e:
+            except (pyvisa.VisaIOError, AcquisitionError, OSError) as e:
                 self.add_to_output(f"Error connecting to instrument: {e}")
                 self.disconnect_button.setEnabled(False)
         else:
             self.add_to_output("Connection canceled or no channels selected.")
             self.disconnect_button.setEnabled(False)
 
+    def start_db_session(self, address):
+        try:
+            idn = self.instrument.query("*IDN?").strip()
+        except pyvisa.VisaIOError:
+            idn = None
+        self.session_db.start_session(address, idn, {"channels": self.selected_channels,
+                                                     "names": self.channel_names})
+        for key, name in self.channel_names.items():
+            if key.startswith("CH"):
+                self.record_setting(int(key[2:]), "name", name)
+
+    def open_instrument(self, address):
+        return open_instrument(self.rm, address, self.num_channels)
+
+    def open_session(self, address):
+        # Also called from the supervisor's thread to reconnect
+        session = InstrumentedSession(RecordingSession(self.open_instrument(address), self.session_recorder),
+                                      self.scpi_stats)
+        session = ProfiledSession(session, self.profiler)
+        session.timeout = 5000
+        return session
+
+    def on_connection_lost(self, reason):
+        self.add_to_output(f"Connection lost ({reason}); reconnecting in the background", logging.WARNING)
+        self.record_event("connection_lost", None, reason)
+
+    def on_connection_restored(self, gap_start, gap_end, attempts):
+        self.gui_invoker.call(self.resume_after_reconnect, gap_start, gap_end, attempts)  # From the supervisor's thread
+
+    def resume_after_reconnect(self, gap_start, gap_end, attempts):
+        for sink in self.log_sinks:
+            sink.mark_gap(gap_start, gap_end, "connection lost")
+        self.record_event("reconnected", None, f"after {attempts} attempt(s)")
+        self.add_to_output(f"Reconnected after {gap_end - gap_start:.1f} s ({attempts} attempt(s))")
+        self.screenshots.reset_session()  # The instrument may have been power cycled
+        self.restore_after_sweep()
+        self.query_initial_channel_statuses()  # Re-applies the cached channel selection to the UI
+
+    def restore_after_sweep(self):
+        engine, self.unrestored_sweep = self.unrestored_sweep, None
+        if engine is None:
+            return
+        channel_list = format_channel_list(list(engine.unrestored))
+        try:
+            with self.instrument_lock:
+                engine.restore(engine.unrestored)
+        except Exception as e:
+            self.unrestored_sweep = engine
+            self.add_to_output(f"Could not restore channels {channel_list} after the failed sweep: {e}", logging.ERROR)
+        else:
+            self.add_to_output(f"Restored channels {channel_list} after the failed sweep")
+
     def disconnect_instrument(self):
         if self.instrument:
-            self.instrument.close()
-            self.instrument = None
+            self.auto_fetch_button.setChecked(False)  # Stops periodic capture
+            self.record_button.setChecked(False)  # Closes the trace file
+            with self.instrument_lock:  # Wait for any transfer in progress
+                self.instrument.close()  # In process mode this also stops the acquisition process
+                self.instrument = None
+                self.acquisition = None
+            if self.session_db is not None:
+                self.session_db.end_session()
             self.add_to_output("Disconnected from instrument.")
             self.connect_button.setEnabled(True)  # Enable the connect button after disconnection
             self.disconnect_button.setEnabled(False)  # Disable the disconnect button after disconnection
@@ -734,16 +1282,19 @@ class PowerSupplyControlPanel:
             if voltage:
                 self.instrument.write(f"VOLT {voltage}, (@{channel})")
                 self.add_to_output(f"Voltage set to {voltage} V for Channel {channel}")
+                self.record_setting(channel, "voltage", voltage)
 
             # Apply current settings if provided
             if current:
                 self.instrument.write(f"CURR {current}, (@{channel})")
                 self.add_to_output(f"Current set to {current} A for Channel {channel}")
+                self.record_setting(channel, "current", current)
 
             # Apply slew rate settings if provided
             if slew_rate:
                 self.instrument.write(f"VOLT:SLEW {slew_rate}, (@{channel})")
                 self.add_to_output(f"Slew rate set to {slew_rate} V/s for Channel {channel}")
+                self.record_setting(channel, "slew", slew_rate)
 
             # After applying settings, check protection statuses quickly
             QTimer.singleShot(2000, lambda: self.check_protection_statuses())
@@ -775,23 +1326,56 @@ class PowerSupplyControlPanel:
     def update_live_data(self):
         if self.instrument is None:
             return
+        if self.acquisition is not None:
+            self._update_from_ring()  # Shared memory only; never waits on the instrument
+            return
+
+        # Skip this tick rather than block the GUI while a background transfer owns the session
+        if not self.instrument_lock.acquire(blocking=False):
+            return
+        try:
+            self._update_live_data()
+        finally:
+            self.instrument_lock.release()
 
+    def _update_live_data(self):
         for channel in self.selected_channels:  # Only update for selected channels
             if self.channel_settings[channel]['status']:
                 self.monitor_channel(channel)
             try:
-                voltage = float(self.instrument.query(f"MEAS:VOLT? (@{channel})"))
-                current = float(self.instrument.query(f"MEAS:CURR? (@{channel})"))
-                self.channel_settings[channel]['voltage_led'].setText(f"{voltage:.3f} V")
-                self.channel_settings[channel]['current_led'].setText(f"{current:.3f} A")
+                # One message for both readings, so V and I share a single round trip and timestamp
+                response, timestamp, latency = timed_query(
+                    self.instrument, f"MEAS:VOLT? (@{channel});:MEAS:CURR? (@{channel})", self.clock)
+                voltage, current = (float(value) for value in response.split(';'))
+                self.samples[channel].append(timestamp, voltage, current)
+                self.view.set_text(self.channel_settings[channel]['voltage_led'], f"{voltage:.3f} V")
+                self.view.set_text(self.channel_settings[channel]['current_led'], f"{current:.3f} A")
 
                 # Log the data as it's updated on the GUI
-                now = time.strftime("%Y-%m-%d %H:%M:%S")
-                self.log_data_to_csv(channel, now, voltage, current)
+                self.log_data_to_csv(channel, timestamp, voltage, current, latency)
 
-            except pyvisa.VisaIOError as e:
+            except (pyvisa.VisaIOError, ValueError) as e:
+                if not self.supervisor.available():
+                    break  # The supervisor reports the outage once; no error per channel and tick
                 self.add_to_output(f"Error updating live data for channel {channel}: {str(e)}")
 
+    def _update_from_ring(self):
+        # The acquisition process has already polled and logged these; display them and feed the local sinks
+        self.ring_seq, rows, lost = self.acquisition.ring.read(self.ring_seq)
+        if lost:
+            self.add_to_output(f"Display fell behind the acquisition process; {lost} samples not shown")
+        latest = {}
+        for timestamp, channel, voltage, current, latency in rows.tolist():
+            channel = int(channel)
+            if channel not in self.samples:
+                continue
+            self.samples[channel].append(timestamp, voltage, current)
+            latest[channel] = (voltage, current)
+            self.log_data_to_csv(channel, timestamp, voltage, current, None if math.isnan(latency) else latency)
+        for channel, (voltage, current) in latest.items():
+            self.view.set_text(self.channel_settings[channel]['voltage_led'], f"{voltage:.3f} V")
+            self.view.set_text(self.channel_settings[channel]['current_led'], f"{current:.3f} A")
+
     def start_monitoring(self, channel):
         if channel in self.selected_channels and channel not in self.monitoring_threads:
             self.thread_control[channel] = True
@@ -822,8 +1406,24 @@ class PowerSupplyControlPanel:
                 break  # Stop monitoring if disconnected
 
     def setup_output_window(self):
-        self.output_window = QTextEdit()
-        self.output_window.setReadOnly(True)
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("Console:"))
+        self.console_filter_combo = QComboBox(self.dialog)
+        for name, level in (("All", logging.DEBUG), ("Info", logging.INFO),
+                            ("Warnings", logging.WARNING), ("Errors", logging.ERROR)):
+            self.console_filter_combo.addItem(name, level)
+        self.console_filter_combo.setCurrentIndex(1)
+        self.console_clear_button = QPushButton("Clear", self.dialog)
+        filter_layout.addWidget(self.console_filter_combo)
+        filter_layout.addWidget(self.console_clear_button)
+        filter_layout.addStretch()
+        self.dialog_layout.addLayout(filter_layout)
+
+        self.output_window = OutputConsole(self.dialog)
+        self.output_window.setFixedSize(625, 200)
+        self.console_filter_combo.currentIndexChanged.connect(
+            lambda index: self.output_window.set_min_level(self.console_filter_combo.itemData(index)))
+        self.console_clear_button.clicked.connect(self.output_window.clear_lines)
         self.dialog_layout.addWidget(self.output_window)
 
     def get_slew_rate(self, channel, update_led=True):
@@ -841,7 +1441,7 @@ class PowerSupplyControlPanel:
             if update_led:
                 led = self.channel_settings[channel].get('slew_led', None)
                 if led:
-                    led.setText(f"{rounded_slew_rate} V/s")
+                    self.view.set_text(led, f"{rounded_slew_rate} V/s")
                 else:
                     self.add_to_output("Error: Slew LED is None")
 
@@ -849,21 +1449,16 @@ class PowerSupplyControlPanel:
             self.add_to_output(f"Error reading slew rate for channel {channel}: {str(e)}")
 
     def update_channel_ui(self, channel, voltage, current, status_text):
-        # Update UI components based on the received data
-        self.channel_settings[channel]['voltage_led'].setText(f"{float(voltage):.3f} V")
-        self.channel_settings[channel]['current_led'].setText(f"{float(current):.3f} A")
-        self.channel_settings[channel]['status_label'].setText(f"Status: {status_text}")
+        # Update UI components based on the received data; safe to call from the monitoring threads
+        settings = self.channel_settings[channel]
+        self.view.set_text(settings['voltage_led'], f"{float(voltage):.3f} V")
+        self.view.set_text(settings['current_led'], f"{float(current):.3f} A")
+        if settings.get('status_label') is not None:
+            self.view.set_text(settings['status_label'], f"Status: {status_text}")
 
         # Update OVP and OCP indicators based on received data
-        if "OVP" in voltage:
-            self.channel_settings[channel]['ovp_indicator'].setStyleSheet("background-color: red;")
-        else:
-            self.channel_settings[channel]['ovp_indicator'].setStyleSheet("background-color: green;")
-
-        if "OCP" in current:
-            self.channel_settings[channel]['ocp_indicator'].setStyleSheet("background-color: red;")
-        else:
-            self.channel_settings[channel]['ocp_indicator'].setStyleSheet("background-color: green;")
+        self.view.set_indicator(settings['ovp_indicator'], "red" if "OVP" in voltage else "green")
+        self.view.set_indicator(settings['ocp_indicator'], "red" if "OCP" in current else "green")
 
     def query_initial_channel_statuses(self):
         if not self.instrument:
@@ -920,130 +1515,15 @@ class PowerSupplyControlPanel:
         plot.addItem(voltage_mark)
         plot.addItem(current_mark)
 
-    def show_live_graph_old(self, channel):
-        if channel in self.selected_channels and channel in self.graph_dialogs:
-            graph_dialog = QDialog(self.dialog)
-            graph_dialog.setWindowTitle(f"Channel {channel} Data")
-            layout = QVBoxLayout()
-
-            plot = pg.PlotWidget(title="Voltage and Current vs Time")
-            plot.addLegend()
-            voltage_curve = plot.plot(pen='r', name='Voltage')
-            current_curve = plot.plot(pen='g', name='Current')
-            plot.setLabel('left', 'Value')
-            plot.setLabel('bottom', 'Time', units='s')
-
-            layout.addWidget(plot)
-            graph_dialog.setLayout(layout)
-
-            self.ensure_csv_exists()  # Ensure CSV is available before starting the timer
-
-            update_timer = QTimer()
-            update_timer.timeout.connect(lambda: self.update_plot(plot, voltage_curve, current_curve, channel))
-            update_timer.start(1000)  # Update plot every second
-
-            graph_dialog.exec_()
-
-    def update_plot(self, plot, voltage_curve, current_curve, channel):
-        csv_file = "power_supply_data.csv"
-        try:
-            with open(csv_file, 'r') as file:
-                reader = csv.reader(file)
-                next(reader)  # Skip header
-                data = [row for row in reader if row[0].isdigit() and int(row[0]) == channel]
-
-            if not data:
-                print(f"No data for channel {channel}.")
-                return
-
-            base_time = datetime.datetime.strptime(data[0][1], '%Y-%m-%d %H:%M:%S')
-            time_seconds = [(datetime.datetime.strptime(row[1], '%Y-%m-%d %H:%M:%S') - base_time).total_seconds() for row in data]
-            voltage = [float(row[2]) for row in data]
-            current = [float(row[3]) for row in data]
-
-            voltage_curve.setData(time_seconds, voltage, pen='r')
-            current_curve.setData(time_seconds, current, pen='b')
-
-            plot.setTitle(f"Latest Voltage: {voltage[-1]:.3f} V, Current: {current[-1]:.3f} A")
-
-            # Manage markers
-            if self.last_markers[channel]['voltage']:
-                plot.removeItem(self.last_markers[channel]['voltage'])
-            if self.last_markers[channel]['current']:
-                plot.removeItem(self.last_markers[channel]['current'])
-
-            self.last_markers[channel]['voltage'] = pg.PlotDataItem([time_seconds[-1]], [voltage[-1]], symbol='o', symbolSize=15, symbolBrush='y')
-            self.last_markers[channel]['current'] = pg.PlotDataItem([time_seconds[-1]], [current[-1]], symbol='o', symbolSize=15, symbolBrush='y')
-            plot.addItem(self.last_markers[channel]['voltage'])
-            plot.addItem(self.last_markers[channel]['current'])
-
-            # Adjust plot to center on the latest data point
-            current_view_range = plot.viewRange()
-            x_range_width = current_view_range[0][1] - current_view_range[0][0]
-            new_x_range = [time_seconds[-1] - x_range_width / 2, time_seconds[-1] + x_range_width / 2]
-            plot.setXRange(*new_x_range, padding=0)
-
-            if True:  # Replace with dynamic condition if needed
-                plot.showGrid(x=True, y=True, alpha=0.3)
-            else:
-                plot.showGrid(x=False, y=False)
-        except FileNotFoundError:
-            print(f"CSV file {csv_file} not found.")
-        except Exception as e:
-            print(f"Error reading from CSV file: {e}")
     def show_live_graph(self, channel):
-        if channel not in self.graph_dialogs:
-            graph_window = QWidget()
-            graph_window.setWindowTitle(f"Channel {channel} Data")
-            layout = QVBoxLayout(graph_window)
-
-            plot = pg.PlotWidget(title="Voltage and Current vs Time")
-            voltage_curve = plot.plot(pen='r', name='Voltage')
-            current_curve = plot.plot(pen='b', name='Current')
-            plot.addLegend()
-            plot.setLabel('left', 'Value')
-            plot.setLabel('bottom', 'Time', units='s')
-
-            layout.addWidget(plot)
-            graph_window.setLayout(layout)
-            graph_window.resize(600, 600)
-
-            self.graph_dialogs[channel] = graph_window
-            self.last_markers[channel] = {'voltage': None, 'current': None}
-            timer = QTimer()
-            # Connect the plot and curves correctly
-            timer.timeout.connect(lambda ch=channel, p=plot, vc=voltage_curve, cc=current_curve: self.update_plot(p, vc, cc, ch))
-            timer.start(1000)  # Update plot every second
-            self.update_timers[channel] = timer
-        else:
-            graph_window = self.graph_dialogs[channel]
-
-        graph_window.show()
-        graph_window.raise_()
-        graph_window.activateWindow()
-
-    def fetch_measurements(self, channel):
-        if not self.instrument:
-            self.add_to_output("Instrument is not connected.")
-            return
-
-        try:
-            # Fetching voltage
-            voltage = self.instrument.query(f"MEASure:ARRay:VOLTage:DC? (@{channel})")
-            self.channel_settings[channel]['voltage_led'].setText(f"{voltage} V")
-            self.add_to_output(f"Channel {channel} Voltage: {voltage} V")
-
-            # Fetching current
-            current = self.instrument.query(f"MEASure:ARRay:CURRent:DC? (@{channel})")
-            self.channel_settings[channel]['current_led'].setText(f"{current} A")
-            self.add_to_output(f"Channel {channel} Current: {current} A")
-
-            # Fetching power if applicable
-            power = self.instrument.query(f"MEASure:ARRay:POWer:DC? (@{channel})")
-            self.add_to_output(f"Channel {channel} Power: {power} W")
-
-        except Exception as e:
-            self.add_to_output(f"Error fetching measurements for channel {channel}: {str(e)}")
+        if self.dashboard is None:
+            self.dashboard = LiveDashboard(
+                self.samples, lambda ch: self.channel_names.get(f"CH{ch}", f"Channel {ch}"))
+            self.profiler.attach(self.dashboard.render_timer, "dashboard.render", self.dashboard.render)
+        self.dashboard.set_channel_visible(channel, True)
+        self.dashboard.show()
+        self.dashboard.raise_()
+        self.dashboard.activateWindow()
 
     def update_ui_channel_status(self, channel, state):
         """
@@ -1051,16 +1531,14 @@ class PowerSupplyControlPanel:
         """
         button = self.channel_settings[channel]['turn_on_button']
         if button:
-            button.setText("Turn Off" if state == "ON" else "Turn On")
-            button.setStyleSheet("background-color: red;" if state == "ON" else "background-color: lightgreen;")
+            self.view.set_text(button, "Turn Off" if state == "ON" else "Turn On")
+            self.view.set_style(button, "background-color: red;" if state == "ON" else "background-color: lightgreen;")
         else:
             self.add_to_output(f"UI element for channel {channel} status button not found.")
 
-    def log_data_to_csv(self, channel, time, voltage, current):
-        # Append data to CSV file
-        with open("power_supply_data.csv", 'a', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow([channel, time, voltage, current])
+    def log_data_to_csv(self, channel, time, voltage, current, latency=None):
+        for sink in self.log_sinks:
+            sink.write(channel, time, voltage, current, latency)
 
     def fetch_measurements_and_log(self, channel):
         # Example function that might fetch measurements and then log them
@@ -1075,6 +1553,7 @@ class PowerSupplyControlPanel:
             ovp_level = float(QInputDialog.getText(self.dialog, "Set OVP", "Enter OVP Level (V):")[0])
             self.instrument.write(f"VOLT:PROT {ovp_level}, (@{channel})")
             self.add_to_output(f"Set OVP level to {ovp_level} V for Channel {channel}")
+            self.record_setting(channel, "ovp", ovp_level)
         except ValueError:
             self.add_to_output("Invalid OVP value entered.")
         except pyvisa.VisaIOError as e:
@@ -1087,6 +1566,8 @@ class PowerSupplyControlPanel:
             if ocp_status == "ON":
                 ocp_delay = float(QInputDialog.getText(self.dialog, "Set OCP Delay", "Enter OCP Delay (s):")[0])
                 self.instrument.write(f"CURR:PROT:DEL {ocp_delay}, (@{channel})")
+                self.record_setting(channel, "ocp_delay", ocp_delay)
+            self.record_setting(channel, "ocp", ocp_status)
             self.add_to_output(f"Set OCP to {ocp_status} with delay {ocp_delay}s for Channel {channel}")
         except ValueError:
             self.add_to_output("Invalid OCP delay value entered.")
@@ -1097,6 +1578,7 @@ class PowerSupplyControlPanel:
         try:
             self.instrument.write(f"OUTP:PROT:CLE, (@{channel})")
             self.add_to_output(f"Cleared protection for Channel {channel}")
+            self.record_event("protection_clear", channel)
         except pyvisa.VisaIOError as e:
             self.add_to_output(f"Failed to clear protection for Channel {channel}: {str(e)}")
 
@@ -1108,8 +1590,17 @@ class PowerSupplyControlPanel:
 
     def cleanup_on_exit(self):
         # Perform any cleanup needed before application exit
+        self.screenshots.stop_periodic()
+        if self.dashboard is not None:
+            self.dashboard.close()
+        if self.sweep_window is not None:
+            self.sweep_window.close()  # Stops a running sweep after its current chunk
         if self.instrument:
             self.disconnect_instrument()  # Assuming this method safely disconnects the instrument
+        for sink in self.log_sinks:
+            sink.close()  # Finalizes the open archive segment
+        self.output_window.flush()
+        stop_queued_file_logging()  # Drain queued log records to disk
 
 
 def main():
@@ -0,0 +1,541 @@
+"""Measurement acquisition in a separate process.
+
+KEYSIGHT_ACQUISITION=process moves the poll loop and the data log out of
+the GUI process.  The acquisition process owns the VISA session, polls on
+its own schedule and writes every sample into a shared-memory ring that
+the GUI, or any other local process, reads without a pipe in between.
+Plotting load can then no longer delay measurement timing, and a GUI crash
+leaves capture running; the next GUI to connect attaches to the running
+process instead of starting another.  All other SCPI traffic (settings,
+protection checks, screenshots) is forwarded over a local connection and
+runs between poll ticks.
+
+The ring has one writer.  It fills record seq % capacity and only then
+publishes seq + 1, so a reader that rechecks seq after copying knows which
+of its rows may have been overwritten underneath it; no lock is shared
+between the processes.
+
+    python acquisition.py status
+    python acquisition.py tail --count 20
+    python acquisition.py stop
+    python acquisition.py profile --seconds 10 --output acquisition.folded
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import connection, resource_tracker, shared_memory
+
+import numpy as np
+import pyvisa
+
+from connection_supervisor import backoff_delays, classify
+from log_archive import SegmentedLogWriter
+from log_sinks import CsvLogSink
+from n67xx_simulator import SimulatedInstrument, SimulatedN67xx
+from sample_clock import SampleClock, timed_query
+from scpi_trace import ReplayInstrument
+from screenshot import read_chunk
+from stack_sampler import StackSampler
+
+RING_NAME = "keysight_acquisition"
+DEFAULT_CAPACITY = 262144  # Records; 10 MB, about 18 hours of 4 channels at 1 Hz
+DEFAULT_INTERVAL = 1.0
+START_TIMEOUT = 15.0
+RECORD_FIELDS = ("t", "channel", "voltage", "current", "latency")
+
+# Header slots, 8 bytes each; integer and float slots share one block
+_SEQ, _CAPACITY, _PID, _TICKS, _OVERRUNS, _ERRORS, _STOP = range(7)
+_HEARTBEAT, _INTERVAL, _JITTER_LAST, _JITTER_MAX = range(7, 11)
+_RECONNECTS = 11
+_TICK_LAST, _TICK_MAX = 12, 13  # Seconds of work in a poll tick
+MAX_TIMEOUT_TICKS = 3  # Ticks that time out on every channel before the session is treated as lost
+_HEADER_SLOTS = 16
+_ADDRESS_OFFSET = _HEADER_SLOTS * 8  # Command listener address, NUL padded
+_ADDRESS_SIZE = 256
+_AUTHKEY_OFFSET = _ADDRESS_OFFSET + _ADDRESS_SIZE
+_AUTHKEY_SIZE = 32
+_HEADER_BYTES = 512
+
+
+class AcquisitionError(Exception):
+    pass
+
+
+class SampleRing:
+    """Fixed-size record ring in shared memory: one writing process, any number of readers."""
+
+    def __init__(self, memory, owner=False):
+        self.memory = memory
+        self.owner = owner
+        buffer = memory.buf
+        self.ints = np.ndarray((_HEADER_SLOTS,), np.int64, buffer)
+        self.floats = np.ndarray((_HEADER_SLOTS,), np.float64, buffer)
+        capacity = int(self.ints[_CAPACITY])
+        # Zero-copy view of every record; rows may change while you look, read() returns a consistent copy
+        self.records = np.ndarray((capacity, len(RECORD_FIELDS)), np.float64, buffer, _HEADER_BYTES)
+        self.capacity = capacity
+        self.seq = int(self.ints[_SEQ])
+
+    @classmethod
+    def create(cls, name=RING_NAME, capacity=DEFAULT_CAPACITY):
+        memory = shared_memory.SharedMemory(name, create=True,
+                                            size=_HEADER_BYTES + capacity * len(RECORD_FIELDS) * 8)
+        memory.buf[:_HEADER_BYTES] = bytes(_HEADER_BYTES)
+        np.ndarray((_HEADER_SLOTS,), np.int64, memory.buf)[_CAPACITY] = capacity
+        return cls(memory, owner=True)
+
+    @classmethod
+    def attach(cls, name=RING_NAME):
+        memory = shared_memory.SharedMemory(name)
+        # Python's resource tracker would unlink the ring when this reader exits; only the writer owns it
+        resource_tracker.unregister(memory._name, "shared_memory")
+        return cls(memory)
+
+    # Writer side
+
+    def write(self, channel, timestamp, voltage, current, latency=None):
+        self.records[self.seq % self.capacity] = (timestamp, channel, voltage, current,
+                                                  np.nan if latency is None else latency)
+        self.seq += 1
+        self.ints[_SEQ] = self.seq  # Publish only after the record is complete
+
+    def set_listener(self, address, authkey):
+        # Key first: readers take a non-empty address to mean both are in place
+        self.memory.buf[_AUTHKEY_OFFSET:_AUTHKEY_OFFSET + _AUTHKEY_SIZE] = authkey
+        self.memory.buf[_ADDRESS_OFFSET:_ADDRESS_OFFSET + _ADDRESS_SIZE] = address.encode().ljust(_ADDRESS_SIZE, b"\0")
+
+    # Reader side
+
+    def read(self, since):
+        """Records published after sequence number `since`: (next since, rows, rows lost to overwrite)."""
+        end = int(self.ints[_SEQ])
+        # Record end - capacity shares its slot with record end, which the writer may be filling right now
+        start = max(since, end - self.capacity + 1)
+        rows = self.records[np.arange(start, end) % self.capacity]  # Fancy indexing copies
+        # Anything the writer lapped while we copied is no longer trustworthy
+        first_valid = int(self.ints[_SEQ]) - self.capacity + 1
+        if first_valid > start:
+            rows = rows[first_valid - start:]
+            start = first_valid
+        return end, rows, max(0, start - since)
+
+    def latest(self, count):
+        end = int(self.ints[_SEQ])
+        return self.read(max(0, end - count))[1]
+
+    def listener(self):
+        address = bytes(self.memory.buf[_ADDRESS_OFFSET:_ADDRESS_OFFSET + _ADDRESS_SIZE]).rstrip(b"\0").decode()
+        authkey = bytes(self.memory.buf[_AUTHKEY_OFFSET:_AUTHKEY_OFFSET + _AUTHKEY_SIZE])
+        return address, authkey
+
+    def alive(self):
+        # A heartbeat is stamped every tick; allow a few missed ticks before calling the writer gone
+        interval = float(self.floats[_INTERVAL]) or DEFAULT_INTERVAL
+        return not self.ints[_STOP] and time.time() - float(self.floats[_HEARTBEAT]) < max(5.0, 5 * interval)
+
+    def request_stop(self):
+        self.ints[_STOP] = 1
+
+    def status(self):
+        return {
+            "pid": int(self.ints[_PID]),
+            "samples": int(self.ints[_SEQ]),
+            "capacity": self.capacity,
+            "interval_s": float(self.floats[_INTERVAL]),
+            "ticks": int(self.ints[_TICKS]),
+            "overruns": int(self.ints[_OVERRUNS]),
+            "errors": int(self.ints[_ERRORS]),
+            "reconnects": int(self.ints[_RECONNECTS]),
+            "jitter_last_ms": float(self.floats[_JITTER_LAST]) * 1000,
+            "jitter_max_ms": float(self.floats[_JITTER_MAX]) * 1000,
+            "tick_last_ms": float(self.floats[_TICK_LAST]) * 1000,
+            "tick_max_ms": float(self.floats[_TICK_MAX]) * 1000,
+            "heartbeat_age_s": time.time() - float(self.floats[_HEARTBEAT]),
+            "alive": self.alive(),
+        }
+
+    def close(self):
+        # Drop the numpy views first; SharedMemory refuses to close while buffers are exported
+        self.ints = self.floats = self.records = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+def open_instrument(rm, address, channels=4):
+    # "SIM" runs against the built-in simulator, "replay:<trace>" and "replay-realtime:<trace>"
+    # play back a recorded session; full VISA resource strings are used as given
+    if address.strip().upper() == "SIM":
+        return SimulatedInstrument(SimulatedN67xx(channels=channels))
+    scheme, _, trace_path = address.partition(":")
+    if scheme.lower() in ("replay", "replay-realtime"):
+        return ReplayInstrument(trace_path.strip(), realtime=scheme.lower() == "replay-realtime", loop=True)
+    resource = address if "::" in address else f"TCPIP::{address}::INSTR"
+    instrument = rm.open_resource(resource)
+    if resource.upper().endswith("::SOCKET"):
+        # Raw sockets have no END indicator, so messages are newline terminated
+        instrument.read_termination = "\n"
+        instrument.write_termination = "\n"
+    return instrument
+
+
+def open_log_sink(csv_filename, metadata):
+    # KEYSIGHT_LOG_ARCHIVE=<directory> replaces the flat CSV with hourly compressed segments
+    # (KEYSIGHT_LOG_CODEC=zstd if the zstandard package is installed)
+    archive = os.environ.get("KEYSIGHT_LOG_ARCHIVE")
+    if archive:
+        return SegmentedLogWriter(archive, codec=os.environ.get("KEYSIGHT_LOG_CODEC", "gzip"), metadata=metadata)
+    return CsvLogSink(csv_filename, metadata)
+
+
+# Acquisition process
+
+class _Acquisition:
+    def __init__(self, ring, open_session, channels, interval, sink):
+        self.ring = ring
+        self.open_session = open_session
+        self.instrument = open_session()
+        self.channels = channels
+        self.interval = interval
+        self.sink = sink
+        self.clock = SampleClock()
+        self.lock = threading.Lock()  # One transfer at a time: poll ticks and forwarded commands
+        self.logger = logging.getLogger("acquisition")
+
+    def serve(self, listener):
+        while True:
+            try:
+                client = listener.accept()
+            except (connection.AuthenticationError, EOFError):
+                continue  # A client that failed the handshake
+            except OSError:
+                return  # Listener closed on shutdown
+            threading.Thread(target=self._serve_client, args=(client,), daemon=True).start()
+
+    def _serve_client(self, client):
+        with client:
+            while True:
+                try:
+                    request = client.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    client.send(("ok", self._execute(*request)))
+                except (EOFError, OSError):
+                    return
+                except Exception as e:
+                    client.send(("error", e))
+
+    def _execute(self, kind, name=None, args=(), kwargs=None):
+        if kind == "channels":
+            self.channels = list(name)
+            return None
+        if kind == "profile":
+            # Blocks only this client's connection; the poll loop is what gets sampled
+            sampler = StackSampler().run_for(name)
+            return sampler.folded(), sampler.summary()
+        with self.lock:
+            if self.instrument is None:
+                raise pyvisa.VisaIOError(pyvisa.constants.VI_ERROR_CONN_LOST)  # Reconnecting
+            if kind == "get":
+                return getattr(self.instrument, name)
+            if kind == "set":
+                setattr(self.instrument, name, args)
+                return None
+            if name == "read_chunk":
+                return read_chunk(self.instrument, *args)
+            if name not in ("write", "query", "read", "read_raw", "read_bytes", "clear"):
+                raise AttributeError(f"{name} is not forwarded to the instrument")
+            return getattr(self.instrument, name)(*args, **(kwargs or {}))
+
+    def poll(self):
+        ring = self.ring
+        ring.floats[_INTERVAL] = self.interval
+        deadline = time.perf_counter()
+        last_ok = self.clock.now()
+        timeout_ticks = 0
+        while not ring.ints[_STOP]:
+            tick_start = time.perf_counter()
+            lateness = tick_start - deadline
+            ring.floats[_JITTER_LAST] = lateness
+            ring.floats[_JITTER_MAX] = max(ring.floats[_JITTER_MAX], lateness)
+            lost = None
+            timeouts = 0
+            with self.lock:
+                for channel in self.channels:
+                    try:
+                        response, timestamp, latency = timed_query(
+                            self.instrument, f"MEAS:VOLT? (@{channel});:MEAS:CURR? (@{channel})", self.clock)
+                        voltage, current = (float(value) for value in response.split(';'))
+                    except (pyvisa.VisaIOError, ValueError) as e:
+                        ring.ints[_ERRORS] += 1
+                        self.logger.warning(f"Channel {channel}: {e}")
+                        kind = classify(e)
+                        if kind == "lost":
+                            lost = e
+                            break
+                        timeouts += kind == "timeout"
+                        continue
+                    ring.write(channel, timestamp, voltage, current, latency)
+                    self.sink.write(channel, timestamp, voltage, current, latency)
+                    last_ok = timestamp
+            timeout_ticks = timeout_ticks + 1 if self.channels and timeouts == len(self.channels) else 0
+            if lost is None and timeout_ticks >= MAX_TIMEOUT_TICKS:
+                lost = f"{timeout_ticks} ticks without a response"
+            if lost is not None:
+                self._reconnect(lost, last_ok)
+                deadline = time.perf_counter()
+                timeout_ticks = 0
+                continue
+            ring.ints[_TICKS] += 1
+            ring.floats[_HEARTBEAT] = time.time()
+            work = time.perf_counter() - tick_start
+            ring.floats[_TICK_LAST] = work
+            ring.floats[_TICK_MAX] = max(ring.floats[_TICK_MAX], work)
+            # Fixed schedule: a slow tick is followed by a short sleep, not a drifting one
+            deadline += self.interval
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif -delay > self.interval:
+                ring.ints[_OVERRUNS] += 1
+                deadline = time.perf_counter()
+
+
+    def _reconnect(self, reason, gap_start):
+        self.logger.warning(f"Connection lost ({reason}); reconnecting")
+        with self.lock:  # Forwarded commands fail fast until the new session is in place
+            try:
+                self.instrument.close()
+            except Exception:
+                pass
+            self.instrument = None
+        for delay in backoff_delays():
+            deadline = time.monotonic() + delay
+            while time.monotonic() < deadline:
+                if self.ring.ints[_STOP]:
+                    return
+                self.ring.floats[_HEARTBEAT] = time.time()  # Still alive, just not connected
+                time.sleep(min(0.5, delay))
+            try:
+                instrument = self.open_session()
+                instrument.query("*OPC?")
+            except Exception as e:
+                self.logger.info(f"Reconnect failed: {e}")
+                continue
+            with self.lock:
+                self.instrument = instrument
+            self.ring.ints[_RECONNECTS] += 1
+            self.sink.mark_gap(gap_start, self.clock.now(), "connection lost")
+            self.logger.info("Reconnected")
+            return
+
+    def close(self):
+        with self.lock:
+            if self.instrument is not None:
+                self.instrument.close()
+
+
+def run_acquisition(address, channels, interval=DEFAULT_INTERVAL, name=RING_NAME, capacity=DEFAULT_CAPACITY,
+                    csv_filename="power_supply_data.csv"):
+    ring = SampleRing.create(name, capacity)
+    try:
+        ring.ints[_PID] = os.getpid()
+        ring.floats[_HEARTBEAT] = time.time()
+        rm = pyvisa.ResourceManager(os.environ.get("KEYSIGHT_VISA_LIBRARY", ""))
+
+        def open_session():
+            instrument = open_instrument(rm, address)
+            instrument.timeout = 5000
+            return instrument
+        acquisition = _Acquisition(ring, open_session, channels, interval, None)
+        acquisition.sink = open_log_sink(csv_filename, acquisition.clock.header())
+        authkey = os.urandom(_AUTHKEY_SIZE)
+        listener = connection.Listener(authkey=authkey)
+        ring.set_listener(listener.address, authkey)
+        threading.Thread(target=acquisition.serve, args=(listener,), daemon=True).start()
+        try:
+            acquisition.poll()
+        finally:
+            listener.close()
+            acquisition.sink.close()
+            acquisition.close()
+    finally:
+        ring.close()
+
+
+# GUI side
+
+class AcquisitionClient:
+    """Session-like handle on the acquisition process, for the panel's proxy chain.
+
+    write/query/read go to the instrument between poll ticks; attribute reads
+    and writes (timeout, read_termination, ...) are forwarded too.  close()
+    stops the acquisition process, detach() leaves it running.
+    """
+
+    _own_attributes = ("ring", "process", "connection", "lock")
+
+    def __init__(self, ring, process=None):
+        object.__setattr__(self, "ring", ring)
+        object.__setattr__(self, "process", process)  # Popen when this GUI started it
+        address, authkey = ring.listener()
+        object.__setattr__(self, "connection", connection.Client(address, authkey=authkey))
+        object.__setattr__(self, "lock", threading.Lock())
+
+    def _call(self, *request):
+        with self.lock:
+            self.connection.send(request)
+            status, value = self.connection.recv()
+        if status == "error":
+            raise value
+        return value
+
+    def write(self, message, *args, **kwargs):
+        return self._call("call", "write", (message,) + args, kwargs)
+
+    def query(self, message, *args, **kwargs):
+        return self._call("call", "query", (message,) + args, kwargs)
+
+    def read(self, *args, **kwargs):
+        return self._call("call", "read", args, kwargs)
+
+    def read_raw(self, *args, **kwargs):
+        return self._call("call", "read_raw", args, kwargs)
+
+    def read_bytes(self, *args, **kwargs):
+        return self._call("call", "read_bytes", args, kwargs)
+
+    def read_chunk(self, size):
+        return self._call("call", "read_chunk", (size,))
+
+    def clear(self):
+        return self._call("call", "clear")
+
+    def set_channels(self, channels):
+        self._call("channels", list(channels))
+
+    def profile(self, seconds):
+        """Sample the acquisition process's stacks for `seconds`: (folded stacks, summary)."""
+        return self._call("profile", seconds)
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self._call("get", name)
+
+    def __setattr__(self, name, value):
+        if name in self._own_attributes:
+            object.__setattr__(self, name, value)
+        else:
+            self._call("set", name, value)
+
+    def detach(self):
+        self.connection.close()
+        self.ring.close()
+
+    def close(self):
+        self.ring.request_stop()
+        self.detach()
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=10.0)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+def attach_or_start(address, channels, interval=DEFAULT_INTERVAL, name=RING_NAME, csv_filename="power_supply_data.csv",
+            log_filename="acquisition.log"):
+    """Attach to a running acquisition process, or start one, and return an AcquisitionClient."""
+    try:
+        ring = SampleRing.attach(name)
+    except FileNotFoundError:
+        ring = None
+    if ring is not None:
+        if ring.alive():
+            client = AcquisitionClient(ring)
+            client.set_channels(channels)
+            return client
+        ring.close()  # Left behind by a process that died; the new writer needs the name
+        try:
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+
+    command = [sys.executable, os.path.abspath(__file__), "run", "--address", address,
+               "--channels", ",".join(str(channel) for channel in channels), "--interval", str(interval),
+               "--name", name, "--csv", os.path.abspath(csv_filename)]
+    with open(log_filename, "a") as log:
+        # Own session, so a GUI crash or Ctrl+C in its terminal does not take capture down with it
+        process = subprocess.Popen(command, stdout=log, stderr=log, stdin=subprocess.DEVNULL,
+                                   start_new_session=True)
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise AcquisitionError(f"Acquisition process exited with status {process.returncode}; see {log_filename}")
+        try:
+            ring = SampleRing.attach(name)
+        except FileNotFoundError:
+            time.sleep(0.05)
+            continue
+        if ring.listener()[0]:
+            return AcquisitionClient(ring, process)
+        ring.close()
+        time.sleep(0.05)
+    process.kill()
+    raise AcquisitionError(f"Acquisition process did not start within {START_TIMEOUT:.0f} s; see {log_filename}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Power supply acquisition process")
+    parser.add_argument("command", choices=("run", "status", "tail", "stop", "profile"))
+    parser.add_argument("--name", default=RING_NAME, help="shared memory name of the sample ring")
+    parser.add_argument("--address", default="SIM")
+    parser.add_argument("--channels", default="1,2,3,4")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="seconds between polls")
+    parser.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY)
+    parser.add_argument("--csv", default="power_supply_data.csv")
+    parser.add_argument("--count", type=int, default=10, help="rows for tail")
+    parser.add_argument("--seconds", type=float, default=10.0, help="sampling window for profile")
+    parser.add_argument("--output", default="acquisition.folded", help="folded stacks written by profile")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+        channels = [int(channel) for channel in args.channels.split(",") if channel]
+        run_acquisition(args.address, channels, args.interval, args.name, args.capacity, args.csv)
+        return
+    try:
+        ring = SampleRing.attach(args.name)
+    except FileNotFoundError:
+        sys.exit(f"No acquisition ring named {args.name}")
+    if args.command == "status":
+        for key, value in ring.status().items():
+            print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+    elif args.command == "profile":
+        client = AcquisitionClient(ring)
+        try:
+            folded, summary = client.profile(args.seconds)
+        finally:
+            client.connection.close()
+        with open(args.output, "w") as file:
+            file.write(folded)
+        print(summary)
+        print(f"Folded stacks written to {args.output}")
+    elif args.command == "tail":
+        print(",".join(RECORD_FIELDS))
+        for t, channel, voltage, current, latency in ring.latest(args.count):
+            print(f"{t:.6f},{int(channel)},{voltage},{current},{latency}")
+    else:
+        ring.request_stop()
+    ring.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""Local streaming API.
+
+One acquisition loop, any number of consumers.  The panel hands every
+sample to the server like any other log sink, and an asyncio loop on its
+own thread fans it out, so the instrument sees the same traffic however
+many clients are connected.  Enabled with KEYSIGHT_API_PORT=<port>
+(KEYSIGHT_API_HOST defaults to 127.0.0.1).
+
+  GET  /snapshot                       latest reading per channel and panel state, as JSON
+  GET  /stream?channels=1,2&rate=2     newline-delimited JSON, one sample per line
+  GET  /ws?channels=1,2&rate=2         the same samples as WebSocket text messages
+  POST /control                        {"channel": 1, "voltage": 5.0, "current": 0.1, "output": "ON"}
+
+/control needs "Content-Type: application/json" and "Authorization: Bearer
+<token>", where the token is generated per session (or taken from
+KEYSIGHT_API_TOKEN) and shown in the panel's output console.  Requests
+with an Origin header other than the server's own address are refused on
+every endpoint, so a web page open on the same machine can neither drive
+the outputs nor read the stream.
+
+rate is the most samples per second per channel a client wants; the rest
+are skipped.  Each client has a bounded queue: one that cannot keep up
+loses its oldest samples, never slows the others, and is told how many
+it missed with a {"dropped": n} line.
+
+    curl -N "http://127.0.0.1:8765/stream?channels=1&rate=1"
+    curl -H "Authorization: Bearer $TOKEN" -H "Content-Type: application/json" \
+         -d '{"channel": 1, "output": "OFF"}' http://127.0.0.1:8765/control
+"""
+import asyncio
+import base64
+import collections
+import hashlib
+import hmac
+import json
+import secrets
+import struct
+import threading
+import urllib.parse
+
+from log_sinks import LogSink
+
+QUEUE_SIZE = 1000  # Samples buffered per client before the oldest are dropped
+MAX_HEADER_BYTES = 16384
+MAX_BODY_BYTES = 65536
+_WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_REASONS = {200: "OK", 101: "Switching Protocols", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden",
+            404: "Not Found", 405: "Method Not Allowed", 415: "Unsupported Media Type",
+            500: "Internal Server Error"}
+
+
+class RequestRejected(Exception):
+    def __init__(self, status, message):
+        super(RequestRejected, self).__init__(message)
+        self.status = status
+
+
+def _sample_dict(channel, timestamp, voltage, current, latency):
+    return {"channel": channel, "t": timestamp, "voltage": voltage, "current": current, "latency": latency}
+
+
+class Subscriber:
+    """One streaming client: its filter, decimation state and bounded queue."""
+
+    def __init__(self, channels=None, rate=None, queue_size=QUEUE_SIZE):
+        self.channels = channels  # None for all
+        self.interval = 1.0 / rate if rate else 0.0
+        self.queue = asyncio.Queue(queue_size)
+        self.last = {}  # Timestamp of the last sample sent, per channel
+        self.sent = 0
+        self.dropped = 0
+        self.reported = 0  # Drop count already told to the client
+
+    def offer(self, sample):
+        channel, timestamp = sample[0], sample[1]
+        if self.channels is not None and channel not in self.channels:
+            return
+        if self.interval and timestamp - self.last.get(channel, float("-inf")) < self.interval:
+            return
+        self.last[channel] = timestamp
+        if self.queue.full():
+            self.queue.get_nowait()  # Slow client: keep the newest samples
+            self.dropped += 1
+        self.queue.put_nowait(sample)
+
+    async def next_batch(self):
+        batch = [await self.queue.get()]
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        self.sent += len(batch)
+        messages = [json.dumps(_sample_dict(*sample)) for sample in batch]
+        if self.dropped != self.reported:
+            messages.append(json.dumps({"dropped": self.dropped}))
+            self.reported = self.dropped
+        return messages
+
+
+class StreamServer(LogSink):
+    def __init__(self, host="127.0.0.1", port=8765, snapshot=None, control=None, queue_size=QUEUE_SIZE,
+                 token=None):
+        self.host = host
+        self.port = port  # 0 picks a free port; the bound one is stored here after start()
+        self.snapshot = snapshot  # Callable returning panel state for /snapshot
+        self.control = control  # Callable taking a command dict; runs off the event loop
+        self.token = token or secrets.token_urlsafe(16)  # Bearer token /control requires
+        self.queue_size = queue_size
+        self.latest = {}  # Newest sample per channel
+        self.subscribers = set()
+        self.pending = collections.deque()  # Samples handed over by write(), drained on the loop
+        self.dispatch_scheduled = False
+        self.loop = None
+        self.server = None
+        self.error = None
+        self.started = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="api-server", daemon=True)
+        self.thread.start()
+        self.started.wait(10.0)
+        if self.error is not None:
+            raise self.error
+        return self
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)  # gather() at shutdown looks the loop up on this thread
+        try:
+            self.server = self.loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port, limit=MAX_HEADER_BYTES))
+            self.port = self.server.sockets[0].getsockname()[1]
+        except OSError as e:
+            self.error = e
+            self.started.set()
+            self.loop.close()
+            return
+        self.started.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            # Streams never finish on their own; cancel them so the server can close
+            self.server.close()
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.run_until_complete(self.server.wait_closed())
+            self.loop.close()
+
+    # Producer side, called from the acquisition loop
+
+    def write(self, channel, timestamp, voltage, current, latency=None):
+        sample = (channel, timestamp, voltage, current, latency)
+        self.latest[channel] = sample
+        if not self.subscribers or self.loop is None:
+            return
+        self.pending.append(sample)
+        # One wakeup per burst rather than per sample
+        if not self.dispatch_scheduled:
+            self.dispatch_scheduled = True
+            self.loop.call_soon_threadsafe(self._dispatch)
+
+    def _dispatch(self):
+        self.dispatch_scheduled = False
+        while self.pending:
+            sample = self.pending.popleft()
+            for subscriber in self.subscribers:
+                subscriber.offer(sample)
+
+    def close(self):
+        if self.loop is not None and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=5.0)
+
+    # Connection handling
+
+    async def _handle(self, reader, writer):
+        try:
+            method, path, query, headers = await self._read_request(reader)
+            self._check_origin(headers)
+            if path == "/snapshot" and method == "GET":
+                await self._respond(writer, 200, self._snapshot())
+            elif path == "/control":
+                if method != "POST":
+                    await self._respond(writer, 405, {"error": "use POST"})
+                else:
+                    await self._control(reader, writer, headers)
+            elif path in ("/stream", "/ws") and method == "GET":
+                subscriber = Subscriber(_parse_channels(query), _parse_rate(query), self.queue_size)
+                if path == "/ws":
+                    await self._stream_websocket(reader, writer, headers, subscriber)
+                else:
+                    await self._stream_lines(writer, subscriber)
+            else:
+                await self._respond(writer, 404, {"error": f"no such endpoint: {path}"})
+        except RequestRejected as e:
+            await self._respond(writer, e.status, {"error": str(e)})
+        except ValueError as e:
+            await self._respond(writer, 400, {"error": str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass  # Client went away
+        except Exception as e:  # Instrument errors from control, or panel state not ready yet
+            await self._respond(writer, 500, {"error": str(e)})
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+        request_line, *header_lines = head.split("\r\n")
+        try:
+            method, target, _ = request_line.split(" ", 2)
+        except ValueError:
+            raise ValueError("malformed request line") from None
+        headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(":")
+            if name:
+                headers[name.strip().lower()] = value.strip()
+        url = urllib.parse.urlsplit(target)
+        return method.upper(), url.path, urllib.parse.parse_qs(url.query), headers
+
+    async def _respond(self, writer, status, body):
+        payload = json.dumps(body).encode()
+        writer.write(f"HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload)
+        await writer.drain()
+
+    def _snapshot(self):
+        state = self.snapshot() if self.snapshot is not None else {}
+        state["channels"] = {str(sample[0]): _sample_dict(*sample) for sample in self.latest.values()}
+        state["clients"] = [{"channels": sorted(s.channels) if s.channels is not None else None,
+                             "sent": s.sent, "dropped": s.dropped} for s in self.subscribers]
+        return state
+
+    def _check_origin(self, headers):
+        # Browsers send Origin on cross-site requests; non-browser clients usually send none
+        origin = headers.get("origin")
+        if origin is None:
+            return
+        url = urllib.parse.urlsplit(origin)
+        if (url.scheme != "http" or url.port != self.port
+                or url.hostname not in {self.host, "127.0.0.1", "localhost", "::1"}):
+            raise RequestRejected(403, f"requests from {origin} are not allowed")
+
+    def _check_control(self, headers):
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            raise RequestRejected(415, "Content-Type must be application/json")
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode(), self.token.encode()):
+            raise RequestRejected(401, "missing or wrong bearer token")
+
+    async def _control(self, reader, writer, headers):
+        self._check_control(headers)
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY_BYTES:
+            raise ValueError("request body too large")
+        try:
+            command = json.loads(await reader.readexactly(length))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"invalid JSON: {e}") from None
+        if not isinstance(command, dict):
+            raise ValueError("expected a JSON object")
+        if self.control is None:
+            raise ValueError("control is not available")
+        await self._respond(writer, 200, await self.loop.run_in_executor(None, self.control, command))
+
+    async def _stream_lines(self, writer, subscriber):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        await writer.drain()
+        self.subscribers.add(subscriber)
+        try:
+            while True:
+                messages = await subscriber.next_batch()
+                writer.write(("\n".join(messages) + "\n").encode())
+                await writer.drain()  # Only this client waits on its socket
+        finally:
+            self.subscribers.discard(subscriber)
+
+    async def _stream_websocket(self, reader, writer, headers, subscriber):
+        key = headers.get("sec-websocket-key")
+        if headers.get("upgrade", "").lower() != "websocket" or not key:
+            raise ValueError("expected a WebSocket upgrade")
+        accept = base64.b64encode(hashlib.sha1((key + _WEBSOCKET_GUID).encode()).digest()).decode()
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        await writer.drain()
+        self.subscribers.add(subscriber)
+        # The client only ever sends pings and the close frame; watch for those alongside the stream
+        listener = asyncio.ensure_future(self._websocket_listen(reader, writer))
+        try:
+            while not listener.done():
+                batch = asyncio.ensure_future(subscriber.next_batch())
+                await asyncio.wait((batch, listener), return_when=asyncio.FIRST_COMPLETED)
+                if not batch.done():
+                    batch.cancel()
+                    break
+                for message in batch.result():
+                    writer.write(_websocket_frame(0x1, message.encode()))
+                await writer.drain()
+        finally:
+            self.subscribers.discard(subscriber)
+            listener.cancel()
+
+    async def _websocket_listen(self, reader, writer):
+        while True:
+            first, second = await reader.readexactly(2)
+            opcode, length = first & 0x0F, second & 0x7F
+            if length == 126:
+                length = struct.unpack("!H", await reader.readexactly(2))[0]
+            elif length == 127:
+                length = struct.unpack("!Q", await reader.readexactly(8))[0]
+            if length > MAX_BODY_BYTES:
+                return
+            mask = await reader.readexactly(4) if second & 0x80 else b"\0\0\0\0"
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(await reader.readexactly(length)))
+            if opcode == 0x8:  # Close: echo it and stop streaming
+                writer.write(_websocket_frame(0x8, payload[:2]))
+                return
+            if opcode == 0x9:
+                writer.write(_websocket_frame(0xA, payload))
+
+
+def _websocket_frame(opcode, payload):
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+def _parse_channels(query):
+    if "channels" not in query:
+        return None
+    try:
+        return {int(channel) for value in query["channels"] for channel in value.split(",") if channel}
+    except ValueError:
+        raise ValueError("channels must be a comma-separated list of channel numbers") from None
+
+
+def _parse_rate(query):
+    if "rate" not in query:
+        return None
+    try:
+        rate = float(query["rate"][0])
+    except ValueError:
+        raise ValueError("rate must be a number of samples per second") from None
+    if rate <= 0:
+        raise ValueError("rate must be positive")
+    return rate
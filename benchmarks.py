@@ -0,0 +1,698 @@
+"""Performance benchmarks for the acquisition, logging and plotting paths.
+
+Runs PowerSupplyControlPanel against the in-process simulator with an
+offscreen Qt platform, so no instrument or display is needed.  Results are
+written as JSON and can be compared against an earlier run:
+
+    python benchmarks.py --output bench_new.json --compare bench_old.json
+
+The comparison exits with status 1 when any metric regressed by more than
+--threshold percent, which makes it usable as a CI gate.
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QEventLoop, QTimer
+from PyQt5.QtWidgets import QApplication, QDialog
+
+from Keysight_GUI import PowerSupplyControlPanel
+from n67xx_simulator import SimulatedInstrument, SimulatedN67xx
+from scpi import SessionProxy
+from scpi_stats import InstrumentedSession, ScpiStats
+from scpi_trace import ReplayInstrument
+from session_index import SessionIndex, parse_rows
+from log_archive import SegmentedLogWriter
+from session_db import SessionDatabase, channel_stats
+from api_server import StreamServer
+from acquisition import attach_or_start
+from profiles import ProfileStore
+from log_sinks import CsvLogSink
+from columnar_export import export_rows
+from profiling import ProfiledSession
+from sweep import SweepDefinition, SweepEngine
+
+# Metric name suffixes that improve as they grow; everything else is "lower is better"
+HIGHER_IS_BETTER = ("_per_s", "_ratio")
+# Metrics whose run-to-run noise exceeds the usual --threshold, with the percentage they are gated at instead
+NOISY_THRESHOLDS = {
+    "memory.rss_bytes_per_hour": 100.0,  # Allocator arenas and Qt caches; tracemalloc's figure is the precise one
+}
+
+
+class CountingInstrument(SessionProxy):
+    # Every program message is one network round trip on a VXI-11 session
+    _own_attributes = ("_session", "writes")
+
+    def __init__(self, session):
+        super(CountingInstrument, self).__init__(session)
+        self.writes = 0
+
+    def write(self, message):
+        self.writes += 1
+        return self._session.write(message)
+
+    def query(self, message):
+        self.write(message)
+        return self._session.read()
+
+
+class BenchmarkContext:
+    def __init__(self, latency, trace=None):
+        self.latency = latency
+        self.trace = trace  # Replay a recorded session instead of simulating
+        self.app = QApplication.instance() or QApplication([])
+        self.panels = []
+
+    def make_panel(self, channels=(1, 2, 3, 4), latency=None):
+        dialog = QDialog()
+        panel = PowerSupplyControlPanel(dialog)
+        # Timers are driven explicitly by each benchmark
+        panel.timer.stop()
+        panel.protection_status_timer.stop()
+        if self.trace:
+            session = ReplayInstrument(self.trace, loop=True)
+        else:
+            device = SimulatedN67xx(latency=self.latency if latency is None else latency, noise=0.001, seed=1)
+            for channel in channels:
+                device.handle(f"VOLT {channel},(@{channel});:CURR 1,(@{channel});:OUTP ON,(@{channel})")
+            session = SimulatedInstrument(device)
+        panel.instrument = CountingInstrument(session)
+        panel.selected_channels = list(channels)
+        self.panels.append((dialog, panel))
+        return panel
+
+    def pump(self, milliseconds):
+        loop = QEventLoop()
+        QTimer.singleShot(int(milliseconds), loop.quit)
+        loop.exec_()
+
+    def close(self):
+        for dialog, panel in self.panels:
+            if panel.dashboard is not None:
+                panel.dashboard.close()
+            dialog.close()
+        self.panels = []
+        self.app.processEvents()
+
+
+def _timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# Benchmarks: each takes (context, args) and returns a flat {metric: value} dict
+
+def bench_live_tick(context, args):
+    """SCPI round trips and wall time per update_live_data tick against channel count."""
+    metrics = {}
+    for count in range(1, 5):
+        panel = context.make_panel(channels=range(1, count + 1))
+        instrument = panel.instrument
+        panel.update_live_data()  # Warm up
+        instrument.writes = 0
+        samples = _timed(panel.update_live_data, args.ticks)
+        prefix = f"live_tick.channels={count}"
+        metrics[f"{prefix}.round_trips"] = instrument.writes / args.ticks
+        metrics[f"{prefix}.wall_ms"] = statistics.median(samples) * 1000
+        metrics[f"{prefix}.p95_wall_ms"] = sorted(samples)[int(len(samples) * 0.95) - 1] * 1000
+    return metrics
+
+
+def bench_scpi_stats_overhead(context, args):
+    """Cost of the SCPI statistics wrapper on a four-channel tick, disabled and enabled."""
+    panel = context.make_panel()
+    raw = panel.instrument
+    metrics = {}
+    for label, session in (("raw", raw),
+                           ("disabled", InstrumentedSession(raw, ScpiStats(enabled=False))),
+                           ("enabled", InstrumentedSession(raw, ScpiStats(enabled=True)))):
+        panel.instrument = session
+        panel.update_live_data()
+        metrics[f"scpi_stats.{label}.wall_ms"] = statistics.median(_timed(panel.update_live_data, args.ticks)) * 1000
+    panel.instrument = raw
+    return metrics
+
+
+def bench_profiler_overhead(context, args):
+    """Cost of slot timing and the VISA-wait proxy on a four-channel tick, disabled and enabled."""
+    panel = context.make_panel()
+    raw = panel.instrument
+    panel.instrument = ProfiledSession(raw, panel.profiler)
+    tick = panel.profiler.wrap("update_live_data", panel.update_live_data)
+    metrics = {"profiler.raw.wall_ms": statistics.median(_timed(panel.update_live_data, args.ticks)) * 1000}
+    for label, enabled in (("disabled", False), ("enabled", True)):
+        panel.profiler.set_enabled(enabled)
+        tick()
+        metrics[f"profiler.{label}.wall_ms"] = statistics.median(_timed(tick, args.ticks)) * 1000
+    panel.profiler.set_enabled(False)
+    panel.instrument = raw
+    return metrics
+
+
+def bench_csv_logging(context, args):
+    """log_data_to_csv throughput."""
+    panel = context.make_panel()
+    rows = args.rows
+    now = panel.clock.now()
+    start = time.perf_counter()
+    for row in range(rows):
+        panel.log_data_to_csv(row % 4 + 1, now, 5.0, 0.5, 0.002)
+    elapsed = time.perf_counter() - start
+    return {"csv_logging.rows_per_s": rows / elapsed}
+
+
+def bench_archive_logging(context, args):
+    """Compressed segment archive: write throughput and size against the flat CSV."""
+    rows = args.rows
+    with tempfile.TemporaryDirectory() as directory:
+        flat = CsvLogSink(os.path.join(directory, "flat.csv"))
+        archive = SegmentedLogWriter(os.path.join(directory, "archive"))
+        base = 1.7e9
+        samples = [(row % 4 + 1, base + row // 4 + 0.007 * (row % 4), 5.0 + (row * 7919 % 13) * 0.0001,
+                    0.5 + (row * 104729 % 11) * 0.0001, 0.002 + (row * 31 % 17) * 0.00001) for row in range(rows)]
+        start = time.perf_counter()
+        for sample in samples:
+            archive.write(*sample)
+        archive.close()
+        elapsed = time.perf_counter() - start
+        for sample in samples:
+            flat.write(*sample)
+        flat.close()
+        archive_bytes = sum(os.path.getsize(os.path.join(directory, "archive", name))
+                            for name in os.listdir(os.path.join(directory, "archive")))
+        ratio = os.path.getsize(os.path.join(directory, "flat.csv")) / archive_bytes
+    return {"archive_logging.rows_per_s": rows / elapsed, "archive_logging.compression_ratio": ratio}
+
+
+def bench_session_db(context, args):
+    """SQLite session database: producer-side write cost, committed throughput and an indexed range query."""
+    rows = args.rows
+    with tempfile.TemporaryDirectory() as directory:
+        database = SessionDatabase(os.path.join(directory, "sessions.db"))
+        database.start_session("bench")
+        base = 1.7e9
+        start = time.perf_counter()
+        for row in range(rows):
+            database.write(row % 4 + 1, base + row // 4, 5.0, 0.5, 0.002)
+        posted = time.perf_counter() - start
+        database.flush(timeout=600.0)
+        committed = time.perf_counter() - start
+        reader = database.connect_reader()
+        start = time.perf_counter()
+        channel_stats(reader, 2, base + rows // 8, base + rows // 8 + 60)
+        query = time.perf_counter() - start
+        reader.close()
+        database.close()
+    return {
+        "session_db.write_us": posted / rows * 1e6,
+        "session_db.rows_per_s": rows / committed,
+        "session_db.query_ms": query * 1000,
+    }
+
+
+def bench_api_fanout(context, args):
+    """Streaming API: producer-side cost and delivered rows/s with many clients attached."""
+    clients = 16
+    rows = args.rows
+    server = StreamServer(port=0, queue_size=rows).start()
+    received = [0] * clients
+
+    def consume(index):
+        with socket.create_connection(("127.0.0.1", server.port)) as connection:
+            connection.sendall(b"GET /stream HTTP/1.1\r\n\r\n")
+            stream = connection.makefile("rb")
+            while stream.readline() != b"\r\n":
+                pass  # Response headers
+            while received[index] < rows:
+                if not stream.readline():
+                    break
+                received[index] += 1
+
+    readers = [threading.Thread(target=consume, args=(index,), daemon=True) for index in range(clients)]
+    for reader in readers:
+        reader.start()
+    while len(server.subscribers) < clients:
+        time.sleep(0.01)
+    now = time.time()
+    start = time.perf_counter()
+    for row in range(rows):
+        server.write(row % 4 + 1, now + row * 0.001, 5.0, 0.5, 0.002)
+    posted = time.perf_counter() - start
+    for reader in readers:
+        reader.join(timeout=120.0)
+    delivered = time.perf_counter() - start
+    server.close()
+    return {
+        "api_fanout.write_us": posted / rows * 1e6,
+        "api_fanout.rows_per_s": sum(received) / delivered,
+    }
+
+
+def bench_acquisition_process(context, args):
+    """Poll timing in a separate acquisition process while this process is kept busy."""
+    interval = 0.01
+    seconds = 2.0 if args.quick else 10.0
+    with tempfile.TemporaryDirectory() as directory:
+        client = attach_or_start("SIM", [1], interval, name=f"keysight_bench_{os.getpid()}",
+                                 csv_filename=os.path.join(directory, "data.csv"),
+                                 log_filename=os.path.join(directory, "acquisition.log"))
+        since = client.ring.seq
+        stamps = []
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            sum(index * index for index in range(200000))  # Stand-in for a heavy GUI frame, holding the GIL
+            since, rows, _ = client.ring.read(since)
+            stamps.extend(rows[:, 0].tolist())
+        status = client.ring.status()
+        client.close()
+    deviation = sorted(abs(delta - interval) for delta in (b - a for a, b in zip(stamps, stamps[1:])))
+    return {
+        "acquisition_process.interval_error_p99_ms": deviation[int(len(deviation) * 0.99)] * 1000,
+        "acquisition_process.jitter_max_ms": status["jitter_max_ms"],
+        "acquisition_process.overruns": status["overruns"],
+    }
+
+
+def bench_profile_restore(context, args):
+    """Round trips to restore a four-channel setup: one write per setting, one batch, or *RCL."""
+    panel = context.make_panel()
+    instrument = panel.instrument
+    with tempfile.TemporaryDirectory() as directory:
+        store = ProfileStore(os.path.join(directory, "profiles.json"))
+        store.capture(instrument, "bench", panel.selected_channels)
+        state = store.get("bench")["state"]
+        metrics = {}
+        instrument.writes = 0
+        start = time.perf_counter()
+        for channel, settings in state.items():  # What the Apply buttons and OVP/OCP dialogs send
+            for header, name in (("VOLT:PROT", "ovp"), ("CURR", "current"), ("CURR:PROT:DEL", "ocp_delay"),
+                                 ("VOLT:SLEW", "slew"), ("VOLT", "voltage")):
+                instrument.write(f"{header} {settings[name]}, (@{channel})")
+            instrument.write(f"CURR:PROT:STAT {'ON' if settings['ocp'] else 'OFF'}, (@{channel})")
+            instrument.write(f"OUTP {'ON' if settings['output'] else 'OFF'},(@{channel})")
+        metrics["profile_restore.per_setting.round_trips"] = instrument.writes
+        metrics["profile_restore.per_setting.ms"] = (time.perf_counter() - start) * 1000
+        for label, slot in (("rcl", store.profiles["bench"]["slot"]), ("batch", None)):
+            store.profiles["bench"]["slot"] = slot
+            instrument.writes = 0
+            _, elapsed = store.restore(instrument, "bench")
+            metrics[f"profile_restore.{label}.round_trips"] = instrument.writes
+            metrics[f"profile_restore.{label}.ms"] = elapsed * 1000
+    return metrics
+
+
+def bench_sweep(context, args):
+    """A two-channel I-V sweep: list-driven engine against a set-and-measure round trip per point.
+
+    The per-point path is timed on a subset and scaled to the full sweep; it
+    leaves out the 2 s protection-check delay that apply_settings adds.  Runs
+    at --sweep-latency, as the comparison is about round trips over a link.
+    """
+    steps = 50 if args.quick else 200
+    panel = context.make_panel(channels=(1, 2), latency=args.sweep_latency)
+    instrument = panel.instrument
+    definition = SweepDefinition(0.0, 5.0, steps, 0.002, (1, 2), aperture=0.001)
+    instrument.writes = 0
+    start = time.perf_counter()
+    SweepEngine(instrument, panel.clock).run(definition)
+    metrics = {"sweep.pipelined.round_trips": instrument.writes,
+               "sweep.pipelined.s": time.perf_counter() - start}
+    subset = definition.setpoints()[:min(steps, 20)]
+    instrument.writes = 0
+    start = time.perf_counter()
+    for voltage in subset:  # What apply_settings and read_channel_settings send
+        for channel in definition.channels:
+            instrument.write(f"VOLT {voltage:g}, (@{channel})")
+        time.sleep(definition.dwell)
+        for channel in definition.channels:
+            instrument.query(f"MEAS:VOLT? (@{channel})")
+            instrument.query(f"MEAS:CURR? (@{channel})")
+    scale = steps / len(subset)
+    metrics["sweep.per_point.round_trips"] = instrument.writes * scale
+    metrics["sweep.per_point.s"] = (time.perf_counter() - start) * scale
+    return metrics
+
+
+def bench_reconnect(context, args):
+    """A one-second link outage: worst GUI tick while it lasts and time to recover once the link is back."""
+    panel = context.make_panel()
+    device = SimulatedN67xx()
+    panel.supervisor.open_session = lambda: SimulatedInstrument(device)
+    panel.instrument = panel.supervisor.wrap(SimulatedInstrument(device))
+    panel.update_live_data()
+    device.drop_link(1.0)
+    link_up = time.perf_counter() + 1.0
+    worst = 0.0
+    deadline = link_up + 30.0
+    while panel.supervisor.reconnects == 0 and time.perf_counter() < deadline:
+        start = time.perf_counter()
+        panel.update_live_data()
+        worst = max(worst, time.perf_counter() - start)
+        context.pump(20)
+    recovered = time.perf_counter() - link_up
+    panel.supervisor.stop()
+    return {"reconnect.max_tick_ms": worst * 1000, "reconnect.recovery_s": recovered}
+
+
+def bench_console(context, args):
+    """add_to_output throughput and the cost of flushing a burst into the console."""
+    panel = context.make_panel()
+    console = panel.output_window
+    console.flush_timer.stop()
+    messages = args.rows
+    start = time.perf_counter()
+    for index in range(messages):
+        panel.add_to_output(f"Channel {index % 4 + 1} Voltage: 5.000 V, Current: 0.500 A")
+    posted = time.perf_counter() - start
+    start = time.perf_counter()
+    console.flush()
+    flushed = time.perf_counter() - start
+    return {
+        "console.add_per_s": messages / posted,
+        "console.flush_ms": flushed * 1000,
+        "console.lines": console.blockCount(),
+    }
+
+
+def _fill_samples(panel, rows, channels=4):
+    # Synthetic history, split across the channels like the acquisition loop would
+    base = panel.clock.now() - rows
+    for row in range(rows):
+        panel.samples[row % channels + 1].append(base + row // channels, 5.0 + row % 7 * 0.001, 0.5 + row % 5 * 0.001)
+
+
+def bench_plot_update(context, args):
+    """Dashboard render cost for 4 channels x 3 traces against history length."""
+    metrics = {}
+    for rows in args.log_lengths:
+        panel = context.make_panel()
+        _fill_samples(panel, rows)
+        for channel in range(1, 5):
+            panel.show_live_graph(channel)
+        dashboard = panel.dashboard
+        dashboard.render_timer.stop()
+
+        def render():
+            # One new sample per channel, as after an acquisition tick
+            for channel in range(1, 5):
+                panel.samples[channel].append(panel.clock.now(), 5.0, 0.5)
+            dashboard.render()
+
+        dashboard.span_combo.setCurrentIndex(dashboard.span_combo.count() - 1)  # Whole history
+        samples = _timed(render, args.repeat)
+        metrics[f"plot_update.rows={rows}.ms"] = statistics.median(samples) * 1000
+        dashboard.span_combo.setCurrentIndex(0)  # Scrolling 60 s window
+        samples = _timed(render, args.repeat)
+        metrics[f"plot_update.rows={rows}.window_ms"] = statistics.median(samples) * 1000
+        dashboard.close()
+    return metrics
+
+
+def bench_ui_updates(context, args):
+    """Widget writes that survive change detection, and the cost of one frame flush."""
+    panel = context.make_panel()
+    view = panel.view
+    panel.update_live_data()
+    view.flush()
+    view.applied = view.skipped = 0
+    flush_samples = []
+    for _ in range(args.ticks):
+        panel.update_live_data()
+        start = time.perf_counter()
+        view.flush()
+        flush_samples.append(time.perf_counter() - start)
+    return {
+        "ui.widget_writes_per_tick": view.applied / args.ticks,
+        "ui.skipped_writes_per_tick": view.skipped / args.ticks,
+        "ui.frame_flush_ms": statistics.median(flush_samples) * 1000,
+    }
+
+
+def bench_history(context, args):
+    """Session browser: index build, reopen and a one-hour slice of a long log."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "history.csv")
+        base = 1.7e9
+        with open(path, "w", newline="") as file:
+            file.write("Channel,Time,Voltage,Current,Latency_ms\n")
+            file.writelines(f"{row % 4 + 1},{base + row // 4:.6f},{5.0 + row % 7 * 0.001},{0.5 + row % 5 * 0.001},2.000\r\n"
+                            for row in range(args.history_rows))
+        start = time.perf_counter()
+        SessionIndex.open(path)
+        built = time.perf_counter() - start
+        start = time.perf_counter()
+        index = SessionIndex.open(path)
+        reopened = time.perf_counter() - start
+        middle = base + args.history_rows // 8
+        samples = _timed(lambda: index.read(middle, middle + 3600, [1]), args.repeat)
+    return {
+        "history.index_build_ms": built * 1000,
+        "history.reopen_ms": reopened * 1000,
+        "history.hour_slice_ms": statistics.median(samples) * 1000,
+    }
+
+
+def bench_columnar_export(context, args):
+    """Columnar NPZ export of a long CSV log, and loading it back against parsing the CSV."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "session.csv")
+        output = os.path.join(directory, "session.npz")
+        base = 1.7e9
+        with open(path, "w", newline="") as file:
+            file.write("Channel,Time,Voltage,Current,Latency_ms\n")
+            file.writelines(f"{row % 4 + 1},{base + row // 4:.6f},{5.0 + row % 7 * 0.001},{0.5 + row % 5 * 0.001},2.000\r\n"
+                            for row in range(args.history_rows))
+        index = SessionIndex.open(path)
+        tracemalloc.start()
+        start = time.perf_counter()
+        export_rows(index.iter_rows(), output)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        def load_csv():
+            with open(path, "rb") as file:
+                file.seek(index.data_offset)
+                return parse_rows(file.read())
+
+        csv_load = _timed(load_csv, args.repeat)
+        npz_load = _timed(lambda: dict(np.load(output)), args.repeat)
+    return {
+        "columnar_export.rows_per_s": args.history_rows / elapsed,
+        "columnar_export.peak_mb": peak / 1e6,
+        "columnar_export.csv_load_ms": statistics.median(csv_load) * 1000,
+        "columnar_export.npz_load_ms": statistics.median(npz_load) * 1000,
+    }
+
+
+def bench_event_loop_stall(context, args):
+    """GUI event-loop stalls while the panel polls a slow instrument and draws a graph."""
+    panel = context.make_panel(latency=args.stall_latency)
+    _fill_samples(panel, args.log_lengths[0])
+    panel.show_live_graph(1)
+    panel.timer.start(args.poll_ms)
+    panel.protection_status_timer.start(args.poll_ms * 5)
+
+    interval = 5
+    gaps = []
+    last = [time.perf_counter()]
+
+    def heartbeat():
+        now = time.perf_counter()
+        gaps.append(max(0.0, (now - last[0]) * 1000 - interval))
+        last[0] = now
+
+    heartbeat_timer = QTimer()
+    heartbeat_timer.timeout.connect(heartbeat)
+    heartbeat_timer.start(interval)
+    start = time.perf_counter()
+    context.pump(args.stall_seconds * 1000)
+    elapsed = time.perf_counter() - start
+    heartbeat_timer.stop()
+    panel.timer.stop()
+    panel.protection_status_timer.stop()
+    panel.dashboard.close()
+
+    gaps.sort()
+    return {
+        "event_loop.max_stall_ms": gaps[-1] if gaps else 0.0,
+        "event_loop.p99_stall_ms": gaps[int(len(gaps) * 0.99) - 1] if gaps else 0.0,
+        "event_loop.stalled_fraction": sum(gaps) / 1000 / elapsed,
+    }
+
+
+def bench_memory_growth(context, args):
+    """Memory growth over simulated hours of 1 Hz polling on four channels."""
+    panel = context.make_panel(latency=0.0)
+    ticks_per_hour = 3600
+    gc.collect()
+    tracemalloc.start()
+    python_start = tracemalloc.get_traced_memory()[0]
+    rss_start = _rss_bytes()
+    for _ in range(int(args.hours * ticks_per_hour)):
+        panel.update_live_data()
+    context.app.processEvents()
+    gc.collect()
+    python_end = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    rss_end = _rss_bytes()
+
+    metrics = {"memory.python_bytes_per_hour": (python_end - python_start) / args.hours}
+    if rss_start is not None and rss_end is not None:
+        metrics["memory.rss_bytes_per_hour"] = (rss_end - rss_start) / args.hours
+    return metrics
+
+
+BENCHMARKS = {
+    "live_tick": bench_live_tick,
+    "scpi_stats_overhead": bench_scpi_stats_overhead,
+    "profiler_overhead": bench_profiler_overhead,
+    "csv_logging": bench_csv_logging,
+    "archive_logging": bench_archive_logging,
+    "session_db": bench_session_db,
+    "api_fanout": bench_api_fanout,
+    "acquisition_process": bench_acquisition_process,
+    "profile_restore": bench_profile_restore,
+    "sweep": bench_sweep,
+    "reconnect": bench_reconnect,
+    "console": bench_console,
+    "plot_update": bench_plot_update,
+    "ui_updates": bench_ui_updates,
+    "history": bench_history,
+    "columnar_export": bench_columnar_export,
+    "event_loop_stall": bench_event_loop_stall,
+    "memory_growth": bench_memory_growth,
+}
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    results = {
+        "meta": {
+            "revision": _git_revision(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "latency_s": args.latency,
+            "sweep_latency_s": args.sweep_latency,
+            "trace": args.trace,
+        },
+        "metrics": {},
+    }
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        context = BenchmarkContext(args.latency, args.trace and os.path.abspath(args.trace))
+        try:
+            for name in args.only or BENCHMARKS:
+                print(f"Running {name}...", file=sys.stderr)
+                results["metrics"].update(BENCHMARKS[name](context, args))
+                context.close()
+        finally:
+            context.close()
+            os.chdir(original_dir)
+    return results
+
+
+def compare(new, old, threshold):
+    """Print a comparison table and return the list of regressed metric names."""
+    regressions = []
+    print(f"{'metric':<45} {'old':>12} {'new':>12} {'change':>9}")
+    for name, value in sorted(new["metrics"].items()):
+        previous = old["metrics"].get(name)
+        if previous is None:
+            print(f"{name:<45} {'-':>12} {value:>12.4g} {'new':>9}")
+            continue
+        change = (value - previous) / abs(previous) * 100 if previous else 0.0
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        flag = " REGRESSION" if worse > max(threshold, NOISY_THRESHOLDS.get(name, 0.0)) else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<45} {previous:>12.4g} {value:>12.4g} {change:>+8.1f}%{flag}")
+    return regressions
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Keysight GUI performance benchmarks")
+    parser.add_argument("--output", default="bench_output.json", help="where to write the JSON results")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="run a subset of the benchmarks")
+    parser.add_argument("--quick", action="store_true", help="smaller workloads for a fast smoke run")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated seconds per SCPI command")
+    parser.add_argument("--trace", help="replay a recorded SCPI session instead of the simulator")
+    parser.add_argument("--stall-latency", type=float, default=0.002,
+                        help="simulated seconds per SCPI command for the event-loop benchmark")
+    parser.add_argument("--stall-seconds", type=float, default=5.0)
+    parser.add_argument("--sweep-latency", type=float, default=0.002,
+                        help="simulated seconds per SCPI command for the sweep benchmark")
+    parser.add_argument("--poll-ms", type=int, default=100, help="poll interval for the event-loop benchmark")
+    parser.add_argument("--hours", type=float, default=2.0, help="simulated hours for the memory benchmark")
+    args = parser.parse_args(argv)
+
+    args.ticks = 50 if args.quick else 500
+    args.rows = 5000 if args.quick else 50000
+    args.repeat = 3 if args.quick else 7
+    args.log_lengths = [1000, 10000] if args.quick else [1000, 10000, 100000]
+    args.history_rows = 200000 if args.quick else 2419200  # A week at 1 Hz x 4 channels
+    if args.quick:
+        args.hours = min(args.hours, 0.25)
+        args.stall_seconds = min(args.stall_seconds, 2.0)
+    return args
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    results = run(args)
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if compare(results, baseline, args.threshold):
+            return 1
+    else:
+        for name, value in sorted(results["metrics"].items()):
+            print(f"{name:<45} {value:>12.4g}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
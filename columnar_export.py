@@ -0,0 +1,188 @@
+"""Columnar export of logged samples.
+
+Writes parsed log rows (a whole session or a time range, from a CSV log or
+a log archive) to a binary file with one float64 column per channel
+quantity:
+
+    ch1_time  ch1_voltage  ch1_current  ch1_latency_ms  ch2_time  ...
+
+Times are epoch seconds.  Every column has the same length; a channel with
+fewer samples is padded with NaN at the end, so the file loads straight
+into a table:
+
+    archive = np.load("session.npz")
+    columns = {name: archive[name] for name in archive.files if name != "metadata"}
+    frame = pandas.read_parquet("session.parquet")
+
+Export metadata, such as the source log, goes into the Parquet schema
+metadata or the HDF5 file attributes; an NPZ holds it as a one-element
+JSON string array named "metadata":
+
+    metadata = json.loads(archive["metadata"][0])
+
+NPZ is always available; Parquet needs pyarrow and HDF5 needs h5py.  Rows
+arrive in chunks, each chunk is split by channel with vectorized masks and
+appended to one temporary file per column, and the output is then written
+from those files a slice at a time, so memory use does not grow with the
+session length.  The format follows the file extension.
+"""
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+QUANTITIES = ("time", "voltage", "current", "latency_ms")  # Columns 1-4 of a parsed row
+EXTENSIONS = {".npz": "npz", ".parquet": "parquet", ".h5": "hdf5", ".hdf5": "hdf5"}
+WRITE_ROWS = 1 << 20  # Rows per slice (and Parquet row group) when writing the output
+METADATA_MEMBER = "metadata"  # NPZ member holding the export metadata as JSON
+
+
+def available_formats():
+    formats = ["npz"]
+    if pyarrow is not None:
+        formats.append("parquet")
+    if h5py is not None:
+        formats.append("hdf5")
+    return formats
+
+
+def format_for(path):
+    """Output format implied by a file name, or ValueError."""
+    name = EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if name is None:
+        raise ValueError(f"Unknown export format for {path}; use one of {', '.join(sorted(EXTENSIONS))}")
+    if name not in available_formats():
+        raise ValueError(f"Exporting {name} needs the {'pyarrow' if name == 'parquet' else 'h5py'} package")
+    return name
+
+
+def column_name(channel, quantity):
+    return f"ch{channel}_{quantity}"
+
+
+class _ColumnSpool:
+    """Raw float64 files, one per column, appended to chunk by chunk."""
+
+    def __init__(self, directory):
+        self.directory = tempfile.mkdtemp(prefix=".export_", dir=directory)
+        self.files = {}  # channel -> open files, one per quantity
+        self.lengths = {}
+
+    def add(self, rows):
+        channels = rows[:, 0].astype(np.int64)
+        for channel in np.unique(channels):
+            selected = rows[channels == channel]
+            files = self.files.get(channel)
+            if files is None:
+                files = self.files[channel] = [
+                    open(os.path.join(self.directory, column_name(channel, quantity)), "wb")
+                    for quantity in QUANTITIES
+                ]
+                self.lengths[channel] = 0
+            for column, file in enumerate(files, start=1):
+                np.ascontiguousarray(selected[:, column], dtype="<f8").tofile(file)
+            self.lengths[channel] += len(selected)
+
+    @property
+    def rows(self):
+        return max(self.lengths.values(), default=0)
+
+    def columns(self):
+        return [(column_name(channel, quantity), os.path.join(self.directory, column_name(channel, quantity)),
+                 self.lengths[channel])
+                for channel in sorted(self.files) for quantity in QUANTITIES]
+
+    def finish(self):
+        for files in self.files.values():
+            for file in files:
+                file.close()
+
+    def slice(self, path, length, start, stop):
+        """Rows [start, stop) of one column, NaN past its own length."""
+        values = np.full(stop - start, np.nan)
+        if start < length:
+            count = min(stop, length) - start
+            values[:count] = np.fromfile(path, dtype="<f8", count=count, offset=start * 8)
+        return values
+
+    def remove(self):
+        self.finish()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def _write_npz(spool, path, metadata):
+    # Same layout as np.savez (stored .npy members), written one column at a time
+    rows = spool.rows
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for name, column_path, length in spool.columns():
+            with archive.open(name + ".npy", "w", force_zip64=True) as member:
+                np.lib.format.write_array_header_1_0(
+                    member, {"descr": "<f8", "fortran_order": False, "shape": (rows,)})
+                with open(column_path, "rb") as source:
+                    shutil.copyfileobj(source, member, 16 * 1024 * 1024)
+                if length < rows:
+                    member.write(np.full(rows - length, np.nan, dtype="<f8").tobytes())
+        # A string array rather than an object array, so np.load needs no allow_pickle
+        with archive.open(METADATA_MEMBER + ".npy", "w") as member:
+            np.lib.format.write_array(member, np.array([json.dumps(metadata, sort_keys=True, default=str)]))
+
+
+def _write_parquet(spool, path, metadata):
+    columns = spool.columns()
+    schema = pyarrow.schema([(name, pyarrow.float64()) for name, _, _ in columns],
+                            metadata={key: str(value) for key, value in metadata.items()})
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        for start in range(0, spool.rows, WRITE_ROWS):
+            stop = min(start + WRITE_ROWS, spool.rows)
+            writer.write_table(pyarrow.table(
+                [spool.slice(column_path, length, start, stop) for _, column_path, length in columns], schema=schema))
+
+
+def _write_hdf5(spool, path, metadata):
+    with h5py.File(path, "w") as file:
+        file.attrs.update({key: str(value) for key, value in metadata.items()})
+        for name, column_path, length in spool.columns():
+            dataset = file.create_dataset(name, shape=(spool.rows,), dtype="f8")
+            for start in range(0, spool.rows, WRITE_ROWS):
+                stop = min(start + WRITE_ROWS, spool.rows)
+                dataset[start:stop] = spool.slice(column_path, length, start, stop)
+
+
+_WRITERS = {"npz": _write_npz, "parquet": _write_parquet, "hdf5": _write_hdf5}
+
+
+def export_rows(chunks, path, metadata=None):
+    """Write parsed row chunks to `path` in the format its extension names.  Returns the rows per channel."""
+    writer = _WRITERS[format_for(path)]
+    spool = _ColumnSpool(os.path.dirname(os.path.abspath(path)))
+    try:
+        for rows in chunks:
+            if len(rows):
+                spool.add(rows)
+        spool.finish()
+        # Written under a temporary name so a failed export never leaves a truncated file behind
+        temp_path = path + ".tmp"
+        try:
+            writer(spool, temp_path, metadata or {})
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    finally:
+        spool.remove()
+    return {int(channel): length for channel, length in sorted(spool.lengths.items())}
+
@@ -0,0 +1,247 @@
+"""Session health checks and automatic reconnect.
+
+SupervisedSession is the outermost layer of the panel's session chain.  It
+classifies every VISA error it sees:
+
+* a lost connection (VI_ERROR_CONN_LOST, VI_ERROR_IO, an invalidated
+  session, socket errors) starts a reconnect straight away;
+* a timeout only makes the session suspect: one short *OPC? heartbeat on a
+  background thread decides whether it is alive;
+* anything else is an instrument-level error and is passed through.
+
+While the session is suspect or being reconnected every call fails at once
+with VI_ERROR_CONN_LOST instead of waiting out the VISA timeout, so the GUI
+keeps running.  Reconnect attempts back off exponentially with jitter and
+never need user action; the supervisor reports the outage as a gap so the
+panel can mark it in the data log.  Idle sessions get a heartbeat every
+HEARTBEAT_SECONDS so a dead link is found even when nothing is polling.
+"""
+import random
+import threading
+import time
+
+import pyvisa
+
+from scpi import SessionProxy
+
+HEARTBEAT_SECONDS = 10.0
+HEARTBEAT_TIMEOUT_MS = 2000
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+
+# VISA status codes after which the session cannot recover by itself
+LOST_CODES = {
+    pyvisa.constants.VI_ERROR_CONN_LOST,
+    pyvisa.constants.VI_ERROR_IO,
+    pyvisa.constants.VI_ERROR_INV_OBJECT,
+    pyvisa.constants.VI_ERROR_SYSTEM_ERROR,
+    pyvisa.constants.VI_ERROR_CLOSING_FAILED,
+    pyvisa.constants.VI_ERROR_RSRC_NFOUND,
+}
+
+CONNECTED, SUSPECT, RECONNECTING, STOPPED = "connected", "suspect", "reconnecting", "stopped"
+
+
+def classify(error):
+    """'lost', 'timeout' or None for an exception raised by a session call."""
+    if isinstance(error, pyvisa.VisaIOError):
+        if error.error_code == pyvisa.constants.VI_ERROR_TMO:
+            return "timeout"
+        return "lost" if error.error_code in LOST_CODES else None
+    if isinstance(error, (ConnectionError, BrokenPipeError, TimeoutError)):
+        return "lost"
+    return None
+
+
+def backoff_delays(base=BACKOFF_BASE, maximum=BACKOFF_MAX):
+    """Exponential delays with +/-20% jitter, so several panels do not retry in lockstep."""
+    delay = base
+    while True:
+        yield delay * random.uniform(0.8, 1.2)
+        delay = min(delay * 2, maximum)
+
+
+class SupervisedSession(SessionProxy):
+    _own_attributes = ("_session", "supervisor")
+
+    def __init__(self, session, supervisor):
+        super(SupervisedSession, self).__init__(session)
+        self.supervisor = supervisor
+
+    def _call(self, method, *args, **kwargs):
+        self.supervisor.begin_call()
+        try:
+            result = method(*args, **kwargs)
+        except Exception as e:
+            self.supervisor.end_call(e)
+            raise
+        self.supervisor.end_call()
+        return result
+
+    def write(self, *args, **kwargs):
+        return self._call(self._session.write, *args, **kwargs)
+
+    def query(self, *args, **kwargs):
+        return self._call(self._session.query, *args, **kwargs)
+
+    def read(self, *args, **kwargs):
+        return self._call(self._session.read, *args, **kwargs)
+
+    def read_raw(self, *args, **kwargs):
+        return self._call(self._session.read_raw, *args, **kwargs)
+
+    def read_bytes(self, *args, **kwargs):
+        return self._call(self._session.read_bytes, *args, **kwargs)
+
+    def read_chunk(self, *args, **kwargs):
+        return self._call(self._session.read_chunk, *args, **kwargs)
+
+    def close(self):
+        self.supervisor.stop()
+        self._session.close()
+
+
+class ConnectionSupervisor:
+    """Watches one SupervisedSession and replaces its inner session when the link dies.
+
+    open_session() builds a fresh inner session (called on a worker thread).
+    on_lost(reason) and on_restored(gap_start, gap_end, attempts) are called
+    on worker threads as well; the panel forwards them to the GUI thread.
+    """
+
+    def __init__(self, open_session, lock, now=time.time, on_lost=None, on_restored=None):
+        self.open_session = open_session
+        self.lock = lock  # The panel's instrument_lock
+        self.now = now
+        self.on_lost = on_lost
+        self.on_restored = on_restored
+        self.session = None
+        self.state = STOPPED
+        self.state_lock = threading.Lock()
+        self.last_ok = time.monotonic()
+        self.last_ok_time = None  # Timestamp of the last good exchange: where a gap starts
+        self.calls = 0  # Calls in flight; a long FETCh or screen dump is not an idle session
+        self.reconnects = 0
+        self.stop_event = threading.Event()
+        self.worker = None
+
+    def wrap(self, session):
+        self.session = SupervisedSession(session, self)
+        self.state = CONNECTED
+        self.stop_event.clear()
+        self.last_ok = time.monotonic()
+        self.last_ok_time = self.now()
+        return self.session
+
+    # Called from SupervisedSession
+
+    def available(self):
+        return self.state not in (SUSPECT, RECONNECTING)
+
+    def check_available(self):
+        if not self.available():
+            raise pyvisa.VisaIOError(pyvisa.constants.VI_ERROR_CONN_LOST)
+
+    def begin_call(self):
+        with self.state_lock:
+            self.check_available()
+            self.calls += 1
+
+    def end_call(self, error=None):
+        with self.state_lock:
+            self.calls -= 1
+        if error is None:
+            self.report_ok()
+        else:
+            self.report_error(error)
+
+    def report_ok(self):
+        self.last_ok = time.monotonic()
+        self.last_ok_time = self.now()
+
+    def report_error(self, error):
+        kind = classify(error)
+        if kind == "lost":
+            self._start(RECONNECTING, self._reconnect, str(error))
+        elif kind == "timeout":
+            self._start(SUSPECT, self._check_suspect, str(error))
+
+    # Background work; only one worker at a time
+
+    def _start(self, state, target, reason, idle_only=False):
+        with self.state_lock:
+            if self.state != CONNECTED or idle_only and self.calls:
+                return
+            self.state = state
+        if state == RECONNECTING and self.on_lost is not None:
+            self.on_lost(reason)
+        self.worker = threading.Thread(target=target, name="connection-supervisor", daemon=True)
+        self.worker.start()
+
+    def heartbeat(self):
+        """Probe an idle session from a worker thread; call periodically from a timer.
+
+        Idle means no call in flight and none finished for HEARTBEAT_SECONDS.
+        """
+        if self.state == CONNECTED and not self.calls and time.monotonic() - self.last_ok >= HEARTBEAT_SECONDS:
+            self._start(SUSPECT, self._check_suspect, "heartbeat", idle_only=True)
+
+    def _probe(self, session):
+        previous = session.timeout
+        session.timeout = HEARTBEAT_TIMEOUT_MS
+        try:
+            session.query("*OPC?")
+        finally:
+            session.timeout = previous
+
+    def _check_suspect(self):
+        with self.lock:  # Waits for the transfer in progress, if any
+            try:
+                self._probe(self.session._session)
+            except Exception as e:
+                if self.stop_event.is_set():
+                    return
+                if self.on_lost is not None:
+                    self.on_lost(f"no response to heartbeat ({e})")
+                alive = False
+            else:
+                alive = True
+        if alive:
+            self.report_ok()
+            if not self.stop_event.is_set():
+                self.state = CONNECTED
+        else:
+            self.state = RECONNECTING
+            self._reconnect()
+
+    def _reconnect(self):
+        gap_start = self.last_ok_time
+        try:
+            self.session._session.close()
+        except Exception:
+            pass  # The old session is already unusable
+        attempts = 0
+        for delay in backoff_delays():
+            if self.stop_event.wait(delay):
+                return
+            attempts += 1
+            try:
+                session = self.open_session()
+                self._probe(session)
+            except Exception:
+                continue
+            with self.lock:
+                if self.stop_event.is_set():
+                    session.close()
+                    return
+                object.__setattr__(self.session, "_session", session)
+                self.reconnects += 1
+                self.report_ok()
+                self.state = CONNECTED
+            if self.on_restored is not None:
+                self.on_restored(gap_start, self.last_ok_time, attempts)
+            return
+
+    def stop(self):
+        self.state = STOPPED
+        self.stop_event.set()
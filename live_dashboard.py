@@ -0,0 +1,230 @@
+"""Multi-channel live dashboard.
+
+One window shows any subset of channels, either stacked with linked time
+axes or overlaid in a single plot.  Samples come from in-memory
+SampleBuffers filled by the acquisition loop, and a single render timer
+redraws every visible plot.  The timer only runs while the window is shown,
+so a hidden or closed dashboard costs nothing.
+
+Rendering is built for high update rates: curve and marker items are
+created once per layout and only fed new NumPy views, curves clip to the
+view and downsample automatically, and the time axis scrolls by moving
+the X range.  KEYSIGHT_PLOT_FPS sets the render rate (up to 50 Hz is
+comfortable for 4 channels x 3 traces) and KEYSIGHT_PLOT_OPENGL=1 draws
+through an OpenGL viewport.
+"""
+import logging
+import os
+
+import numpy as np
+import pyqtgraph as pg
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtWidgets import QCheckBox, QComboBox, QHBoxLayout, QLabel, QVBoxLayout, QWidget
+
+DEFAULT_CAPACITY = 200000  # Samples kept per channel (~55 h at 1 Hz)
+DEFAULT_FPS = 5
+
+CHANNEL_COLORS = {1: (230, 200, 0), 2: (0, 190, 0), 3: (40, 120, 255), 4: (230, 50, 50)}
+LAYOUTS = ("Stacked", "Overlay")
+SPANS = (("60 s", 60.0), ("10 min", 600.0), ("1 h", 3600.0), ("All", None))
+TRACES = (("V", Qt.SolidLine, 2), ("A", Qt.DashLine, 1), ("W", Qt.DotLine, 1))
+
+# Items are fed finite, time-ordered data, so pyqtgraph can skip its own checks
+CURVE_OPTIONS = dict(clipToView=True, autoDownsample=True, downsampleMethod='peak', skipFiniteCheck=True)
+
+log = logging.getLogger(__name__)
+
+
+class SampleBuffer:
+    """Per-channel time, voltage, current and power samples in one contiguous NumPy array.
+
+    When the buffer is full the older half is dropped, so data() can always
+    return plain slices without copying.  version changes on every append,
+    which lets the dashboard skip channels that have nothing new.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.array = np.empty((4, capacity))  # Rows: time (epoch s), voltage, current, power
+        self.size = 0
+        self.version = 0
+
+    def append(self, timestamp, voltage, current):
+        if self.size == self.capacity:
+            keep = self.capacity // 2
+            self.array[:, :keep] = self.array[:, self.size - keep:self.size]
+            self.size = keep
+        self.array[:, self.size] = (timestamp, voltage, current, voltage * current)
+        self.size += 1
+        self.version += 1
+
+    def data(self, since=None):
+        # Views are only valid until the next append
+        start = 0
+        if since is not None:
+            start = int(np.searchsorted(self.array[0, :self.size], since))
+        return self.array[:, start:self.size]
+
+    def clear(self):
+        self.size = 0
+        self.version += 1
+
+
+class LiveDashboard(QWidget):
+    def __init__(self, buffers, channel_name=None, parent=None, fps=None, opengl=None):
+        super(LiveDashboard, self).__init__(parent)
+        self.buffers = buffers
+        self.channel_name = channel_name or (lambda channel: f"Channel {channel}")
+        self.setWindowTitle("Live Data")
+        self.resize(800, 700)
+
+        if fps is None:
+            fps = float(os.environ.get("KEYSIGHT_PLOT_FPS", DEFAULT_FPS))
+        if opengl is None:
+            opengl = os.environ.get("KEYSIGHT_PLOT_OPENGL") == "1"
+
+        self.origin = None  # Epoch time shown as t = 0
+        self.span = SPANS[0][1]  # Seconds of history in view, None for everything
+        self.plots = {}  # channel -> PlotItem (stacked) or the shared PlotItem (overlay)
+        self.curves = {}  # channel -> (voltage curve, current curve, power curve)
+        self.markers = {}  # channel -> ScatterPlotItem on the latest sample of each trace
+        self.titles = {}  # channel -> title text currently shown
+        self.rendered = {}  # channel -> buffer version last drawn
+
+        layout = QVBoxLayout(self)
+        controls = QHBoxLayout()
+        self.channel_boxes = {}
+        for channel in sorted(buffers):
+            box = QCheckBox(self.channel_name(channel), self)
+            box.toggled.connect(self.rebuild)
+            self.channel_boxes[channel] = box
+            controls.addWidget(box)
+        controls.addStretch()
+        controls.addWidget(QLabel("Span:"))
+        self.span_combo = QComboBox(self)
+        for name, seconds in SPANS:
+            self.span_combo.addItem(name, seconds)
+        self.span_combo.currentIndexChanged.connect(self.set_span_index)
+        controls.addWidget(self.span_combo)
+        controls.addWidget(QLabel("Layout:"))
+        self.layout_combo = QComboBox(self)
+        self.layout_combo.addItems(LAYOUTS)
+        self.layout_combo.currentIndexChanged.connect(self.rebuild)
+        controls.addWidget(self.layout_combo)
+        layout.addLayout(controls)
+
+        self.graphics = pg.GraphicsLayoutWidget()
+        if opengl:
+            try:
+                self.graphics.useOpenGL(True)
+            except Exception as e:
+                log.warning("OpenGL plotting unavailable, using the raster viewport: %s", e)
+        layout.addWidget(self.graphics)
+
+        self.render_timer = QTimer(self)
+        self.render_timer.timeout.connect(self.render)
+        self.render_timer.setInterval(max(1, int(1000 / fps)))
+
+    def visible_channels(self):
+        return [channel for channel, box in self.channel_boxes.items() if box.isChecked()]
+
+    def set_channel_visible(self, channel, visible):
+        self.channel_boxes[channel].setChecked(visible)  # Rebuilds through the toggled signal
+
+    def set_span_index(self, index):
+        self.span = self.span_combo.itemData(index)
+        for plot in set(self.plots.values()):
+            # A scrolling window drives the X range itself; "All" lets the view fit the data
+            plot.enableAutoRange(x=self.span is None)
+        self.rendered = {}
+        self.render()
+
+    def rebuild(self):
+        self.graphics.clear()
+        self.plots = {}
+        self.curves = {}
+        self.markers = {}
+        self.titles = {}
+        self.rendered = {}
+        channels = self.visible_channels()
+        if not channels:
+            return
+
+        overlay = self.layout_combo.currentText() == "Overlay"
+        first_plot = None
+        for row, channel in enumerate(channels):
+            if overlay and first_plot is not None:
+                plot = first_plot
+            else:
+                plot = self.graphics.addPlot(row=row, col=0)
+                plot.showGrid(x=True, y=True, alpha=0.3)
+                plot.setLabel('left', 'Value')
+                plot.addLegend()
+                plot.enableAutoRange(x=self.span is None)
+                plot.setAutoVisible(y=True)  # Fit Y to the samples inside the scrolling window
+                if first_plot is None:
+                    first_plot = plot
+                else:
+                    plot.setXLink(first_plot)
+            color = CHANNEL_COLORS.get(channel, (200, 200, 200))
+            name = self.channel_name(channel)
+            self.curves[channel] = tuple(
+                plot.plot(pen=pg.mkPen(color, width=width, style=style), name=f"{name} {unit}", **CURVE_OPTIONS)
+                for unit, style, width in TRACES)
+            marker = pg.ScatterPlotItem(size=10, brush=pg.mkBrush(color), pen=pg.mkPen('y'))
+            plot.addItem(marker)
+            self.markers[channel] = marker
+            self.plots[channel] = plot
+        # Only the bottom plot carries the shared time axis label
+        self.plots[channels[-1]].setLabel('bottom', 'Time', units='s')
+        self.render()
+
+    def render(self):
+        if not self.isVisible():
+            return
+        overlay = self.layout_combo.currentText() == "Overlay"
+        updates = []
+        for channel, curves in self.curves.items():
+            buffer = self.buffers[channel]
+            if self.rendered.get(channel) == buffer.version:
+                continue
+            self.rendered[channel] = buffer.version
+            if not buffer.size:
+                for curve in curves:
+                    curve.clear()
+                self.markers[channel].clear()
+                continue
+            if self.origin is None:
+                self.origin = buffer.array[0, 0]
+            latest = buffer.array[:, buffer.size - 1]
+            since = None if self.span is None else latest[0] - self.span
+            updates.append((channel, curves, latest, buffer.data(since)))
+        if not updates:
+            return
+
+        if self.span is not None:
+            # Scroll before feeding the curves so clipToView works on the new range once;
+            # linked plots follow the first one
+            newest = max(latest[0] for _, _, latest, _ in updates) - self.origin
+            next(iter(self.plots.values())).setXRange(newest - self.span, newest, padding=0)
+
+        for channel, curves, latest, data in updates:
+            seconds = data[0] - self.origin
+            for curve, values in zip(curves, data[1:]):
+                curve.setData(seconds, values)
+            self.markers[channel].setData(x=np.full(3, seconds[-1]), y=latest[1:])
+            if not overlay:
+                title = f"{self.channel_name(channel)}: {latest[1]:.3f} V, {latest[2]:.3f} A, {latest[3]:.3f} W"
+                if self.titles.get(channel) != title:
+                    self.titles[channel] = title
+                    self.plots[channel].setTitle(title)
+
+    def showEvent(self, event):
+        super(LiveDashboard, self).showEvent(event)
+        self.render()
+        self.render_timer.start()
+
+    def hideEvent(self, event):
+        # Also covers close() and minimising
+        self.render_timer.stop()
+        super(LiveDashboard, self).hideEvent(event)
@@ -0,0 +1,384 @@
+"""Compressed, time-segmented sample archive.
+
+SegmentedLogWriter is a LogSink that writes one compressed CSV segment per
+time slot (an hour by default), e.g. power_supply_20261019_140000.csv.gz.
+Rows are buffered and compressed on the fly, with a sync flush every few
+seconds so a crash loses at most that much data.  When a segment closes,
+a fixed-size footer is appended holding its row count and time and
+value bounds:
+
+  gzip: a second gzip member, stored uncompressed and padded to a constant
+        size, so the footer is read with one seek from the end of the file.
+        Readers that decompress the whole file see it as a '#' comment line.
+  zstd: a skippable frame (used when the optional zstandard package is
+        installed and codec="zstd"); decoders ignore it.
+
+ArchiveReader streams rows back lazily, one segment at a time, and skips
+segments whose footer bounds fall outside the requested range.  Segments
+without a footer (the one being written, or one cut short by a crash) are
+decompressed up to the last complete row.
+
+    python log_archive.py info archive/
+    python log_archive.py export archive/ out.csv --start 2026-10-19T14:00 --end 2026-10-19T15:00
+    python log_archive.py export power_supply_data.csv session.npz
+
+export writes CSV, or columnar NPZ/Parquet/HDF5 by the output extension
+(see columnar_export), and also reads flat CSV logs.
+"""
+import argparse
+import datetime
+import glob
+import gzip
+import json
+import os
+import struct
+import time
+import zlib
+
+import numpy as np
+
+from columnar_export import EXTENSIONS as COLUMNAR_EXTENSIONS, export_rows
+from log_sinks import CSV_COLUMNS, LogSink, format_row, gap_line, header_lines
+from session_index import COLUMNS, SessionIndex, parse_rows
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_SEGMENT_SECONDS = 3600
+FLUSH_SECONDS = 5.0  # Upper bound on rows lost in a crash
+FLUSH_ROWS = 1024
+FOOTER_SIZE = 1024  # JSON payload, space padded
+FOOTER_TAG = b"#segment "
+READ_SIZE = 4 * 1024 * 1024
+
+_GZIP_FOOTER_LENGTH = len(gzip.compress(b" " * FOOTER_SIZE, compresslevel=0, mtime=0))
+_ZSTD_SKIPPABLE_MAGIC = 0x184D2A50
+_ZSTD_FOOTER_LENGTH = 8 + FOOTER_SIZE
+EXTENSIONS = {"gzip": ".csv.gz", "zstd": ".csv.zst"}
+
+
+class _Bounds:
+    def __init__(self):
+        self.rows = 0
+        self.t_min = None
+        self.t_max = None
+        self.channels = {}  # channel -> [rows, v_min, v_max, i_min, i_max]
+
+    def add(self, channel, timestamp, voltage, current):
+        self.rows += 1
+        self.t_min = timestamp if self.t_min is None else min(self.t_min, timestamp)
+        self.t_max = timestamp if self.t_max is None else max(self.t_max, timestamp)
+        bounds = self.channels.get(channel)
+        if bounds is None:
+            self.channels[channel] = [1, voltage, voltage, current, current]
+        else:
+            bounds[0] += 1
+            bounds[1] = min(bounds[1], voltage)
+            bounds[2] = max(bounds[2], voltage)
+            bounds[3] = min(bounds[3], current)
+            bounds[4] = max(bounds[4], current)
+
+    def to_json(self):
+        return {
+            "version": 1, "rows": self.rows, "t_min": self.t_min, "t_max": self.t_max,
+            "channels": {str(channel): dict(zip(("rows", "v_min", "v_max", "i_min", "i_max"), values))
+                         for channel, values in sorted(self.channels.items())},
+        }
+
+
+def _footer_payload(bounds):
+    payload = FOOTER_TAG + json.dumps(bounds.to_json(), separators=(",", ":")).encode("ascii")
+    if len(payload) >= FOOTER_SIZE:
+        raise ValueError("Segment footer does not fit")
+    return payload.ljust(FOOTER_SIZE - 1) + b"\n"
+
+
+class SegmentedLogWriter(LogSink):
+    def __init__(self, directory, prefix="power_supply", segment_seconds=DEFAULT_SEGMENT_SECONDS,
+                 codec="gzip", level=None, metadata=None):
+        if codec == "zstd" and zstandard is None:
+            raise ValueError("codec 'zstd' needs the zstandard package")
+        if codec not in EXTENSIONS:
+            raise ValueError(f"Unknown codec {codec!r}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.prefix = prefix
+        self.segment_seconds = segment_seconds
+        self.codec = codec
+        self.level = level
+        self.metadata = metadata or {}
+        self.raw = None
+        self.stream = None
+        self.path = None
+        self.segment_end = None
+        self.bounds = None
+        self.pending = []
+        self.last_flush = time.monotonic()
+
+    def _open_segment(self, timestamp):
+        start = timestamp - timestamp % self.segment_seconds
+        self.segment_end = start + self.segment_seconds
+        name = f"{self.prefix}_{time.strftime('%Y%m%d_%H%M%S', time.localtime(start))}{EXTENSIONS[self.codec]}"
+        self.path = os.path.join(self.directory, name)
+        if os.path.exists(self.path):
+            # Never append to a finished segment (e.g. after a restart within the same slot)
+            stem = self.path[:-len(EXTENSIONS[self.codec])]
+            self.path = f"{stem}_{int(time.time())}{EXTENSIONS[self.codec]}"
+        self.raw = open(self.path, "wb")
+        if self.codec == "zstd":
+            compressor = zstandard.ZstdCompressor(level=self.level or 3)
+            self.stream = compressor.stream_writer(self.raw, closefd=False)
+        else:
+            self.stream = gzip.GzipFile(fileobj=self.raw, mode="wb", compresslevel=self.level or 6)
+        self.bounds = _Bounds()
+        self.stream.write((header_lines(self.metadata) + ",".join(CSV_COLUMNS) + "\n").encode("ascii"))
+
+    def write(self, channel, timestamp, voltage, current, latency=None):
+        if self.raw is None or timestamp >= self.segment_end:
+            self._close_segment()
+            self._open_segment(timestamp)
+        self.bounds.add(channel, timestamp, voltage, current)
+        self.pending.append(",".join(str(field) for field in format_row(channel, timestamp, voltage, current, latency)))
+        if len(self.pending) >= FLUSH_ROWS or time.monotonic() - self.last_flush >= FLUSH_SECONDS:
+            self.flush()
+
+    def mark_gap(self, start, end, reason):
+        if self.raw is not None:
+            self.pending.append(gap_line(start, end, reason).rstrip("\n"))
+            self.flush()
+
+    def flush(self):
+        if self.stream is None:
+            return
+        if self.pending:
+            self.stream.write(("\n".join(self.pending) + "\n").encode("ascii"))
+            self.pending = []
+        # A sync flush makes everything written so far decodable from the file on disk
+        if self.codec == "zstd":
+            self.stream.flush(zstandard.FLUSH_BLOCK)
+        else:
+            self.stream.flush(zlib.Z_SYNC_FLUSH)
+        self.raw.flush()
+        self.last_flush = time.monotonic()
+
+    def _close_segment(self):
+        if self.raw is None:
+            return
+        if self.pending:
+            self.stream.write(("\n".join(self.pending) + "\n").encode("ascii"))
+            self.pending = []
+        self.stream.close()  # Ends the compressed stream; the raw file stays open
+        payload = _footer_payload(self.bounds)
+        if self.codec == "zstd":
+            self.raw.write(struct.pack("<II", _ZSTD_SKIPPABLE_MAGIC, FOOTER_SIZE) + payload)
+        else:
+            self.raw.write(gzip.compress(payload, compresslevel=0, mtime=0))
+        self.raw.close()
+        self.raw = self.stream = None
+
+    def close(self):
+        self._close_segment()
+
+
+class _LimitedReader:
+    """File view that stops before a zstd footer frame."""
+
+    def __init__(self, file, limit):
+        self.file = file
+        self.remaining = limit
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+
+def read_footer(path):
+    """Return the footer dict of a finished segment, or None."""
+    codec = "zstd" if path.endswith(EXTENSIONS["zstd"]) else "gzip"
+    length = _ZSTD_FOOTER_LENGTH if codec == "zstd" else _GZIP_FOOTER_LENGTH
+    try:
+        with open(path, "rb") as file:
+            file.seek(0, os.SEEK_END)
+            if file.tell() < length:
+                return None
+            file.seek(-length, os.SEEK_END)
+            tail = file.read(length)
+    except OSError:
+        return None
+    try:
+        if codec == "zstd":
+            magic, size = struct.unpack("<II", tail[:8])
+            if magic != _ZSTD_SKIPPABLE_MAGIC or size != FOOTER_SIZE:
+                return None
+            payload = tail[8:]
+        else:
+            payload = gzip.decompress(tail)
+    except (OSError, EOFError, zlib.error, struct.error):
+        return None
+    if not payload.startswith(FOOTER_TAG):
+        return None
+    return json.loads(payload[len(FOOTER_TAG):])
+
+
+class Segment:
+    def __init__(self, path):
+        self.path = path
+        self.codec = "zstd" if path.endswith(EXTENSIONS["zstd"]) else "gzip"
+        self.footer = read_footer(path)
+
+    def overlaps(self, t0, t1):
+        if self.footer is None or self.footer["rows"] == 0:
+            return self.footer is None  # Unknown bounds: has to be read
+        return self.footer["t_max"] >= t0 and self.footer["t_min"] <= t1
+
+    def _decompressed(self, raw):
+        size = os.fstat(raw.fileno()).st_size
+        if self.footer is not None:
+            size -= _ZSTD_FOOTER_LENGTH if self.codec == "zstd" else _GZIP_FOOTER_LENGTH
+        if self.codec == "zstd":
+            if zstandard is None:
+                raise ValueError(f"{self.path} needs the zstandard package")
+            stream = zstandard.ZstdDecompressor().stream_reader(_LimitedReader(raw, size))
+            while True:
+                try:
+                    data = stream.read(READ_SIZE)
+                except zstandard.ZstdError:
+                    return  # Segment cut short; keep what decoded cleanly
+                if not data:
+                    return
+                yield data
+        # zlib rather than GzipFile, so a truncated segment yields everything up to the cut
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        remaining = size
+        while remaining > 0:
+            chunk = raw.read(min(READ_SIZE, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            while chunk:
+                try:
+                    data = decompressor.decompress(chunk)
+                except zlib.error:
+                    return
+                if data:
+                    yield data
+                chunk = b""
+                if decompressor.eof:
+                    chunk = decompressor.unused_data
+                    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+
+    def chunks(self):
+        """Yield parsed row arrays, one block of decompressed text at a time."""
+        with open(self.path, "rb") as raw:
+            pending = b""
+            for data in self._decompressed(raw):
+                data = pending + data
+                cut = data.rfind(b"\n") + 1
+                pending = data[cut:]
+                rows = _parse_lines(data[:cut])
+                if len(rows):
+                    yield rows
+
+
+def _parse_lines(data):
+    # Header and '#' comment lines: metadata, footer and gap marks
+    if b"#" in data or b"Channel" in data:
+        data = b"".join(line for line in data.splitlines(True) if line[:1].isdigit())
+    return parse_rows(data)
+
+
+class ArchiveReader:
+    def __init__(self, directory, prefix="power_supply"):
+        self.directory = directory
+        paths = []
+        for extension in EXTENSIONS.values():
+            paths.extend(glob.glob(os.path.join(directory, f"{prefix}_*{extension}")))
+        self.segments = [Segment(path) for path in sorted(paths)]
+
+    def iter_rows(self, t0=-np.inf, t1=np.inf, channels=None):
+        """Stream (n, 5) row arrays within [t0, t1], skipping segments outside the range."""
+        for segment in self.segments:
+            if not segment.overlaps(t0, t1):
+                continue
+            for rows in segment.chunks():
+                keep = (rows[:, 1] >= t0) & (rows[:, 1] <= t1)
+                if channels is not None:
+                    keep &= np.isin(rows[:, 0], list(channels))
+                if keep.any():
+                    yield rows[keep]
+
+    def read(self, t0=-np.inf, t1=np.inf, channels=None):
+        parts = list(self.iter_rows(t0, t1, channels))
+        return np.concatenate(parts) if parts else np.empty((0, len(COLUMNS)))
+
+
+def _parse_time(text):
+    return datetime.datetime.fromisoformat(text).timestamp() if text else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and export compressed sample archives")
+    parser.add_argument("command", choices=("info", "export"))
+    parser.add_argument("directory", help="archive directory; export also takes a flat CSV log")
+    parser.add_argument("output", nargs="?", help="export file: .csv, or columnar .npz/.parquet/.h5")
+    parser.add_argument("--start", help="ISO time, e.g. 2026-10-19T14:00")
+    parser.add_argument("--end", help="ISO time")
+    parser.add_argument("--channels", type=int, nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        reader = ArchiveReader(args.directory)
+        for segment in reader.segments:
+            size = os.path.getsize(segment.path)
+            footer = segment.footer
+            if footer is None:
+                print(f"{os.path.basename(segment.path)}  {size:>10} B  (open or truncated, no footer)")
+            elif footer["rows"]:
+                print(f"{os.path.basename(segment.path)}  {size:>10} B  {footer['rows']:>8} rows  "
+                      f"{time.ctime(footer['t_min'])} .. {time.ctime(footer['t_max'])}")
+            else:
+                print(f"{os.path.basename(segment.path)}  {size:>10} B  empty")
+        return
+
+    if not args.output:
+        parser.error("export needs an output file")
+    t0 = _parse_time(args.start)
+    t1 = _parse_time(args.end)
+    t0 = -np.inf if t0 is None else t0
+    t1 = np.inf if t1 is None else t1
+    try:
+        if os.path.isdir(args.directory):
+            chunks = ArchiveReader(args.directory).iter_rows(t0, t1, args.channels)
+        else:
+            chunks = SessionIndex.open(args.directory).iter_rows(t0, t1, args.channels)
+        if os.path.splitext(args.output)[1].lower() in COLUMNAR_EXTENSIONS:
+            start = time.perf_counter()
+            counts = export_rows(chunks, args.output, {"exported_from": os.path.abspath(args.directory)})
+            summary = ", ".join(f"CH{channel} {rows}" for channel, rows in counts.items()) or "no"
+            print(f"Exported {summary} rows to {args.output} in {time.perf_counter() - start:.2f} s")
+            return
+        count = 0
+        # Written under a temporary name so a failed export never leaves a truncated file behind
+        temp_path = args.output + ".tmp"
+        try:
+            with open(temp_path, "w", newline="") as file:
+                file.write(",".join(CSV_COLUMNS) + "\n")
+                for rows in chunks:  # Blocks are parsed as they are consumed
+                    np.savetxt(file, rows, fmt=["%d", "%.6f", "%.10g", "%.10g", "%.3f"], delimiter=",")
+                    count += len(rows)
+            os.replace(temp_path, args.output)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    print(f"Exported {count} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
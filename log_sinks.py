@@ -0,0 +1,62 @@
+"""Destinations for logged samples.
+
+The panel hands every live sample to each configured sink.  A sink takes
+rows of (channel, timestamp, voltage, current, latency) and owns its own
+file format, buffering and durability.
+"""
+import csv
+
+CSV_COLUMNS = ["Channel", "Time", "Voltage", "Current", "Latency_ms"]
+
+
+def format_row(channel, timestamp, voltage, current, latency=None):
+    # Time is float epoch seconds at the midpoint of the measurement query
+    return [channel, f"{timestamp:.6f}", voltage, current, "" if latency is None else f"{latency * 1000:.3f}"]
+
+
+def header_lines(metadata):
+    return "".join(f"# {key}: {value}\n" for key, value in metadata.items())
+
+
+def gap_line(start, end, reason):
+    # Readers skip '#' lines anywhere in a log, so an outage is recorded without breaking the rows
+    return f"# gap: {start:.6f} {end:.6f} {reason}\n"
+
+
+class LogSink:
+    def write(self, channel, timestamp, voltage, current, latency=None):
+        raise NotImplementedError
+
+    def mark_gap(self, start, end, reason):
+        """Record that no samples were taken between `start` and `end`."""
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class CsvLogSink(LogSink):
+    """One flat, uncompressed CSV per session; each row is flushed as it is written."""
+
+    def __init__(self, path, metadata=None):
+        self.path = path
+        # Start a fresh CSV for this session; '#' lines record how the timestamps were taken
+        self.file = open(path, 'w', newline='')
+        self.file.write(header_lines(metadata or {}))
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(CSV_COLUMNS)
+        self.file.flush()
+
+    def write(self, channel, timestamp, voltage, current, latency=None):
+        self.writer.writerow(format_row(channel, timestamp, voltage, current, latency))
+        self.file.flush()
+
+    def mark_gap(self, start, end, reason):
+        self.file.write(gap_line(start, end, reason))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
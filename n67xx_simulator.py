@@ -0,0 +1,898 @@
+"""Simulated Keysight N67xx mainframe for tests and benchmarks.
+
+Speaks the SCPI subset used by Keysight_GUI.py and can be reached three ways:
+
+* in process, through SimulatedInstrument (enter "SIM" as the IP address),
+* over raw TCP, by running this module and connecting to
+  TCPIP::127.0.0.1::5025::SOCKET,
+* through pyvisa-sim, using a profile written by write_pyvisa_sim_profile().
+  pyvisa-sim only supports static dialogues and properties, so latency,
+  noise, protection trips and screen dumps are only available in the first
+  two modes.
+
+Example:
+    python n67xx_simulator.py --channels 4 --latency 0.002 --noise 0.001
+"""
+import argparse
+import bisect
+import collections
+import itertools
+import random
+import socketserver
+import struct
+import threading
+import time
+import zlib
+
+try:
+    import pyvisa
+except ImportError:  # The TCP server does not need pyvisa
+    pyvisa = None
+
+from scpi import normalize_header, parse_channel_list, split_command, split_message
+
+DEFAULT_PORT = 5025  # Keysight SCPI socket port
+INFINITY = 9.9e37  # SCPI representation of an unlimited value
+
+# STATus:QUEStionable:CONDition bits
+QUES_OV = 1
+QUES_OC = 2
+QUES_CP = 8
+QUES_LIMIT = 128
+QUES_PROT = 2048
+
+TRIP_BITS = {"ovp": QUES_OV, "ocp": QUES_OC}
+
+# STATus:OPERation:CONDition bits
+OPER_CV = 1
+OPER_CC = 2
+OPER_OFF = 4
+OPER_WTG_MEAS = 8
+OPER_WTG_TRAN = 16
+
+STATE_SLOTS = 16  # *SAV/*RCL locations 0..15
+MAX_LIST_STEPS = 512
+MAX_SWEEP_POINTS = 524288
+SWEEP_INTERVAL_STEP = 20.48e-6  # Digitizer sample interval resolution
+SAVED_SETTINGS = ("voltage", "current", "slew", "output", "ovp", "ocp_enabled", "ocp_delay")
+
+
+class ChannelState:
+    def __init__(self, load=10.0):
+        self.voltage = 0.0
+        self.current = 0.1
+        self.slew = INFINITY
+        self.output = False
+        self.ovp = 22.0
+        self.ocp_enabled = False
+        self.ocp_delay = 0.0
+        self.protection = 0  # Latched protection bits, cleared by OUTP:PROT:CLE
+        self.load = load  # Resistive load in ohms
+        # Output ramp for slew rate modelling
+        self.ramp_from = 0.0
+        self.ramp_start = 0.0
+        # Transient system: a voltage list run on a trigger
+        self.voltage_mode = "FIX"
+        self.list_voltage = [0.0]
+        self.list_dwell = [0.001]
+        self.list_count = 1
+        self.list_last = False  # LIST:TERM:LAST: hold the last step instead of returning to VOLT
+        self.transient_source = "BUS"
+        self.transient_armed = False
+        self.list_started = None  # Clock time the running (or finished) list was triggered
+        self.list_values = []  # Step values of that run, counts expanded
+        self.list_ends = []  # Cumulative end time of each step after list_started
+        self.list_from = 0.0  # Output voltage when the list started
+        # Digitizer
+        self.sweep_points = 1024
+        self.sweep_interval = SWEEP_INTERVAL_STEP
+        self.acquisition_source = "BUS"
+        self.acquisition_armed = False
+        self.acquisition_started = None
+
+
+class SimulatedN67xx:
+    def __init__(self, channels=4, latency=0.0, command_latency=None, noise=0.0, seed=None,
+                 loads=None, trips=None, screen_size=(320, 240), screen_data=None,
+                 indefinite_blocks=False, model="N6705B", serial="MY00000000", clock=time.monotonic):
+        self.channel_count = channels
+        self.latency = latency  # Seconds per command unless overridden below
+        self.command_latency = {normalize_header(header): delay
+                                for header, delay in (command_latency or {}).items()}
+        self.noise = noise  # Standard deviation added to measurements
+        self.random = random.Random(seed)
+        self.screen_size = screen_size
+        self.screen_data = screen_data or {}  # Optional canned images keyed by format
+        self.indefinite_blocks = indefinite_blocks
+        self.model = model
+        self.serial = serial
+        self.clock = clock
+        self.sleep = time.sleep
+
+        loads = loads or {}
+        self.channels = {ch: ChannelState(loads.get(ch, 10.0)) for ch in range(1, channels + 1)}
+        # Scheduled trips as (channel, "ovp"/"ocp", seconds after start)
+        self.pending_trips = sorted(trips or [], key=lambda trip: trip[2])
+        self.errors = collections.deque(maxlen=32)
+        self.screen_format = "GIF"
+        self.saved_states = {}  # *SAV location -> {channel: {setting: value}}
+        self.start_time = clock()
+        self.lock = threading.RLock()
+        self.command_count = 0
+        self.link_down_until = 0.0  # See drop_link()
+
+        self.commands = {
+            "*IDN?": self._idn,
+            "*RST": self._rst,
+            "*CLS": self._cls,
+            "*OPC?": lambda channels, args: "1",
+            "*OPC": self._no_op,
+            "*WAI": self._no_op,
+            "*SAV": self._save_state,
+            "*RCL": self._recall_state,
+            "MEAS:VOLT?": self._measure_voltage,
+            "MEAS:CURR?": self._measure_current,
+            "MEAS:POW?": self._measure_power,
+            "MEAS:ARR:VOLT?": self._measure_voltage_array,
+            "MEAS:ARR:CURR?": self._measure_current_array,
+            "MEAS:ARR:POW?": self._measure_power_array,
+            "OUTP": self._set_output,
+            "OUTP:STAT": self._set_output,
+            "OUTP?": self._get_output,
+            "OUTP:STAT?": self._get_output,
+            "OUTP:PROT:CLE": self._clear_protection,
+            "VOLT": self._setter("voltage"),
+            "VOLT?": self._getter("voltage"),
+            "CURR": self._setter("current"),
+            "CURR?": self._getter("current"),
+            "VOLT:SLEW": self._setter("slew"),
+            "VOLT:SLEW?": self._getter("slew"),
+            "VOLT:PROT": self._setter("ovp"),
+            "VOLT:PROT?": self._getter("ovp"),
+            "CURR:PROT:STAT": self._set_ocp_state,
+            "CURR:PROT:STAT?": self._get_ocp_state,
+            "CURR:PROT:DEL": self._setter("ocp_delay"),
+            "CURR:PROT:DEL?": self._getter("ocp_delay"),
+            "STAT:QUES:COND?": self._questionable_condition,
+            "STAT:OPER:COND?": self._operation_condition,
+            "VOLT:MODE": self._set_voltage_mode,
+            "LIST:VOLT": self._set_list("list_voltage"),
+            "LIST:DWEL": self._set_list("list_dwell"),
+            "LIST:COUN": self._set_list_count,
+            "LIST:TERM:LAST": self._set_list_last,
+            "TRIG:TRAN:SOUR": self._set_source("transient_source"),
+            "TRIG:ACQ:SOUR": self._set_source("acquisition_source"),
+            "TRIG:TRAN": lambda channels, args: self._trigger(transient=True, acquisition=False),
+            "TRIG:ACQ": lambda channels, args: self._trigger(transient=False, acquisition=True),
+            "*TRG": lambda channels, args: self._trigger(transient=True, acquisition=True),
+            "INIT:TRAN": self._initiate_transient,
+            "INIT:ACQ": self._initiate_acquisition,
+            "ABOR:TRAN": self._abort_transient,
+            "ABOR:ACQ": self._abort_acquisition,
+            "SENS:SWE:POIN": self._set_sweep_points,
+            "SENS:SWE:POIN?": lambda channels, args: ",".join(str(self.channels[ch].sweep_points) for ch in channels),
+            "SENS:SWE:TINT": self._set_sweep_interval,
+            "SENS:SWE:TINT?": self._getter("sweep_interval"),
+            "SENS:FUNC:VOLT": self._no_op,  # Voltage and current are always digitized together here
+            "SENS:FUNC:CURR": self._no_op,
+            "FETC:ARR:VOLT?": lambda channels, args: self._fetch_array(channels, 0),
+            "FETC:ARR:CURR?": lambda channels, args: self._fetch_array(channels, 1),
+            "SYST:ERR?": self._next_error,
+            "SYST:ERR:CLE": self._cls,
+            "SYST:CHAN?": lambda channels, args: str(self.channel_count),
+            "SYST:CHAN:MOD?": self._channel_models,
+            "HCOP:SDUM:DATA:FORM": self._set_screen_format,
+            "HCOP:SDUM:DATA:FORM?": lambda channels, args: self.screen_format,
+            "HCOP:SDUM:DATA?": self._screen_dump,
+        }
+
+    # Message handling
+
+    def handle(self, message):
+        """Execute one program message.
+
+        Returns the terminated response bytes, or None when the message
+        contained no queries.  Blocks for the configured latency.
+        """
+        responses = []
+        delay = 0.0
+        with self.lock:
+            self._apply_scheduled_trips()
+            for command in split_message(message):
+                header, arguments = split_command(command)
+                key = normalize_header(header)
+                delay += self.command_latency.get(key, self.latency)
+                self.command_count += 1
+                handler = self.commands.get(key)
+                if handler is None:
+                    self.errors.append(f'-113,"Undefined header;{header}"')
+                    continue
+                try:
+                    channels, args = parse_channel_list(arguments)
+                    bad = [ch for ch in channels if ch not in self.channels]
+                    if bad:
+                        raise ValueError(f"Channel {bad[0]} not installed")
+                    result = handler(channels, args)
+                except (ValueError, IndexError) as e:
+                    self.errors.append(f'-224,"Illegal parameter value;{e}"')
+                    continue
+                if result is not None:
+                    responses.append(result)
+        if delay:
+            self.sleep(delay)
+        if not responses:
+            return None
+        if any(isinstance(response, bytes) for response in responses):
+            # A block carries its own terminator
+            return b";".join(r if isinstance(r, bytes) else r.encode("ascii") for r in responses)
+        return (";".join(responses) + "\n").encode("ascii")
+
+    def elapsed(self):
+        return self.clock() - self.start_time
+
+    def drop_link(self, seconds):
+        """Simulate a LAN outage: sessions fail with a lost connection for `seconds`."""
+        self.link_down_until = self.clock() + seconds
+
+    def link_up(self):
+        return self.clock() >= self.link_down_until
+
+    def _apply_scheduled_trips(self):
+        now = self.elapsed()
+        while self.pending_trips and self.pending_trips[0][2] <= now:
+            channel, kind, _ = self.pending_trips.pop(0)
+            self.trip(channel, kind)
+
+    def trip(self, channel, kind):
+        """Trip OVP or OCP on a channel, switching its output off."""
+        with self.lock:
+            state = self.channels[channel]
+            state.protection |= TRIP_BITS[kind] | QUES_PROT
+            state.output = False
+
+    # Output model
+
+    def _program(self, state, now):
+        """(target voltage, ramp start voltage, ramp start time) at `now`, following a triggered list."""
+        if state.list_started is None or now < state.list_started:
+            return state.voltage, state.ramp_from, state.ramp_start
+        step = bisect.bisect_right(state.list_ends, now - state.list_started)
+        values = state.list_values
+        if step >= len(values):
+            target = values[-1] if state.list_last else state.voltage
+            return target, values[-1], state.list_started + state.list_ends[-1]
+        previous = values[step - 1] if step else state.list_from
+        return values[step], previous, state.list_started + (state.list_ends[step - 1] if step else 0.0)
+
+    def _present_voltage(self, state, now=None):
+        if not state.output:
+            return 0.0
+        now = self.clock() if now is None else now
+        target, ramp_from, ramp_start = self._program(state, now)
+        delta = target - ramp_from
+        step = state.slew * (now - ramp_start)
+        if abs(delta) <= step:
+            return target
+        return ramp_from + step * (1 if delta > 0 else -1)
+
+    def _operating_point(self, state, now=None):
+        voltage = self._present_voltage(state, now)
+        current = voltage / state.load if state.load else 0.0
+        if current > state.current:
+            # Constant current: the load pulls the voltage down
+            current = state.current
+            voltage = current * state.load
+        return voltage, current
+
+    def _update_protection(self, state):
+        if not state.output:
+            return
+        if state.voltage > state.ovp:
+            state.protection |= QUES_OV | QUES_PROT
+            state.output = False
+        elif state.ocp_enabled and state.load and state.voltage / state.load > state.current:
+            state.protection |= QUES_OC | QUES_PROT
+            state.output = False
+
+    def _noisy(self, value):
+        if self.noise:
+            value += self.random.gauss(0.0, self.noise)
+        return value
+
+    @staticmethod
+    def _format(value):
+        return f"{value:+.6E}"
+
+    # Command handlers: (channels, arguments) -> response string, bytes or None
+
+    def _no_op(self, channels, args):
+        return None
+
+    def _idn(self, channels, args):
+        return f"Agilent Technologies,{self.model},{self.serial},D.01.10"
+
+    def _rst(self, channels, args):
+        for state in self.channels.values():
+            load = state.load
+            state.__init__(load)
+        self.screen_format = "GIF"
+
+    def _cls(self, channels, args):
+        self.errors.clear()
+
+    @staticmethod
+    def _state_location(args):
+        location = int(args[0])
+        if not 0 <= location < STATE_SLOTS:
+            raise ValueError(f"State location {location} out of range")
+        return location
+
+    def _save_state(self, channels, args):
+        self.saved_states[self._state_location(args)] = {
+            channel: {name: getattr(state, name) for name in SAVED_SETTINGS}
+            for channel, state in self.channels.items()}
+
+    def _recall_state(self, channels, args):
+        location = self._state_location(args)
+        if location not in self.saved_states:
+            raise ValueError(f"State location {location} is empty")
+        for channel, settings in self.saved_states[location].items():
+            state = self.channels[channel]
+            state.ramp_from = self._present_voltage(state)
+            state.ramp_start = self.clock()
+            for name, value in settings.items():
+                setattr(state, name, value)
+            if state.protection:
+                state.output = False  # Output stays off until protection is cleared
+            self._update_protection(state)
+
+    def _measure(self, channels, index):
+        values = []
+        for channel in channels:
+            state = self.channels[channel]
+            self._update_protection(state)
+            point = self._operating_point(state)
+            value = point[0] * point[1] if index == 2 else point[index]
+            values.append(self._format(self._noisy(value)))
+        return ",".join(values)
+
+    def _measure_voltage(self, channels, args):
+        return self._measure(channels, 0)
+
+    def _measure_current(self, channels, args):
+        return self._measure(channels, 1)
+
+    def _measure_power(self, channels, args):
+        return self._measure(channels, 2)
+
+    def _measure_array(self, channels, index, points=8):
+        return ",".join(self._measure(channels, index) for _ in range(points))
+
+    def _measure_voltage_array(self, channels, args):
+        return self._measure_array(channels, 0)
+
+    def _measure_current_array(self, channels, args):
+        return self._measure_array(channels, 1)
+
+    def _measure_power_array(self, channels, args):
+        return self._measure_array(channels, 2)
+
+    @staticmethod
+    def _parse_bool(value):
+        value = value.upper()
+        if value in ("ON", "1"):
+            return True
+        if value in ("OFF", "0"):
+            return False
+        raise ValueError(f"Expected ON/OFF, got {value}")
+
+    def _set_output(self, channels, args):
+        enable = self._parse_bool(args[0])
+        for channel in channels:
+            state = self.channels[channel]
+            if enable and state.protection:
+                continue  # Output stays off until protection is cleared
+            if enable and not state.output:
+                state.ramp_from = 0.0
+                state.ramp_start = self.clock()
+            state.output = enable
+            self._update_protection(state)
+
+    def _get_output(self, channels, args):
+        return ",".join("1" if self.channels[ch].output else "0" for ch in channels)
+
+    def _clear_protection(self, channels, args):
+        for channel in channels:
+            self.channels[channel].protection = 0
+
+    def _setter(self, attribute):
+        def handler(channels, args):
+            value = float(args[0])
+            for channel in channels:
+                state = self.channels[channel]
+                if attribute == "voltage":
+                    state.ramp_from = self._present_voltage(state)
+                    state.ramp_start = self.clock()
+                    state.list_started = None  # A finished list no longer decides the output
+                setattr(state, attribute, value)
+                self._update_protection(state)
+        return handler
+
+    def _getter(self, attribute):
+        def handler(channels, args):
+            return ",".join(self._format(getattr(self.channels[ch], attribute)) for ch in channels)
+        return handler
+
+    def _set_ocp_state(self, channels, args):
+        enable = self._parse_bool(args[0])
+        for channel in channels:
+            self.channels[channel].ocp_enabled = enable
+            self._update_protection(self.channels[channel])
+
+    def _get_ocp_state(self, channels, args):
+        return ",".join("1" if self.channels[ch].ocp_enabled else "0" for ch in channels)
+
+    def _questionable_condition(self, channels, args):
+        values = []
+        for channel in channels:
+            state = self.channels[channel]
+            self._update_protection(state)
+            condition = state.protection
+            if state.output and state.load and state.voltage / state.load > state.current:
+                condition |= QUES_LIMIT
+            values.append(str(condition))
+        return ",".join(values)
+
+    def _operation_condition(self, channels, args):
+        values = []
+        for channel in channels:
+            state = self.channels[channel]
+            condition = 0
+            if not state.output:
+                condition |= OPER_OFF
+            elif state.load and self._present_voltage(state) / state.load > state.current:
+                condition |= OPER_CC
+            else:
+                condition |= OPER_CV
+            if state.acquisition_armed:
+                condition |= OPER_WTG_MEAS
+            if state.transient_armed:
+                condition |= OPER_WTG_TRAN
+            values.append(str(condition))
+        return ",".join(values)
+
+    # Transient lists and the digitizer
+
+    def _set_voltage_mode(self, channels, args):
+        mode = args[0].upper()[:4]
+        if mode not in ("FIX", "LIST"):
+            raise ValueError(f"Unsupported voltage mode {args[0]}")
+        for channel in channels:
+            self.channels[channel].voltage_mode = mode
+
+    def _set_list(self, attribute):
+        def handler(channels, args):
+            values = [float(value) for value in args]
+            if not 1 <= len(values) <= MAX_LIST_STEPS:
+                raise ValueError(f"List needs 1 to {MAX_LIST_STEPS} points")
+            for channel in channels:
+                setattr(self.channels[channel], attribute, values)
+        return handler
+
+    def _set_list_count(self, channels, args):
+        count = int(float(args[0]))
+        if count < 1:
+            raise ValueError("List count must be at least 1")
+        for channel in channels:
+            self.channels[channel].list_count = count
+
+    def _set_list_last(self, channels, args):
+        enable = self._parse_bool(args[0])
+        for channel in channels:
+            self.channels[channel].list_last = enable
+
+    def _set_source(self, attribute):
+        def handler(channels, args):
+            source = args[0].upper()
+            if source != "BUS" and not (source.startswith("TRAN") and source[4:].isdigit()):
+                raise ValueError(f"Unsupported trigger source {args[0]}")
+            for channel in channels:
+                setattr(self.channels[channel], attribute, source)
+        return handler
+
+    def _initiate_transient(self, channels, args):
+        for channel in channels:
+            self.channels[channel].transient_armed = True
+
+    def _initiate_acquisition(self, channels, args):
+        for channel in channels:
+            state = self.channels[channel]
+            state.acquisition_armed = True
+            state.acquisition_started = None
+
+    def _abort_transient(self, channels, args):
+        now = self.clock()
+        for channel in channels:
+            state = self.channels[channel]
+            if state.list_started is not None and now < state.list_started + state.list_ends[-1]:
+                # A running list stops where it is and the output returns to the VOLT setting;
+                # a finished one keeps its LIST:TERM:LAST behaviour
+                state.ramp_from = self._present_voltage(state, now)
+                state.ramp_start = now
+                state.list_started = None
+            state.transient_armed = False
+
+    def _abort_acquisition(self, channels, args):
+        for channel in channels:
+            self.channels[channel].acquisition_armed = False
+
+    def _trigger(self, transient, acquisition):
+        now = self.clock()
+        started = set()
+        if transient:
+            for channel, state in self.channels.items():
+                if state.transient_armed and state.transient_source == "BUS":
+                    self._start_transient(channel, state, now)
+                    started.add(channel)
+        self._start_acquisitions(now, started, bus=acquisition)
+
+    def _start_transient(self, channel, state, now):
+        state.transient_armed = False
+        if state.voltage_mode != "LIST":
+            return
+        count = len(state.list_voltage)
+        if len(state.list_dwell) not in (1, count):
+            self.errors.append(f'-222,"Data out of range;list lengths differ on channel {channel}"')
+            return
+        dwell = state.list_dwell * count if len(state.list_dwell) == 1 else state.list_dwell
+        state.list_from = self._present_voltage(state, now)
+        state.list_values = state.list_voltage * state.list_count
+        state.list_ends = list(itertools.accumulate(dwell * state.list_count))
+        state.list_started = now
+
+    def _start_acquisitions(self, now, transients, bus):
+        # An acquisition starts on a bus trigger, or when the transient it follows (TRANn) starts
+        for state in self.channels.values():
+            if not state.acquisition_armed:
+                continue
+            source = state.acquisition_source
+            if (source == "BUS" and bus) or (source.startswith("TRAN") and int(source[4:]) in transients):
+                state.acquisition_armed = False
+                state.acquisition_started = now
+
+    def _set_sweep_points(self, channels, args):
+        points = int(float(args[0]))
+        if not 1 <= points <= MAX_SWEEP_POINTS:
+            raise ValueError(f"Sweep points must be 1 to {MAX_SWEEP_POINTS}")
+        for channel in channels:
+            self.channels[channel].sweep_points = points
+
+    def _set_sweep_interval(self, channels, args):
+        # Rounded to the digitizer's interval resolution, like the hardware
+        steps = max(1, round(float(args[0]) / SWEEP_INTERVAL_STEP))
+        for channel in channels:
+            self.channels[channel].sweep_interval = steps * SWEEP_INTERVAL_STEP
+
+    def _fetch_array(self, channels, index):
+        values = []
+        for channel in channels:
+            state = self.channels[channel]
+            if state.acquisition_started is None:
+                raise ValueError(f"No acquired data on channel {channel}")
+            # FETCh waits for the acquisition to complete, holding up the instrument meanwhile
+            end = state.acquisition_started + state.sweep_points * state.sweep_interval
+            remaining = end - self.clock()
+            if remaining > 0:
+                self.sleep(remaining)
+            for point in range(state.sweep_points):
+                sample = self._operating_point(state, state.acquisition_started + point * state.sweep_interval)
+                values.append(self._format(self._noisy(sample[index])))
+        return ",".join(values)
+
+    def _next_error(self, channels, args):
+        if self.errors:
+            return self.errors.popleft()
+        return '+0,"No error"'
+
+    def _channel_models(self, channels, args):
+        return ",".join("N6762A" for _ in channels or self.channels)
+
+    def _set_screen_format(self, channels, args):
+        screen_format = args[0].upper()
+        if screen_format not in ("GIF", "PNG", "BMP"):
+            raise ValueError(f"Unsupported format {screen_format}")
+        self.screen_format = screen_format
+
+    def _screen_dump(self, channels, args):
+        data = self.screen_data.get(self.screen_format)
+        if data is None:
+            # Derive the picture from the output state so it only changes when the front panel would
+            seed = hash(tuple((s.output, round(s.voltage, 3), round(s.current, 3), s.protection)
+                              for s in self.channels.values())) & 0x7F
+            data = render_screen(self.screen_format, self.screen_size, seed)
+        if self.indefinite_blocks:
+            return b"#0" + data + b"\n"
+        length = str(len(data)).encode("ascii")
+        return b"#" + str(len(length)).encode("ascii") + length + data + b"\n"
+
+
+# Screen dump images
+
+def _screen_pixels(width, height, seed):
+    # Simple 7-bit test pattern so every format can share it
+    for y in range(height):
+        yield bytes(((x >> 3) + (y >> 3) + seed) & 0x7F for x in range(width))
+
+
+def render_screen(image_format, size, seed=0):
+    width, height = size
+    if image_format == "BMP":
+        return _render_bmp(width, height, seed)
+    if image_format == "PNG":
+        return _render_png(width, height, seed)
+    return _render_gif(width, height, seed)
+
+
+def _render_bmp(width, height, seed):
+    row_size = (width * 3 + 3) & ~3
+    rows = []
+    for row in _screen_pixels(width, height, seed):
+        pixels = b"".join(bytes((value * 2, value, 255 - value * 2)) for value in row)
+        rows.append(pixels.ljust(row_size, b"\0"))
+    image = b"".join(reversed(rows))  # BMP rows are stored bottom-up
+    header = struct.pack("<2sIHHI", b"BM", 54 + len(image), 0, 0, 54)
+    info = struct.pack("<IiiHHIIiiII", 40, width, height, 1, 24, 0, len(image), 2835, 2835, 0, 0)
+    return header + info + image
+
+
+def _render_png(width, height, seed):
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    raw = b"".join(b"\0" + bytes(v * 2 for v in row) for row in _screen_pixels(width, height, seed))
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)  # 8-bit greyscale
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b"")
+
+
+def _render_gif(width, height, seed):
+    # Uncompressed GIF: with a 7-bit minimum code size every literal is an
+    # 8-bit code, and clearing the table every 126 codes stops it growing.
+    clear, end = 128, 129
+    codes = bytearray([clear])
+    run = 0
+    for row in _screen_pixels(width, height, seed):
+        for value in row:
+            codes.append(value)
+            run += 1
+            if run == 126:
+                codes.append(clear)
+                run = 0
+    codes.append(end)
+
+    palette = b"".join(bytes((i * 2, i * 2, 255 - i * 2)) for i in range(128))
+    blocks = b"".join(bytes((len(codes[i:i + 255]),)) + bytes(codes[i:i + 255]) for i in range(0, len(codes), 255))
+    return (b"GIF89a" + struct.pack("<HHBBB", width, height, 0xF6, 0, 0) + palette
+            + b"," + struct.pack("<HHHHB", 0, 0, width, height, 0) + b"\x07" + blocks + b"\0;")
+
+
+# Transports
+
+def _timeout_error():
+    if pyvisa is not None:
+        return pyvisa.errors.VisaIOError(pyvisa.constants.VI_ERROR_TMO)
+    return TimeoutError("Simulated VISA timeout")
+
+
+def _connection_lost_error():
+    if pyvisa is not None:
+        return pyvisa.errors.VisaIOError(pyvisa.constants.VI_ERROR_CONN_LOST)
+    return ConnectionResetError("Simulated connection loss")
+
+
+class SimulatedInstrument:
+    """pyvisa resource look-alike backed by an in-process SimulatedN67xx."""
+
+    def __init__(self, device=None, resource_name="SIM"):
+        self.device = device or SimulatedN67xx()
+        self.resource_name = resource_name
+        self.timeout = 5000
+        self.read_termination = "\n"
+        self.write_termination = "\n"
+        self.session = None
+        self.closed = False
+        self._output = b""
+
+    def write(self, message):
+        if self.closed:
+            raise _timeout_error()
+        if not self.device.link_up():
+            raise _connection_lost_error()
+        response = self.device.handle(message)
+        if response is not None:
+            self._output += response
+        return len(message)
+
+    def read_chunk(self, size):
+        if not self._output:
+            raise _timeout_error()
+        data, self._output = self._output[:size], self._output[size:]
+        return data, not self._output
+
+    def read_raw(self, size=None):
+        if not self._output:
+            raise _timeout_error()
+        data, self._output = self._output, b""
+        return data
+
+    def read_bytes(self, count, chunk_size=None, break_on_termchar=False):
+        data = b""
+        while len(data) < count:
+            chunk, end = self.read_chunk(count - len(data))
+            data += chunk
+            if end:
+                break
+        return data
+
+    def read(self):
+        message = self.read_raw().decode("ascii", errors="replace")
+        if self.read_termination and message.endswith(self.read_termination):
+            message = message[:-len(self.read_termination)]
+        return message
+
+    def query(self, message):
+        self.write(message)
+        return self.read()
+
+    def close(self):
+        self.closed = True
+
+
+class _ScpiRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            message = line.decode("ascii", errors="replace").strip()
+            if not message:
+                continue
+            response = self.server.device.handle(message)
+            if response is not None:
+                self.wfile.write(response)
+                self.wfile.flush()
+
+
+class SimulatorServer(socketserver.ThreadingTCPServer):
+    """Raw SCPI socket server, reachable as TCPIP::<host>::<port>::SOCKET."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, device=None, host="127.0.0.1", port=DEFAULT_PORT):
+        self.device = device or SimulatedN67xx()
+        super(SimulatorServer, self).__init__((host, port), _ScpiRequestHandler)
+
+    def start(self):
+        """Serve on a background thread and return it."""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+def write_pyvisa_sim_profile(path, channels=4, model="N6705B", resource="TCPIP::localhost::INSTR"):
+    """Write a pyvisa-sim YAML profile covering the static part of the command set.
+
+    Use it with pyvisa.ResourceManager(f"{path}@sim").  Setters accept the
+    forms the panel sends, e.g. "VOLT 5, (@1)".  pyvisa-sim cannot map ON
+    and OFF onto a numeric property, so "OUTP ON,(@1)" and "CURR:PROT:STAT
+    ON, (@1)" are accepted but leave OUTP? and CURR:PROT:STAT? unchanged;
+    "OUTP 1,(@1)" does switch the simulated output.
+    """
+    dialogues = [
+        ("*IDN?", f'"Agilent Technologies,{model},MY00000000,D.01.10"'),
+        ("*RST", None),
+        ("*OPC?", '"1"'),
+        ("SYST:ERR?", "'+0,\"No error\"'"),
+        ("SYST:ERR:CLE", None),
+    ]
+    properties = []
+    for channel in range(1, channels + 1):
+        dialogues += [(f"{header}? (@{channel})", '"0"')
+                      for header in ("MEAS:VOLT", "MEAS:CURR", "STAT:QUES:COND", "OUTPut:STATe")]
+        # The combined poll of the panel and the acquisition process
+        dialogues.append((f"MEAS:VOLT? (@{channel});:MEAS:CURR? (@{channel})", '"+0.000000E+00;+0.000000E+00"'))
+        dialogues += [(f"OUTP {state},(@{channel})", None) for state in ("ON", "OFF")]
+        dialogues += [(f"CURR:PROT:STAT {state}, (@{channel})", None) for state in ("ON", "OFF")]
+        dialogues.append((f"OUTP:PROT:CLE, (@{channel})", None))
+        properties += [
+            (f"{name}_{channel}", default, f"{header}? (@{channel})", "{:+.6E}", f"{header} {{}}, (@{channel})", "float")
+            for name, header, default in (("voltage", "VOLT", 0.0), ("current", "CURR", 0.1),
+                                          ("slew", "VOLT:SLEW", INFINITY), ("ovp", "VOLT:PROT", 22.0),
+                                          ("ocp_delay", "CURR:PROT:DEL", 0.02))
+        ]
+        properties.append((f"output_{channel}", 0, f"OUTP? (@{channel})", "{:d}", f"OUTP {{}},(@{channel})", "int"))
+        properties.append((f"ocp_{channel}", 0, f"CURR:PROT:STAT? (@{channel})", "{:d}",
+                           f"CURR:PROT:STAT {{}}, (@{channel})", "int"))
+
+    lines = [
+        'spec: "1.1"',
+        "devices:",
+        f"  {model}:",
+        "    eom:",
+        "      TCPIP INSTR:",
+        '        q: "\\n"',
+        '        r: "\\n"',
+        "    error: '-113,\"Undefined header\"'",
+        # Match compound messages whole; split at ';' the combined poll would be answered in two reads
+        '    delimiter: ""',
+        "    dialogues:",
+    ]
+    for query, response in dialogues:
+        lines.append(f'      - q: "{query}"')
+        if response is not None:
+            lines.append(f"        r: {response}")
+    lines.append("    properties:")
+    for name, default, getter, getter_format, setter, value_type in properties:
+        lines += [
+            f"      {name}:",
+            f"        default: {default}",
+            "        getter:",
+            f'          q: "{getter}"',
+            f'          r: "{getter_format}"',
+            "        setter:",
+            f'          q: "{setter}"',
+            "        specs:",
+            f"          type: {value_type}",
+        ]
+    lines += ["resources:", f"  {resource}:", f"    device: {model}"]
+
+    with open(path, "w") as file:
+        file.write("\n".join(lines) + "\n")
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simulated Keysight N67xx SCPI server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--channels", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per command")
+    parser.add_argument("--command-latency", action="append", default=[], metavar="HEADER=SECONDS",
+                        help="per-command latency, e.g. MEAS:VOLT?=0.03")
+    parser.add_argument("--noise", type=float, default=0.0, help="measurement noise standard deviation")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--trip", action="append", default=[], metavar="CHANNEL:ovp|ocp:SECONDS",
+                        help="trip a protection after a delay, e.g. 2:ocp:30")
+    parser.add_argument("--screen-size", default="320x240", metavar="WxH")
+    parser.add_argument("--indefinite-blocks", action="store_true", help="send screen dumps as #0 blocks")
+    parser.add_argument("--write-sim-profile", metavar="PATH", help="write a pyvisa-sim profile and exit")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    if args.write_sim_profile:
+        write_pyvisa_sim_profile(args.write_sim_profile, args.channels)
+        print(f"pyvisa-sim profile written to {args.write_sim_profile}")
+        return
+
+    command_latency = {}
+    for item in args.command_latency:
+        header, delay = item.rsplit("=", 1)
+        command_latency[header] = float(delay)
+    trips = []
+    for item in args.trip:
+        channel, kind, delay = item.split(":")
+        trips.append((int(channel), kind.lower(), float(delay)))
+    width, height = (int(part) for part in args.screen_size.lower().split("x"))
+
+    device = SimulatedN67xx(channels=args.channels, latency=args.latency, command_latency=command_latency,
+                            noise=args.noise, seed=args.seed, trips=trips, screen_size=(width, height),
+                            indefinite_blocks=args.indefinite_blocks)
+    server = SimulatorServer(device, args.host, args.port)
+    print(f"Simulated {device.model} listening on TCPIP::{args.host}::{args.port}::SOCKET")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Output console and file logging for the control panel.
+
+Messages are queued (from any thread) and flushed into the widget a few
+times per second in a single append, so a burst of readings costs one
+relayout instead of one per line.  The console keeps a fixed-size ring of
+lines, filters by severity and folds repeats of the same warning or error
+into a single "repeated N times" line.  File logging goes through a
+QueueHandler so the GUI thread never waits on disk.
+"""
+import collections
+import logging
+import logging.handlers
+import queue
+import time
+
+from PyQt5.QtWidgets import QPlainTextEdit
+from PyQt5.QtCore import QTimer
+from PyQt5.QtGui import QTextCursor
+
+DEFAULT_MAX_LINES = 2000
+DEFAULT_FLUSH_INTERVAL_MS = 250
+DEFAULT_REPEAT_WINDOW = 10.0  # Seconds during which identical warnings/errors are folded
+
+ERROR_PREFIXES = ("error", "failed", "unexpected error", "timeout", "key error", "invalid")
+WARNING_PREFIXES = ("instrument is not connected", "connection canceled")
+
+LEVEL_TAGS = {logging.DEBUG: "D", logging.INFO: "I", logging.WARNING: "W", logging.ERROR: "E"}
+
+
+def infer_level(message):
+    """Guess the severity of an untagged console message from its wording."""
+    text = message.lstrip().lower()
+    if text.startswith(ERROR_PREFIXES):
+        return logging.ERROR
+    if text.startswith(WARNING_PREFIXES):
+        return logging.WARNING
+    return logging.INFO
+
+
+_listener = None
+
+
+def start_queued_file_logging(filename, level=logging.INFO):
+    """Route the root logger through a queue to a file handler on a background thread.
+
+    Returns the QueueListener; call stop_queued_file_logging() at exit to flush the queue.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    log_queue = queue.SimpleQueue()
+    file_handler = logging.FileHandler(filename)
+    file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener.start()
+    _listener = listener
+    return listener
+
+
+def stop_queued_file_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class OutputConsole(QPlainTextEdit):
+    def __init__(self, parent=None, max_lines=DEFAULT_MAX_LINES, flush_interval_ms=DEFAULT_FLUSH_INTERVAL_MS,
+                 repeat_window=DEFAULT_REPEAT_WINDOW):
+        super(OutputConsole, self).__init__(parent)
+        self.setReadOnly(True)
+        self.setMaximumBlockCount(max_lines)
+        self.lines = collections.deque(maxlen=max_lines)  # (level, text) ring used to re-filter
+        self.pending = collections.deque()  # Appended from any thread, drained on the GUI thread
+        self.min_level = logging.INFO
+        self.repeat_window = repeat_window
+        self.repeats = {}  # message -> [time first shown, suppressed count]
+
+        self.flush_timer = QTimer(self)
+        self.flush_timer.timeout.connect(self.flush)
+        self.flush_timer.start(flush_interval_ms)
+
+    def post(self, message, level=logging.INFO):
+        self.pending.append((time.time(), level, message))
+
+    def set_min_level(self, level):
+        self.min_level = level
+        self.setPlainText("\n".join(text for line_level, text in self.lines if line_level >= self.min_level))
+        self.moveCursor(QTextCursor.End)
+
+    def clear_lines(self):
+        self.lines.clear()
+        self.clear()
+
+    def _format(self, stamp, level, message):
+        return f"{time.strftime('%H:%M:%S', time.localtime(stamp))} {LEVEL_TAGS.get(level, '?')} {message}"
+
+    def _fold_repeats(self, stamp, level, message):
+        # True when the message is a repeat that should be counted rather than shown
+        if level < logging.WARNING:
+            return False
+        state = self.repeats.get(message)
+        if state is not None and stamp - state[0] < self.repeat_window:
+            state[1] += 1
+            return True
+        self.repeats[message] = [stamp, 0]
+        return False
+
+    def _expired_repeats(self, now):
+        summaries = []
+        for message, (first, suppressed) in list(self.repeats.items()):
+            if now - first >= self.repeat_window:
+                del self.repeats[message]
+                if suppressed:
+                    summaries.append((now, logging.WARNING, f"(previous message repeated {suppressed} times: {message})"))
+        return summaries
+
+    def flush(self):
+        now = time.time()
+        entries = []
+        while self.pending:
+            stamp, level, message = self.pending.popleft()
+            if not self._fold_repeats(stamp, level, message):
+                entries.append((stamp, level, message))
+        if self.repeats:
+            entries.extend(self._expired_repeats(now))
+        if not entries:
+            return
+
+        visible = []
+        for stamp, level, message in entries:
+            text = self._format(stamp, level, message)
+            self.lines.append((level, text))
+            if level >= self.min_level:
+                visible.append(text)
+        if not visible:
+            return
+
+        scrollbar = self.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum() - 2
+        # Only the newest lines survive the ring, and one append means one relayout
+        self.appendPlainText("\n".join(visible[-self.lines.maxlen:]))
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
@@ -0,0 +1,170 @@
+"""Named configuration profiles.
+
+A profile is the full per-channel setup (voltage, current, slew, OVP, OCP
+state and delay, output state), captured with one batched query and kept
+in a local JSON file (KEYSIGHT_PROFILES, default profiles.json).  Saving
+also stores the state in one of the mainframe's *SAV slots, tagged with the
+mainframe's IDN, so restoring on the same mainframe is a single *RCL.  Every
+restore is verified with the same one-query readback; when the slot was
+overwritten, belongs to another mainframe, or the profile has no slot, the
+settings go out as one coalesced program message instead.
+"""
+import datetime
+import json
+import os
+import time
+
+from scpi import format_channel_list
+
+MAX_SLOT = 15  # *SAV/*RCL locations 1..15; 0 is left for the power-on state
+SETTINGS = ("voltage", "current", "slew", "ovp", "ocp", "ocp_delay", "output")
+_QUERIES = {
+    "voltage": "VOLT?",
+    "current": "CURR?",
+    "slew": "VOLT:SLEW?",
+    "ovp": "VOLT:PROT?",
+    "ocp": "CURR:PROT:STAT?",
+    "ocp_delay": "CURR:PROT:DEL?",
+    "output": "OUTP?",
+}
+_BOOLEAN = ("ocp", "output")
+TOLERANCE = 1e-6  # Relative, for comparing readback against a profile
+
+
+class ProfileError(Exception):
+    pass
+
+
+def read_state(instrument, channels):
+    """Every setting of every channel in one round trip: {channel: {setting: value}}."""
+    channel_list = format_channel_list(channels)
+    response = instrument.query(";:".join(f"{_QUERIES[name]} {channel_list}" for name in SETTINGS))
+    groups = response.strip().split(";")
+    if len(groups) != len(SETTINGS):
+        raise ProfileError(f"Unexpected readback: {response.strip()!r}")
+    state = {channel: {} for channel in channels}
+    for name, group in zip(SETTINGS, groups):
+        values = group.split(",")
+        if len(values) != len(channels):
+            raise ProfileError(f"Unexpected {name} readback: {group!r}")
+        for channel, value in zip(channels, values):
+            state[channel][name] = float(value) != 0 if name in _BOOLEAN else float(value)
+    return state
+
+
+def restore_message(state, current):
+    """One program message that takes the channels from `current` (a read_state result) to `state`.
+
+    Channels sharing a value are grouped into one command.  OVP is raised
+    before the voltage and lowered after it, and an output that is on while
+    its OVP drops below the present setpoint is switched off for the change,
+    so a restore never trips OVP on the way.
+    """
+    def commands(name, header, format_value, channels=None):
+        by_value = {}
+        for channel, settings in sorted(state.items()):
+            if channels is None or channel in channels:
+                by_value.setdefault(format_value(settings[name]), []).append(channel)
+        return [f"{header} {value},{format_channel_list(group)}" for value, group in by_value.items()]
+
+    on_off = lambda enabled: "ON" if enabled else "OFF"
+    number = lambda value: f"{value:g}"
+    switched_off = {channel for channel, settings in state.items()
+                    if not settings["output"]
+                    or current[channel]["output"] and settings["ovp"] < current[channel]["voltage"]}
+    switched_on = {channel for channel, settings in state.items() if settings["output"]}
+    ovp_raised = {channel for channel, settings in state.items() if settings["ovp"] >= current[channel]["ovp"]}
+    # Outputs go off before the setpoints change and on afterwards
+    parts = [f"OUTP OFF,{format_channel_list(sorted(switched_off))}"] if switched_off else []
+    parts += commands("ovp", "VOLT:PROT", number, ovp_raised)
+    parts += commands("current", "CURR", number)
+    parts += commands("ocp_delay", "CURR:PROT:DEL", number)
+    parts += commands("ocp", "CURR:PROT:STAT", on_off)
+    parts += commands("slew", "VOLT:SLEW", number)
+    parts += commands("voltage", "VOLT", number)
+    parts += commands("ovp", "VOLT:PROT", number, set(state) - ovp_raised)
+    parts += commands("output", "OUTP", on_off, switched_on)
+    return ";:".join(parts)
+
+
+def states_match(expected, actual):
+    for channel, settings in expected.items():
+        for name, value in settings.items():
+            other = actual.get(channel, {}).get(name)
+            if other is None:
+                return False
+            if name in _BOOLEAN:
+                if bool(other) != bool(value):
+                    return False
+            elif abs(other - value) > TOLERANCE * max(1.0, abs(value)):
+                return False
+    return True
+
+
+class ProfileStore:
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("KEYSIGHT_PROFILES", "profiles.json")
+        self.profiles = {}
+        if os.path.exists(self.path):
+            with open(self.path) as file:
+                self.profiles = json.load(file)
+
+    def names(self):
+        return sorted(self.profiles)
+
+    def get(self, name):
+        profile = self.profiles[name]
+        # JSON keys are strings; channels are ints everywhere else
+        return dict(profile, state={int(channel): settings for channel, settings in profile["state"].items()})
+
+    def _save(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump(self.profiles, file, indent=2)
+        os.replace(temp_path, self.path)
+
+    def _free_slot(self, idn, name):
+        used = {profile["slot"] for other, profile in self.profiles.items()
+                if other != name and profile.get("idn") == idn and profile.get("slot")}
+        return next((slot for slot in range(1, MAX_SLOT + 1) if slot not in used), None)
+
+    def capture(self, instrument, name, channels):
+        """Read the instrument's state into profile `name` and store it in a *SAV slot."""
+        idn = instrument.query("*IDN?").strip()
+        state = read_state(instrument, channels)
+        previous = self.profiles.get(name)
+        slot = previous["slot"] if previous and previous.get("idn") == idn and previous.get("slot") else None
+        slot = slot or self._free_slot(idn, name)
+        if slot is not None:
+            instrument.query(f"*SAV {slot};*OPC?")
+        self.profiles[name] = {
+            "created": datetime.datetime.now().astimezone().isoformat(),
+            "idn": idn,
+            "slot": slot,
+            "state": {str(channel): settings for channel, settings in state.items()},
+        }
+        self._save()
+        return self.get(name)
+
+    def restore(self, instrument, name):
+        """Apply profile `name`.  Returns (method, elapsed seconds), method being "*RCL n" or "write"."""
+        profile = self.get(name)
+        state = profile["state"]
+        channels = sorted(state)
+        start = time.perf_counter()
+        current = None
+        if profile.get("slot") and profile.get("idn") == instrument.query("*IDN?").strip():
+            instrument.query(f"*RCL {profile['slot']};*OPC?")
+            current = read_state(instrument, channels)
+            if states_match(state, current):
+                return f"*RCL {profile['slot']}", time.perf_counter() - start
+        if current is None:
+            current = read_state(instrument, channels)  # The write order depends on where each channel starts
+        instrument.query(restore_message(state, current) + ";*OPC?")
+        if not states_match(state, read_state(instrument, channels)):
+            raise ProfileError(f"Instrument did not accept profile {name}; check SYST:ERR?")
+        return "write", time.perf_counter() - start
+
+    def delete(self, name):
+        del self.profiles[name]
+        self._save()
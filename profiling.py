@@ -0,0 +1,268 @@
+"""Runtime profiling of the panel's GUI thread and the acquisition process.
+
+Profiler times every timer callback it is attached to (update_live_data,
+check_protection_statuses, the dashboard render, the console and view
+flushes) and splits out the part spent waiting on the instrument, which
+ProfiledSession measures in the session chain.  While it is enabled, a
+20 ms heartbeat on the GUI thread measures event-loop lag and a watchdog
+thread grabs the GUI thread's stack whenever the heartbeat is more than
+stall_ms late, so each stall is reported with the slot and the line it was
+stuck in.  When disabled, a slot costs one flag check.
+
+On demand, a capture profiles a chosen window: cProfile on the GUI thread
+(saved as .prof for pstats or snakeviz), or a StackSampler (stack_sampler),
+which samples the stacks of every thread and saves them in the folded
+format flame-graph tools read.
+
+KEYSIGHT_PROFILE=1 enables timing and stall detection at start-up
+(KEYSIGHT_PROFILE_STALL_MS, default 200); KEYSIGHT_PROFILE=cprofile or
+=sample also captures the first KEYSIGHT_PROFILE_SECONDS (default 30).  The
+Profiler dialog switches it at runtime, starts captures and saves a JSON
+report.  The acquisition process samples itself on request:
+
+    python acquisition.py profile --seconds 10 --output acquisition.folded
+"""
+import collections
+import cProfile
+import io
+import json
+import pstats
+import sys
+import threading
+import time
+import traceback
+
+from PyQt5.QtCore import QTimer
+
+from scpi import SessionProxy
+from scpi_stats import LatencyHistogram
+from stack_sampler import SUMMARY_LINES, StackSampler
+
+DEFAULT_STALL_MS = 200
+BEAT_INTERVAL_MS = 20
+MAX_STALLS = 100  # Most recent stalls kept for the report
+
+
+class SlotStats:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.visa = 0.0  # Seconds of the total spent waiting on the instrument
+
+    def to_dict(self):
+        latency = self.latency
+        return {
+            "count": latency.total,
+            "total_ms": latency.sum * 1000,
+            "mean_ms": latency.sum / latency.total * 1000 if latency.total else 0.0,
+            "p50_ms": latency.percentile(0.50) * 1000,
+            "p95_ms": latency.percentile(0.95) * 1000,
+            "max_ms": latency.max * 1000,
+            "visa_ms": self.visa * 1000,
+        }
+
+
+class Profiler:
+    def __init__(self, enabled=False, stall_ms=DEFAULT_STALL_MS, on_stall=None):
+        self.enabled = False
+        self.stall_seconds = stall_ms / 1000
+        self.on_stall = on_stall  # Called on the GUI thread with each stall's dict
+        self.slots = {}
+        self.stalls = collections.deque(maxlen=MAX_STALLS)
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.thread_id = threading.get_ident()  # Created on the GUI thread
+        self.current = None  # Slot running on the GUI thread
+        self.visa_seconds = 0.0  # Instrument waits on the GUI thread, added to by ProfiledSession
+        self.last_beat = time.perf_counter()
+        self.pending_stall = None  # (slot, stack) grabbed by the watchdog during a stall
+        self.watchdog_stop = threading.Event()
+        self.capture = None  # (mode, profiler or sampler, path, on_done) while a capture runs
+
+        self.beat_timer = QTimer()
+        self.beat_timer.setInterval(BEAT_INTERVAL_MS)
+        self.beat_timer.timeout.connect(self._beat)
+        self.set_enabled(enabled)
+
+    # Slot timing
+
+    def wrap(self, name, slot):
+        """Return `slot` timed under `name` whenever profiling is enabled."""
+        def timed():
+            if not self.enabled:
+                return slot()
+            previous, self.current = self.current, name
+            visa = self.visa_seconds
+            start = time.perf_counter()
+            try:
+                return slot()
+            finally:
+                self._record(name, time.perf_counter() - start, self.visa_seconds - visa)
+                self.current = previous
+        return timed
+
+    def attach(self, timer, name, slot):
+        """Route a QTimer that is connected to `slot` through wrap()."""
+        timer.timeout.disconnect(slot)
+        timer.timeout.connect(self.wrap(name, slot))
+
+    def _record(self, name, elapsed, visa):
+        with self.lock:
+            stats = self.slots.get(name)
+            if stats is None:
+                stats = self.slots[name] = SlotStats()
+            stats.latency.add(elapsed)
+            stats.visa += visa
+
+    # Stall detection
+
+    def set_enabled(self, enabled):
+        if enabled == self.enabled:
+            return
+        self.enabled = enabled
+        if enabled:
+            self.last_beat = time.perf_counter()
+            self.pending_stall = None
+            self.beat_timer.start()
+            self.watchdog_stop = threading.Event()
+            threading.Thread(target=self._watch, args=(self.watchdog_stop,), name="stall-watchdog",
+                             daemon=True).start()
+        else:
+            self.beat_timer.stop()
+            self.watchdog_stop.set()
+
+    def _beat(self):
+        now = time.perf_counter()
+        lag = now - self.last_beat - BEAT_INTERVAL_MS / 1000
+        self.last_beat = now
+        if lag < self.stall_seconds:
+            return
+        slot, stack = self.pending_stall or (None, [])
+        self.pending_stall = None
+        stall = {"time": time.time() - lag, "duration_ms": lag * 1000, "slot": slot, "stack": stack}
+        with self.lock:
+            self.stalls.append(stall)
+        if self.on_stall is not None:
+            self.on_stall(stall)
+
+    def _watch(self, stop):
+        while not stop.wait(self.stall_seconds / 4):
+            overdue = time.perf_counter() - self.last_beat - BEAT_INTERVAL_MS / 1000
+            if self.pending_stall is None and overdue >= self.stall_seconds:
+                # The GUI thread is still inside whatever is blocking it
+                frame = sys._current_frames().get(self.thread_id)
+                stack = [line.rstrip() for line in traceback.format_stack(frame)] if frame is not None else []
+                self.pending_stall = (self.current, stack)
+
+    # Captures
+
+    def start_capture(self, mode, seconds, path, on_done=None):
+        """Profile the next `seconds`, then save to `path` and call on_done(path, summary) on the GUI thread.
+
+        mode is "cprofile" (the GUI thread, deterministic) or "sample" (stacks of every thread).
+        """
+        if self.capture is not None:
+            raise ValueError("A capture is already running")
+        if mode == "cprofile":
+            collector = cProfile.Profile()
+            collector.enable()
+        elif mode == "sample":
+            collector = StackSampler().start()
+        else:
+            raise ValueError(f"Unknown capture mode {mode!r}")
+        self.capture = (mode, collector, path, on_done)
+        QTimer.singleShot(int(seconds * 1000), self.finish_capture)
+
+    def finish_capture(self):
+        if self.capture is None:
+            return None
+        mode, collector, path, on_done = self.capture
+        self.capture = None
+        if mode == "cprofile":
+            collector.disable()
+            collector.dump_stats(path)
+            text = io.StringIO()
+            pstats.Stats(collector, stream=text).sort_stats("cumulative").print_stats(SUMMARY_LINES)
+            summary = text.getvalue()
+        else:
+            collector.stop()
+            with open(path, "w") as file:
+                file.write(collector.folded())
+            summary = collector.summary()
+        if on_done is not None:
+            on_done(path, summary)
+        return summary
+
+    # Reporting
+
+    def reset(self):
+        with self.lock:
+            self.slots = {}
+            self.stalls.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        with self.lock:
+            slots = {name: stats.to_dict() for name, stats in self.slots.items()}
+            stalls = list(self.stalls)
+        elapsed = time.time() - self.started
+        for stats in slots.values():
+            stats["busy_percent"] = stats["total_ms"] / 10 / elapsed if elapsed > 0 else 0.0
+        return {"since": self.started, "enabled": self.enabled, "stall_ms": self.stall_seconds * 1000,
+                "slots": slots, "stalls": stalls}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2, sort_keys=True)
+
+    def format_table(self):
+        snapshot = self.snapshot()
+        lines = [f"{'slot':<28} {'count':>7} {'mean ms':>8} {'p95 ms':>8} {'max ms':>8} "
+                 f"{'VISA ms':>9} {'busy %':>7}"]
+        rows = sorted(snapshot["slots"].items(), key=lambda item: -item[1]["total_ms"])
+        for name, stats in rows:
+            lines.append(f"{name[:28]:<28} {stats['count']:>7} {stats['mean_ms']:>8.2f} {stats['p95_ms']:>8.2f} "
+                         f"{stats['max_ms']:>8.2f} {stats['visa_ms']:>9.1f} {stats['busy_percent']:>7.2f}")
+        if not rows:
+            lines.append("No slots timed yet." if self.enabled else "Profiling is disabled.")
+        stalls = snapshot["stalls"]
+        lines.append("")
+        lines.append(f"Event-loop stalls over {snapshot['stall_ms']:.0f} ms: {len(stalls)}")
+        for stall in stalls[-10:]:
+            where = stall["stack"][-1].strip().splitlines()[0] if stall["stack"] else ""
+            lines.append(f"  {time.strftime('%H:%M:%S', time.localtime(stall['time']))} "
+                         f"{stall['duration_ms']:>7.0f} ms  {stall['slot'] or '-':<24} {where}")
+        return "\n".join(lines)
+
+
+class ProfiledSession(SessionProxy):
+    """Adds the time GUI-thread calls spend waiting on the instrument to a Profiler."""
+
+    _own_attributes = ("_session", "_profiler")
+
+    def __init__(self, session, profiler):
+        super(ProfiledSession, self).__init__(session)
+        self._profiler = profiler
+
+    def _call(self, method, *args, **kwargs):
+        profiler = self._profiler
+        if not profiler.enabled or threading.get_ident() != profiler.thread_id:
+            return method(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            profiler.visa_seconds += time.perf_counter() - start
+
+    def write(self, *args, **kwargs):
+        return self._call(self._session.write, *args, **kwargs)
+
+    def query(self, *args, **kwargs):
+        return self._call(self._session.query, *args, **kwargs)
+
+    def read(self, *args, **kwargs):
+        return self._call(self._session.read, *args, **kwargs)
+
+    def read_raw(self, *args, **kwargs):
+        return self._call(self._session.read_raw, *args, **kwargs)
+
+    def read_bytes(self, *args, **kwargs):
+        return self._call(self._session.read_bytes, *args, **kwargs)
@@ -0,0 +1,45 @@
+"""Sample timestamps anchored to a monotonic clock.
+
+The wall clock is read once when the session starts; every later stamp is
+that anchor plus time.perf_counter() elapsed since.  Stamps are float64
+epoch seconds with sub-microsecond resolution that never step backwards
+when NTP or the user adjusts the system clock.  The anchor and offset go
+into the session header so the data can be related to other logs.
+"""
+import datetime
+import time
+
+
+class SampleClock:
+    def __init__(self):
+        # Read the two clocks back to back and take the wall time at the monotonic midpoint
+        before = time.perf_counter()
+        wall = time.time()
+        after = time.perf_counter()
+        self.monotonic_anchor = (before + after) / 2
+        self.wall_anchor = wall
+        self.offset = wall - self.monotonic_anchor  # Add to a perf_counter() reading to get epoch seconds
+
+    def to_wall(self, monotonic):
+        return monotonic + self.offset
+
+    def now(self):
+        return time.perf_counter() + self.offset
+
+    def header(self):
+        info = time.get_clock_info("perf_counter")
+        return {
+            "session_start": datetime.datetime.fromtimestamp(self.wall_anchor).astimezone().isoformat(),
+            "wall_anchor": f"{self.wall_anchor:.6f}",
+            "monotonic_anchor": f"{self.monotonic_anchor:.9f}",
+            "clock_offset": f"{self.offset:.9f}",
+            "clock": f"perf_counter ({info.implementation}, resolution {info.resolution:g} s)",
+        }
+
+
+def timed_query(instrument, message, clock):
+    """Query and return (response, midpoint timestamp, round-trip latency in seconds)."""
+    start = time.perf_counter()
+    response = instrument.query(message)
+    end = time.perf_counter()
+    return response, clock.to_wall((start + end) / 2), end - start
@@ -0,0 +1,115 @@
+"""Small SCPI parsing helpers shared by the simulator and session tooling."""
+import re
+
+# Nodes the N67xx treats as implied, e.g. [SOURce:]VOLTage[:LEVel][:IMMediate]
+OPTIONAL_NODES = {"SOUR", "LEV", "IMM", "AMPL"}
+# Implied only under MEASure and FETCh, e.g. MEASure[:SCALar]:VOLTage[:DC]?
+MEASUREMENT_ROOTS = {"MEAS", "FETC"}
+OPTIONAL_MEASUREMENT_NODES = {"SCAL", "DC"}
+
+_CHANNEL_LIST_RE = re.compile(r"\(@([^)]*)\)")
+_HEADER_RE = re.compile(r"([^\s,]+)[\s,]*(.*)", re.DOTALL)
+
+
+def short_form(node):
+    """Return the short form of a single SCPI node, e.g. 'VOLTage' -> 'VOLT'."""
+    node = node.upper().rstrip("0123456789")
+    if len(node) <= 4:
+        return node
+    # SCPI rule: first four characters, or three if the fourth is a vowel
+    return node[:3] if node[3] in "AEIOU" else node[:4]
+
+
+def normalize_header(header):
+    """Canonical short-form header, e.g. ':SOURce:VOLTage:LEVel?' -> 'VOLT?', 'MEAS:VOLT:DC?' -> 'MEAS:VOLT?'."""
+    header = header.strip()
+    if header.startswith("*"):
+        return header.upper()
+    query = header.endswith("?")
+    nodes = [short_form(node) for node in header.rstrip("?").strip(":").split(":") if node]
+    nodes = [node for node in nodes if node not in OPTIONAL_NODES]
+    if nodes and nodes[0] in MEASUREMENT_ROOTS:
+        nodes = nodes[:1] + [node for node in nodes[1:] if node not in OPTIONAL_MEASUREMENT_NODES]
+    return ":".join(nodes) + ("?" if query else "")
+
+
+def split_command(command):
+    """Split one SCPI command into (header, argument string)."""
+    # A header never contains ',' so 'OUTP:PROT:CLE, (@1)' splits cleanly too
+    match = _HEADER_RE.match(command.strip())
+    if not match:
+        return "", ""
+    return match.group(1), match.group(2)
+
+
+def mnemonic(message):
+    """Normalized headers of every command in a message, joined by ';'."""
+    return ";".join(normalize_header(split_command(command)[0])
+                    for command in split_message(message) if command.strip())
+
+
+def split_message(message):
+    """Split a program message into commands on ';' outside quoted strings."""
+    commands, current, quote = [], [], None
+    for char in message:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char == ";":
+            commands.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    commands.append("".join(current))
+    return [command.strip() for command in commands if command.strip()]
+
+
+def parse_channel_list(arguments):
+    """Split arguments into (channels, remaining arguments).
+
+    '5, (@1,3:4)' -> ([1, 3, 4], ['5'])
+    """
+    channels = []
+    match = _CHANNEL_LIST_RE.search(arguments)
+    if match:
+        for item in match.group(1).split(","):
+            item = item.strip()
+            if not item:
+                continue
+            if ":" in item:
+                first, last = (int(part) for part in item.split(":", 1))
+                channels.extend(range(first, last + 1))
+            else:
+                channels.append(int(item))
+        arguments = arguments[:match.start()] + arguments[match.end():]
+    remaining = [argument.strip() for argument in arguments.split(",") if argument.strip()]
+    return channels, remaining
+
+
+def format_channel_list(channels):
+    return "(@" + ",".join(str(channel) for channel in channels) + ")"
+
+
+class SessionProxy:
+    """Base for transparent wrappers around a VISA session.
+
+    Attribute reads and writes that the subclass does not handle (timeout,
+    read_termination, close, ...) go straight to the wrapped session.
+    Subclasses list their own attributes in _own_attributes.
+    """
+
+    _own_attributes = ("_session",)
+
+    def __init__(self, session):
+        object.__setattr__(self, "_session", session)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def __setattr__(self, name, value):
+        if name in self._own_attributes:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._session, name, value)
@@ -0,0 +1,226 @@
+"""Per-command SCPI traffic statistics.
+
+InstrumentedSession wraps a VISA session (or anything that looks like one)
+and records count, bytes and a latency histogram per command mnemonic,
+plus timeouts and other errors.  When the attached ScpiStats is disabled
+every call goes straight to the wrapped session after a single flag check.
+"""
+import bisect
+import json
+import math
+import threading
+import time
+
+import pyvisa
+
+from scpi import SessionProxy, mnemonic
+from screenshot import read_chunk
+
+# Histogram bucket edges in seconds: 10 per decade from 1 us to 1000 s
+BUCKET_EDGES = [10 ** (exponent / 10) for exponent in range(-60, 31)]
+MNEMONIC_CACHE_SIZE = 1024
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_EDGES) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(BUCKET_EDGES, seconds)] += 1
+        self.total += 1
+        self.sum += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def percentile(self, fraction):
+        """Approximate percentile from the bucket containing it (within ~12%)."""
+        if not self.total:
+            return 0.0
+        rank = fraction * self.total
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                low = BUCKET_EDGES[index - 1] if index else 0.0
+                high = BUCKET_EDGES[index] if index < len(BUCKET_EDGES) else self.max
+                estimate = math.sqrt(low * high) if low else high
+                return min(max(estimate, self.min), self.max)
+        return self.max
+
+
+class CommandStats:
+    def __init__(self):
+        self.count = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.latency = LatencyHistogram()
+
+    def to_dict(self):
+        latency = self.latency
+        return {
+            "count": self.count,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "mean_ms": latency.sum / latency.total * 1000 if latency.total else 0.0,
+            "p50_ms": latency.percentile(0.50) * 1000,
+            "p95_ms": latency.percentile(0.95) * 1000,
+            "p99_ms": latency.percentile(0.99) * 1000,
+            "max_ms": latency.max * 1000,
+        }
+
+
+class ScpiStats:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.commands = {}
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def record(self, command, elapsed, sent=0, received=0, error=None):
+        with self.lock:
+            stats = self.commands.get(command)
+            if stats is None:
+                stats = self.commands[command] = CommandStats()
+            stats.count += 1
+            stats.bytes_sent += sent
+            stats.bytes_received += received
+            if error is None:
+                stats.latency.add(elapsed)
+            elif is_timeout(error):
+                stats.timeouts += 1
+            else:
+                stats.errors += 1
+
+    def reset(self):
+        with self.lock:
+            self.commands = {}
+            self.started = time.time()
+
+    def snapshot(self):
+        with self.lock:
+            commands = {name: stats.to_dict() for name, stats in self.commands.items()}
+        return {"since": self.started, "enabled": self.enabled, "commands": commands}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2, sort_keys=True)
+
+    def format_table(self):
+        snapshot = self.snapshot()
+        lines = [f"{'command':<28} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+                 f"{'max ms':>8} {'tx B':>9} {'rx B':>10} {'tmo':>4} {'err':>4}"]
+        rows = sorted(snapshot["commands"].items(), key=lambda item: -item[1]["count"])
+        for name, stats in rows:
+            lines.append(f"{name[:28]:<28} {stats['count']:>7} {stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} "
+                         f"{stats['p99_ms']:>8.2f} {stats['max_ms']:>8.2f} {stats['bytes_sent']:>9} "
+                         f"{stats['bytes_received']:>10} {stats['timeouts']:>4} {stats['errors']:>4}")
+        if not rows:
+            lines.append("No SCPI traffic recorded." if self.enabled else "Statistics are disabled.")
+        return "\n".join(lines)
+
+
+def is_timeout(error):
+    if isinstance(error, TimeoutError):
+        return True
+    return getattr(error, "error_code", None) == pyvisa.constants.VI_ERROR_TMO
+
+
+class InstrumentedSession(SessionProxy):
+    """Transparent proxy around a VISA session that feeds a ScpiStats."""
+
+    _own_attributes = ("_session", "_stats", "_mnemonics", "_pending")
+
+    def __init__(self, session, stats):
+        super(InstrumentedSession, self).__init__(session)
+        self._stats = stats
+        self._mnemonics = {}
+        # (mnemonic, start time, bytes sent, bytes received) of a query still being read
+        self._pending = None
+
+    def _mnemonic(self, message):
+        cached = self._mnemonics.get(message)
+        if cached is None:
+            if len(self._mnemonics) >= MNEMONIC_CACHE_SIZE:
+                self._mnemonics.clear()
+            cached = self._mnemonics[message] = mnemonic(message)
+        return cached
+
+    def write(self, message, *args, **kwargs):
+        if not self._stats.enabled:
+            return self._session.write(message, *args, **kwargs)
+        command = self._mnemonic(message)
+        start = time.perf_counter()
+        try:
+            result = self._session.write(message, *args, **kwargs)
+        except Exception as e:
+            self._stats.record(command, time.perf_counter() - start, len(message), 0, e)
+            raise
+        if "?" in command:
+            # Timed together with the read(s) that collect the response
+            self._pending = (command, start, len(message), 0)
+        else:
+            self._stats.record(command, time.perf_counter() - start, len(message))
+        return result
+
+    def _collect(self, received, end=True, error=None):
+        pending = self._pending
+        if pending is None:
+            return
+        command, start, sent, so_far = pending
+        if end or error is not None:
+            self._pending = None
+            self._stats.record(command, time.perf_counter() - start, sent, so_far + received, error)
+        else:
+            self._pending = (command, start, sent, so_far + received)
+
+    def _read(self, method, *args, **kwargs):
+        if not self._stats.enabled:
+            return method(*args, **kwargs)
+        try:
+            result = method(*args, **kwargs)
+        except Exception as e:
+            self._collect(0, error=e)
+            raise
+        self._collect(len(result))
+        return result
+
+    def read(self, *args, **kwargs):
+        return self._read(self._session.read, *args, **kwargs)
+
+    def read_raw(self, *args, **kwargs):
+        return self._read(self._session.read_raw, *args, **kwargs)
+
+    def read_bytes(self, *args, **kwargs):
+        return self._read(self._session.read_bytes, *args, **kwargs)
+
+    def read_chunk(self, size):
+        if not self._stats.enabled:
+            return read_chunk(self._session, size)
+        try:
+            data, end = read_chunk(self._session, size)
+        except Exception as e:
+            self._collect(0, error=e)
+            raise
+        self._collect(len(data), end)
+        return data, end
+
+    def query(self, message, *args, **kwargs):
+        if not self._stats.enabled:
+            return self._session.query(message, *args, **kwargs)
+        # The wrapped session's own query, so arguments such as pyvisa's delay still apply
+        command = self._mnemonic(message)
+        start = time.perf_counter()
+        try:
+            result = self._session.query(message, *args, **kwargs)
+        except Exception as e:
+            self._stats.record(command, time.perf_counter() - start, len(message), 0, e)
+            raise
+        self._stats.record(command, time.perf_counter() - start, len(message), len(result))
+        return result
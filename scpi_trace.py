@@ -0,0 +1,387 @@
+"""SCPI session recording and deterministic replay.
+
+A trace holds every write, response (including binary blocks such as
+:HCOPy:SDUMp:DATA?) and I/O error of a session with its time offset.  The
+format is a JSON metadata header followed by length-prefixed records, and
+is gzip compressed when the file name ends in .gz.
+
+ReplayInstrument serves a trace back as a pyvisa-like resource, either as
+fast as possible or at the recorded timing.  Commands are matched to the
+recording by content, so small differences in poll ordering between the
+recorded and the replaying session do not derail the replay.
+
+    python scpi_trace.py info bench_session.kstrace.gz
+    python scpi_trace.py dump bench_session.kstrace.gz
+"""
+import argparse
+import collections
+import gzip
+import json
+import struct
+import threading
+import time
+
+import pyvisa
+
+from scpi import SessionProxy, mnemonic
+from screenshot import read_chunk
+
+MAGIC = b"KSTRACE1"
+DEFAULT_EXTENSION = ".kstrace.gz"
+LOOKAHEAD = 256  # Records searched for a matching write before falling back
+
+# Record kinds
+WRITE = b"W"
+READ = b"R"
+CHUNK = b"P"  # Partial block chunk
+LAST_CHUNK = b"L"
+ERROR = b"X"
+RESPONSE_KINDS = (READ, CHUNK, LAST_CHUNK, ERROR)
+
+_RECORD = struct.Struct("<dcI")  # time offset, kind, payload length
+_LENGTH = struct.Struct("<I")
+
+
+def _open(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode, compresslevel=6)
+    return open(path, mode)
+
+
+def _encode(data):
+    return data.encode("utf-8", errors="replace") if isinstance(data, str) else bytes(data)
+
+
+class TraceWriter:
+    def __init__(self, path, metadata=None):
+        self.path = path
+        self.file = _open(path, "wb")
+        header = json.dumps(dict(metadata or {}, recorded=time.time())).encode("utf-8")
+        self.file.write(MAGIC + _LENGTH.pack(len(header)) + header)
+        self.start = time.perf_counter()
+        self.records = 0
+
+    def write(self, kind, payload):
+        payload = _encode(payload)
+        self.file.write(_RECORD.pack(time.perf_counter() - self.start, kind, len(payload)) + payload)
+        self.records += 1
+
+    def close(self):
+        self.file.close()
+
+
+class TraceReader:
+    def __init__(self, path):
+        self.path = path
+        self.file = _open(path, "rb")
+        if self.file.read(len(MAGIC)) != MAGIC:
+            self.file.close()
+            raise ValueError(f"{path} is not an SCPI trace")
+        (length,) = _LENGTH.unpack(self.file.read(_LENGTH.size))
+        self.metadata = json.loads(self.file.read(length).decode("utf-8"))
+
+    def __iter__(self):
+        while True:
+            header = self.file.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                return
+            offset, kind, length = _RECORD.unpack(header)
+            yield offset, kind, self.file.read(length)
+
+    def close(self):
+        self.file.close()
+
+
+class SessionRecorder:
+    """Owns the trace file; RecordingSession feeds it while recording is active."""
+
+    def __init__(self):
+        self.writer = None
+        self.lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.writer is not None
+
+    def start(self, path, metadata=None):
+        with self.lock:
+            if self.writer is not None:
+                self.writer.close()
+            self.writer = TraceWriter(path, metadata)
+
+    def stop(self):
+        with self.lock:
+            writer, self.writer = self.writer, None
+            if writer is not None:
+                writer.close()
+        return writer
+
+    def record(self, kind, payload):
+        with self.lock:
+            if self.writer is not None:
+                self.writer.write(kind, payload)
+
+    def record_error(self, error):
+        code = getattr(error, "error_code", None)
+        self.record(ERROR, json.dumps({"type": type(error).__name__, "code": code, "message": str(error)}))
+
+
+class RecordingSession(SessionProxy):
+    """Proxy that copies every transaction into a SessionRecorder while it is active."""
+
+    _own_attributes = ("_session", "_recorder")
+
+    def __init__(self, session, recorder):
+        super(RecordingSession, self).__init__(session)
+        self._recorder = recorder
+
+    def write(self, message, *args, **kwargs):
+        if self._recorder.writer is None:
+            return self._session.write(message, *args, **kwargs)
+        self._recorder.record(WRITE, message)
+        try:
+            return self._session.write(message, *args, **kwargs)
+        except Exception as e:
+            self._recorder.record_error(e)
+            raise
+
+    def _read(self, method, *args, **kwargs):
+        if self._recorder.writer is None:
+            return method(*args, **kwargs)
+        try:
+            result = method(*args, **kwargs)
+        except Exception as e:
+            self._recorder.record_error(e)
+            raise
+        self._recorder.record(READ, result)
+        return result
+
+    def read(self, *args, **kwargs):
+        return self._read(self._session.read, *args, **kwargs)
+
+    def read_raw(self, *args, **kwargs):
+        return self._read(self._session.read_raw, *args, **kwargs)
+
+    def read_bytes(self, *args, **kwargs):
+        return self._read(self._session.read_bytes, *args, **kwargs)
+
+    def read_chunk(self, size):
+        if self._recorder.writer is None:
+            return read_chunk(self._session, size)
+        try:
+            data, end = read_chunk(self._session, size)
+        except Exception as e:
+            self._recorder.record_error(e)
+            raise
+        self._recorder.record(LAST_CHUNK if end else CHUNK, data)
+        return data, end
+
+    def query(self, message, *args, **kwargs):
+        if self._recorder.writer is None:
+            return self._session.query(message, *args, **kwargs)
+        # The wrapped session's own query, so arguments such as pyvisa's delay still apply
+        self._recorder.record(WRITE, message)
+        try:
+            result = self._session.query(message, *args, **kwargs)
+        except Exception as e:
+            self._recorder.record_error(e)
+            raise
+        self._recorder.record(READ, result)
+        return result
+
+
+def _replayed_error(payload):
+    info = json.loads(payload.decode("utf-8"))
+    if info.get("code") is not None:
+        return pyvisa.errors.VisaIOError(info["code"])
+    if info.get("type") == "TimeoutError":
+        return TimeoutError(info.get("message"))
+    return IOError(info.get("message"))
+
+
+def _timeout_error():
+    return pyvisa.errors.VisaIOError(pyvisa.constants.VI_ERROR_TMO)
+
+
+class ReplayInstrument:
+    """pyvisa resource look-alike that answers from a recorded trace.
+
+    With realtime=True responses become available at their recorded time
+    offsets (divided by speed); otherwise the trace is served as fast as the
+    caller asks.  Commands not found within LOOKAHEAD records are answered
+    with the last response recorded for the same message, or a timeout if
+    it was never recorded.
+    """
+
+    def __init__(self, path, realtime=False, speed=1.0, loop=False):
+        self.path = path
+        self.realtime = realtime
+        self.speed = speed
+        self.loop = loop
+        self.resource_name = f"replay:{path}"
+        self.timeout = 5000
+        self.read_termination = "\n"
+        self.write_termination = "\n"
+        self.session = None
+        self.matched = 0
+        self.unmatched = 0
+        self.skipped = 0
+        self._last_responses = {}
+        self._response = None  # (data, error) for the last write
+        self._replay_start = None
+        self._open_trace()
+
+    def _open_trace(self):
+        self._reader = TraceReader(self.path)
+        self.metadata = self._reader.metadata
+        self._records = iter(self._reader)
+        self._window = collections.deque()
+        self._time_base = 0.0
+        self._last_offset = 0.0
+
+    def _fill_window(self):
+        while len(self._window) < LOOKAHEAD:
+            record = next(self._records, None)
+            if record is None:
+                if not self.loop or self._window:
+                    return
+                # Looped replay restarts once the window has drained; time keeps running forward
+                time_base = self._time_base + self._last_offset
+                self._reader.close()
+                self._open_trace()
+                self._time_base = time_base
+                record = next(self._records, None)
+                if record is None:
+                    return
+            self._window.append(record)
+
+    def _pop(self):
+        offset, kind, payload = self._window.popleft()
+        self._last_offset = offset
+        self._wait_until(self._time_base + offset)
+        return kind, payload
+
+    def _wait_until(self, offset):
+        if not self.realtime:
+            return
+        if self._replay_start is None:
+            self._replay_start = time.perf_counter() - offset / self.speed
+        delay = self._replay_start + offset / self.speed - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def write(self, message):
+        encoded = _encode(message)
+        self._fill_window()
+        index = next((i for i, (_, kind, payload) in enumerate(self._window)
+                      if kind == WRITE and payload == encoded), None)
+
+        if index is None:
+            self.unmatched += 1
+            if encoded in self._last_responses:
+                self._response = self._last_responses[encoded]
+            elif "?" in mnemonic(message):
+                self._response = (b"", _timeout_error())
+            else:
+                self._response = None
+            return len(message)
+
+        self.matched += 1
+        for _ in range(index):
+            self._window.popleft()
+        self.skipped += index
+        self._pop()
+
+        data = bytearray()
+        error = None
+        self._fill_window()
+        while self._window and self._window[0][1] in RESPONSE_KINDS:
+            kind, payload = self._pop()
+            if kind == ERROR:
+                error = _replayed_error(payload)
+            else:
+                data += payload
+            self._fill_window()
+
+        self._response = (bytes(data), error) if data or error else None
+        if self._response is not None:
+            self._last_responses[encoded] = self._response
+        return len(message)
+
+    def _take(self, size=None):
+        if self._response is None:
+            raise _timeout_error()
+        data, error = self._response
+        if error is not None and not data:
+            self._response = None
+            raise error
+        if size is None or size >= len(data):
+            self._response = (b"", error) if error is not None else None
+            return data, self._response is None
+        self._response = (data[size:], error)
+        return data[:size], False
+
+    def read_chunk(self, size):
+        return self._take(size)
+
+    def read_raw(self, size=None):
+        return self._take()[0]
+
+    def read_bytes(self, count, chunk_size=None, break_on_termchar=False):
+        return self._take(count)[0]
+
+    def read(self):
+        message = self.read_raw().decode("utf-8", errors="replace")
+        if self.read_termination and message.endswith(self.read_termination):
+            message = message[:-len(self.read_termination)]
+        return message
+
+    def query(self, message, delay=None):
+        self.write(message)
+        if delay:
+            time.sleep(delay)
+        return self.read()
+
+    def close(self):
+        self._reader.close()
+
+
+def _describe(path):
+    reader = TraceReader(path)
+    counts = collections.Counter()
+    byte_total = 0
+    last_offset = 0.0
+    for offset, kind, payload in reader:
+        last_offset = offset
+        byte_total += len(payload)
+        if kind == WRITE:
+            counts[mnemonic(payload.decode("utf-8", errors="replace"))] += 1
+        elif kind == ERROR:
+            counts["<error>"] += 1
+    reader.close()
+    return reader.metadata, counts, byte_total, last_offset
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect SCPI session traces")
+    parser.add_argument("command", choices=("info", "dump"))
+    parser.add_argument("trace")
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        metadata, counts, byte_total, duration = _describe(args.trace)
+        print(json.dumps(metadata, indent=2))
+        print(f"Duration: {duration:.3f} s, payload bytes: {byte_total}")
+        for name, count in counts.most_common():
+            print(f"{count:>8}  {name}")
+        return
+
+    reader = TraceReader(args.trace)
+    for offset, kind, payload in reader:
+        text = payload.decode("utf-8", errors="replace") if len(payload) <= 120 else f"<{len(payload)} bytes>"
+        print(f"{offset:12.6f} {kind.decode()} {text.rstrip()}")
+    reader.close()
+
+
+if __name__ == "__main__":
+    main()
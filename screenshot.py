@@ -0,0 +1,262 @@
+"""Screen capture for N67xx mainframes via :HCOPy:SDUMp:DATA?
+
+The screen dump comes back as an IEEE-488.2 arbitrary block.  Blocks are
+streamed straight to disk chunk by chunk so a capture never holds more than
+one chunk of image data in memory, and the transfer takes exactly as long
+as the instrument needs instead of relying on fixed sleeps.
+"""
+import collections
+import datetime
+import hashlib
+import os
+import threading
+import time
+
+import pyvisa
+
+SCREENSHOT_FORMATS = ("GIF", "PNG", "BMP")
+DEFAULT_CHUNK_SIZE = 64 * 1024
+TRANSFER_TIMEOUT_MS = 20000  # Large screen dumps can take several seconds over LAN
+
+CaptureResult = collections.namedtuple("CaptureResult", "path size digest elapsed duplicate")
+
+
+class BlockFormatError(Exception):
+    pass
+
+
+def read_chunk(instrument, size):
+    """Read up to `size` raw bytes and return (data, end_of_message)."""
+    reader = getattr(instrument, "read_chunk", None)
+    if reader is not None:
+        return reader(size)
+    data, status = instrument.visalib.read(instrument.session, size)
+    return bytes(data), status != pyvisa.constants.StatusCode.success_max_count_read
+
+
+class _ChunkStream:
+    # Reads never ask for more bytes than the block still needs: raw sockets
+    # have no END indicator, so an oversized read would wait for the timeout.
+    def __init__(self, instrument, chunk_size):
+        self.instrument = instrument
+        self.chunk_size = chunk_size
+        self.buffer = b""
+        self.ended = False
+
+    def _fill(self, size):
+        if self.ended:
+            return False
+        data, self.ended = read_chunk(self.instrument, size)
+        self.buffer += data
+        return True
+
+    def read_exact(self, count):
+        while len(self.buffer) < count:
+            if not self._fill(count - len(self.buffer)):
+                raise BlockFormatError(f"Block truncated: expected {count} bytes, got {len(self.buffer)}")
+        data, self.buffer = self.buffer[:count], self.buffer[count:]
+        return data
+
+    def read_some(self, limit=None):
+        if not self.buffer and not self._fill(limit or self.chunk_size):
+            return b""
+        if limit is None or len(self.buffer) <= limit:
+            data, self.buffer = self.buffer, b""
+        else:
+            data, self.buffer = self.buffer[:limit], self.buffer[limit:]
+        return data
+
+    def consume_terminator(self):
+        # Discard the NL that follows a definite block
+        if not self.buffer and not self.ended:
+            self._fill(1)
+        self.buffer = b""
+
+
+def read_ieee_block(instrument, out_file, chunk_size=DEFAULT_CHUNK_SIZE, digest=None):
+    """Stream one IEEE-488.2 block from `instrument` into `out_file`.
+
+    Both the definite form (#<n><length><data>) and the indefinite form
+    (#0<data>NL^END) are supported.  Returns the number of payload bytes.
+    """
+    stream = _ChunkStream(instrument, chunk_size)
+
+    # Skip any whitespace the instrument put in front of the block
+    header = stream.read_exact(2)
+    while header[:1] in (b" ", b"\t", b"\r", b"\n"):
+        header = header[1:] + stream.read_exact(1)
+    if header[:1] != b"#":
+        raise BlockFormatError(f"Expected '#' at start of block, got {header[:1]!r}")
+
+    digits = header[1:]
+    if not digits.isdigit():
+        raise BlockFormatError(f"Invalid block length digit {digits!r}")
+
+    written = 0
+    num_digits = int(digits)
+    if num_digits:
+        length_field = stream.read_exact(num_digits)
+        if not length_field.isdigit():
+            raise BlockFormatError(f"Invalid block length field {length_field!r}")
+        remaining = int(length_field)
+        while remaining:
+            data = stream.read_some(min(remaining, chunk_size))
+            if not data:
+                raise BlockFormatError(f"Block truncated with {remaining} bytes outstanding")
+            out_file.write(data)
+            if digest is not None:
+                digest.update(data)
+            written += len(data)
+            remaining -= len(data)
+        stream.consume_terminator()
+    else:
+        # Indefinite length: only END marks the end of the data, so a NL
+        # inside the image is just data.  This needs a transport with END
+        # (VXI-11/HiSLIP); raw sockets should use definite blocks.  Hold back the last byte of each
+        # chunk so the final NL terminator can be dropped.
+        held = b""
+        while True:
+            data = stream.read_some()
+            if not data:
+                break
+            data = held + data
+            held, data = data[-1:], data[:-1]
+            out_file.write(data)
+            if digest is not None:
+                digest.update(data)
+            written += len(data)
+        if held and held != b"\n":
+            out_file.write(held)
+            if digest is not None:
+                digest.update(held)
+            written += 1
+
+    return written
+
+
+class ScreenshotCapture:
+    def __init__(self, get_instrument, lock, directory=".", image_format="GIF",
+                 chunk_size=DEFAULT_CHUNK_SIZE, skip_duplicates=True):
+        self.get_instrument = get_instrument  # Callable so reconnects are picked up
+        self.lock = lock
+        self.directory = directory
+        self.image_format = image_format
+        self.chunk_size = chunk_size
+        self.skip_duplicates = skip_duplicates
+        self.last_digest = None
+        self._instrument_format = None  # Format last sent to the instrument
+        self._periodic_thread = None
+        self._periodic_stop = None  # Event of the running periodic worker; each worker gets its own
+
+    def reset_session(self):
+        # A new session may find the instrument in any state
+        self._instrument_format = None
+        self.last_digest = None
+
+    def set_format(self, image_format):
+        image_format = image_format.upper()
+        if image_format not in SCREENSHOT_FORMATS:
+            raise ValueError(f"Unsupported screenshot format: {image_format}")
+        self.image_format = image_format
+
+    def default_path(self, timestamped=False):
+        extension = self.image_format.lower()
+        if timestamped:
+            stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+            return os.path.join(self.directory, f"screenshot_{stamp}.{extension}")
+        return os.path.join(self.directory, f"instrument_display.{extension}")
+
+    def capture(self, path=None, timestamped=False, skip_duplicate=False):
+        """Fetch one screen dump and return a CaptureResult.
+
+        With skip_duplicate, a frame identical to the previous one is not
+        kept and comes back with duplicate=True.
+        """
+        path = path or self.default_path(timestamped)
+        temp_path = path + ".part"
+        digest = hashlib.sha1()
+        start = time.perf_counter()
+
+        with self.lock:
+            instrument = self.get_instrument()
+            if instrument is None:
+                raise RuntimeError("Instrument is not connected.")
+
+            previous_timeout = instrument.timeout
+            previous_termination = getattr(instrument, "read_termination", None)
+            try:
+                instrument.timeout = max(previous_timeout or 0, TRANSFER_TIMEOUT_MS)
+                if self._instrument_format != self.image_format:
+                    instrument.write(f":HCOPy:SDUMp:DATA:FORMat {self.image_format}")
+                    self._instrument_format = self.image_format
+                # Binary data may contain the termination character
+                instrument.read_termination = None
+                instrument.write(":HCOPy:SDUMp:DATA?")
+                with open(temp_path, "wb") as file:
+                    size = read_ieee_block(instrument, file, self.chunk_size, digest)
+            except Exception:
+                self._instrument_format = None
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            finally:
+                instrument.read_termination = previous_termination
+                instrument.timeout = previous_timeout
+
+        elapsed = time.perf_counter() - start
+        frame_digest = digest.hexdigest()
+        if skip_duplicate and frame_digest == self.last_digest:
+            os.remove(temp_path)
+            return CaptureResult(None, size, frame_digest, elapsed, True)
+
+        os.replace(temp_path, path)
+        self.last_digest = frame_digest
+        return CaptureResult(path, size, frame_digest, elapsed, False)
+
+    def capture_async(self, on_done, on_error, path=None):
+        def worker():
+            try:
+                result = self.capture(path)
+            except Exception as e:
+                on_error(e)
+            else:
+                on_done(result)
+
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        return thread
+
+    def is_periodic_running(self):
+        return self._periodic_thread is not None and self._periodic_thread.is_alive()
+
+    def start_periodic(self, interval, on_done, on_error):
+        """Capture every `interval` seconds on a background thread until stop_periodic().
+
+        Unchanged frames are skipped when skip_duplicates is set.
+        """
+        if self.is_periodic_running():
+            return
+        # A worker stopped in the middle of a transfer finishes it on its own, so it can't see the new
+        # worker's event
+        stop = self._periodic_stop = threading.Event()
+
+        def worker():
+            next_time = time.monotonic()
+            while not stop.is_set():
+                try:
+                    on_done(self.capture(timestamped=True, skip_duplicate=self.skip_duplicates))
+                except Exception as e:
+                    on_error(e)
+                next_time += interval
+                # Don't try to catch up on frames missed during a slow transfer
+                next_time = max(next_time, time.monotonic())
+                stop.wait(next_time - time.monotonic())
+
+        self._periodic_thread = threading.Thread(target=worker, daemon=True)
+        self._periodic_thread.start()
+
+    def stop_periodic(self):
+        if self._periodic_stop is not None:
+            self._periodic_stop.set()
+        self._periodic_stop = None
+        self._periodic_thread = None
@@ -0,0 +1,218 @@
+"""Historical session browser for large CSV logs.
+
+SessionBrowser reads logs through a SessionIndex (session_index), which
+keeps per-block time bounds and envelopes so only the blocks on screen are
+parsed.  It plots a session with min/max decimation: wide ranges are
+drawn straight from the index envelopes, narrow ones from the parsed rows.
+The whole session or a selected range can be exported to a new CSV, or to
+a columnar NPZ/Parquet/HDF5 file (see columnar_export).
+
+    python session_browser.py power_supply_data.csv
+    python session_browser.py --index-only power_supply_data.csv
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pyqtgraph as pg
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import (
+    QApplication, QCheckBox, QFileDialog, QHBoxLayout, QLabel, QPushButton, QVBoxLayout, QWidget
+)
+
+from columnar_export import available_formats, export_rows
+from session_index import CHANNELS, LogFormatError, SessionIndex
+
+MAX_PARSE_ROWS = 400000  # Wider views are drawn from the index envelopes alone
+
+
+def decimate_minmax(t, y, buckets):
+    """Reduce to at most ~2*buckets points while keeping every peak visible."""
+    if len(t) <= 2 * buckets:
+        return t, y
+    size = -(-len(t) // buckets)
+    whole = len(t) // size * size
+    t_blocks = t[:whole].reshape(-1, size)
+    y_blocks = y[:whole].reshape(-1, size)
+    t_out = np.empty(2 * len(t_blocks))
+    y_out = np.empty(2 * len(y_blocks))
+    t_out[0::2] = t_blocks[:, 0]
+    t_out[1::2] = t_blocks[:, -1]
+    y_out[0::2] = y_blocks.min(axis=1)
+    y_out[1::2] = y_blocks.max(axis=1)
+    return np.concatenate((t_out, t[whole:])), np.concatenate((y_out, y[whole:]))
+
+
+class SessionBrowser(QWidget):
+    def __init__(self, path=None, parent=None):
+        super(SessionBrowser, self).__init__(parent)
+        self.index = None
+        self.resize(900, 650)
+        self.setWindowTitle("Session Browser")
+
+        layout = QVBoxLayout(self)
+        controls = QHBoxLayout()
+        open_button = QPushButton("Open...", self)
+        open_button.clicked.connect(self.choose_file)
+        controls.addWidget(open_button)
+        self.channel_boxes = {}
+        for channel in range(1, CHANNELS + 1):
+            box = QCheckBox(f"CH{channel}", self)
+            box.setChecked(True)
+            box.toggled.connect(self.schedule_reload)
+            self.channel_boxes[channel] = box
+            controls.addWidget(box)
+        controls.addStretch()
+        self.status_label = QLabel(self)
+        controls.addWidget(self.status_label)
+        export_button = QPushButton("Export Range...", self)
+        export_button.clicked.connect(self.export_range)
+        controls.addWidget(export_button)
+        export_all_button = QPushButton("Export Session...", self)
+        export_all_button.clicked.connect(self.export_session)
+        controls.addWidget(export_all_button)
+        layout.addLayout(controls)
+
+        self.graphics = pg.GraphicsLayoutWidget()
+        self.voltage_plot = self.graphics.addPlot(row=0, col=0, axisItems={'bottom': pg.DateAxisItem()})
+        self.current_plot = self.graphics.addPlot(row=1, col=0, axisItems={'bottom': pg.DateAxisItem()})
+        self.voltage_plot.setLabel('left', 'Voltage', units='V')
+        self.current_plot.setLabel('left', 'Current', units='A')
+        self.current_plot.setXLink(self.voltage_plot)
+        for plot in (self.voltage_plot, self.current_plot):
+            plot.showGrid(x=True, y=True, alpha=0.3)
+        self.region = pg.LinearRegionItem()  # Range used by Export
+        self.region.setZValue(10)
+        self.voltage_plot.addItem(self.region)
+        layout.addWidget(self.graphics)
+
+        colors = {1: (230, 200, 0), 2: (0, 190, 0), 3: (40, 120, 255), 4: (230, 50, 50)}
+        self.curves = {
+            channel: (self.voltage_plot.plot(pen=colors[channel]), self.current_plot.plot(pen=colors[channel]))
+            for channel in range(1, CHANNELS + 1)
+        }
+
+        # Reload the visible slice once panning/zooming pauses
+        self.reload_timer = QTimer(self)
+        self.reload_timer.setSingleShot(True)
+        self.reload_timer.setInterval(100)
+        self.reload_timer.timeout.connect(self.reload)
+        self.voltage_plot.sigXRangeChanged.connect(self.schedule_reload)
+
+        if path:
+            self.open(path)
+
+    def choose_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Open Session Log", "", "CSV logs (*.csv);;All files (*)")
+        if path:
+            self.open(path)
+
+    def open(self, path):
+        start = time.perf_counter()
+        try:
+            self.index = SessionIndex.open(path)
+        except (OSError, LogFormatError) as e:
+            self.status_label.setText(f"Error: {e}")
+            return
+        self.setWindowTitle(f"Session Browser - {os.path.basename(path)}")
+        span = self.index.time_range()
+        rows = int(self.index.rows.sum())
+        self.status_label.setText(f"{rows} rows indexed in {time.perf_counter() - start:.2f} s")
+        if span is None:
+            return
+        self.voltage_plot.setXRange(*span, padding=0.02)
+        width = span[1] - span[0]
+        self.region.setRegion((span[0] + width * 0.45, span[0] + width * 0.55))
+        self.reload()
+
+    def schedule_reload(self, *args):
+        self.reload_timer.start()
+
+    def reload(self):
+        if self.index is None:
+            return
+        t0, t1 = self.voltage_plot.viewRange()[0]
+        buckets = max(200, self.graphics.width())
+        visible = [channel for channel, box in self.channel_boxes.items() if box.isChecked()]
+        rows = None
+        if self.index.rows_between(t0, t1) <= MAX_PARSE_ROWS:
+            rows = self.index.read(t0, t1, visible)
+        for channel, (voltage_curve, current_curve) in self.curves.items():
+            if channel not in visible:
+                voltage_curve.clear()
+                current_curve.clear()
+            elif rows is not None:
+                selected = rows[rows[:, 0] == channel]
+                voltage_curve.setData(*decimate_minmax(selected[:, 1], selected[:, 2], buckets))
+                current_curve.setData(*decimate_minmax(selected[:, 1], selected[:, 3], buckets))
+            else:
+                starts, ends, envelope = self.index.overview(channel, t0, t1)
+                stamps = np.column_stack((starts, ends)).ravel()
+                voltage_curve.setData(stamps, envelope[:, 0:2].ravel())
+                current_curve.setData(stamps, envelope[:, 2:4].ravel())
+
+    def export_range(self):
+        if self.index is None:
+            return
+        self.export(*self.region.getRegion(), "Export Range")
+
+    def export_session(self):
+        if self.index is None:
+            return
+        self.export(-np.inf, np.inf, "Export Session")
+
+    def export(self, t0, t1, title):
+        filters = {"CSV files (*.csv)": ".csv", "NumPy archive (*.npz)": ".npz"}
+        if "parquet" in available_formats():
+            filters["Parquet (*.parquet)"] = ".parquet"
+        if "hdf5" in available_formats():
+            filters["HDF5 (*.h5)"] = ".h5"
+        path, selected = QFileDialog.getSaveFileName(self, title, "export.csv", ";;".join(filters))
+        if not path:
+            return
+        if not os.path.splitext(path)[1]:
+            path += filters.get(selected, ".csv")
+        visible = [channel for channel, box in self.channel_boxes.items() if box.isChecked()]
+        start = time.perf_counter()
+        try:
+            if path.lower().endswith(".csv"):
+                count = self.index.export(path, t0, t1, visible)
+            else:
+                counts = export_rows(self.index.iter_rows(t0, t1, visible), path,
+                                     {"exported_from": os.path.abspath(self.index.path)})
+                count = sum(counts.values())
+        except (OSError, ValueError) as e:
+            self.status_label.setText(f"Export failed: {e}")
+            return
+        self.status_label.setText(f"Exported {count} rows to {os.path.basename(path)} "
+                                  f"in {time.perf_counter() - start:.2f} s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Browse recorded power supply sessions")
+    parser.add_argument("log", nargs="?", help="CSV log to open")
+    parser.add_argument("--index-only", action="store_true", help="build or update the index and exit")
+    parser.add_argument("--rebuild", action="store_true", help="ignore any saved index")
+    args = parser.parse_args(argv)
+
+    if args.index_only:
+        if not args.log:
+            parser.error("--index-only needs a log file")
+        start = time.perf_counter()
+        index = SessionIndex.open(args.log, rebuild=args.rebuild)
+        print(f"{int(index.rows.sum())} rows in {len(index.rows)} blocks, "
+              f"indexed in {time.perf_counter() - start:.2f} s -> {index.index_path}")
+        return
+
+    app = QApplication(sys.argv)
+    if args.rebuild and args.log:
+        SessionIndex.open(args.log, rebuild=True)
+    browser = SessionBrowser(args.log)
+    browser.show()
+    sys.exit(app.exec_())
+
+
+if __name__ == "__main__":
+    main()
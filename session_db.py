@@ -0,0 +1,311 @@
+"""SQLite session database.
+
+Optional backend (KEYSIGHT_SESSION_DB=<file>) holding, across runs:
+
+  sessions         one row per connection: address, IDN, clock anchor, metadata
+  channel_configs  every setpoint or name change, as (channel, setting, value)
+  events           protection trips, output switching, errors
+  samples          every logged reading, indexed on (channel, t)
+
+The database runs in WAL mode so readers never block the writer.  All
+writes go through a queue to one writer thread, which commits them in
+batches of up to BATCH_SIZE rows or BATCH_SECONDS, so the acquisition loop
+never waits on disk.  Session ids are assigned by SQLite when the writer
+inserts the session row, so any number of panels and processes can share
+one database file.  A batch rejected because of a row's values is retried
+row by row, so only the offending rows are lost; losses are reported
+through on_error.
+
+    python session_db.py sessions.db sessions
+    python session_db.py sessions.db stats --channel 1 --start 2026-10-19T14:00
+    python session_db.py sessions.db sql "SELECT channel, avg(voltage) FROM samples GROUP BY channel"
+"""
+import argparse
+import datetime
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+from log_sinks import LogSink
+
+BATCH_SIZE = 5000
+BATCH_SECONDS = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    ended REAL,
+    address TEXT,
+    idn TEXT,
+    clock_offset REAL,
+    metadata TEXT
+);
+CREATE TABLE IF NOT EXISTS channel_configs (
+    session_id INTEGER NOT NULL REFERENCES sessions(id),
+    t REAL NOT NULL,
+    channel INTEGER NOT NULL,
+    setting TEXT NOT NULL,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS events (
+    session_id INTEGER REFERENCES sessions(id),
+    t REAL NOT NULL,
+    channel INTEGER,
+    kind TEXT NOT NULL,
+    detail TEXT
+);
+CREATE TABLE IF NOT EXISTS samples (
+    session_id INTEGER REFERENCES sessions(id),
+    channel INTEGER NOT NULL,
+    t REAL NOT NULL,
+    voltage REAL,
+    current REAL,
+    latency REAL
+);
+CREATE INDEX IF NOT EXISTS samples_channel_t ON samples (channel, t);
+CREATE INDEX IF NOT EXISTS events_t ON events (t);
+CREATE INDEX IF NOT EXISTS channel_configs_channel_t ON channel_configs (channel, t);
+"""
+
+_INSERT = {
+    "samples": "INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?)",
+    "events": "INSERT INTO events VALUES (?, ?, ?, ?, ?)",
+    "channel_configs": "INSERT INTO channel_configs VALUES (?, ?, ?, ?, ?)",
+    "session_start": "INSERT INTO sessions (started, address, idn, clock_offset, metadata) VALUES (?, ?, ?, ?, ?)",
+    "session_end": "UPDATE sessions SET ended = ? WHERE id = ?",
+}
+# Statements applied in this order within a batch, so sessions exist before their rows
+_ORDER = ("session_start", "channel_configs", "events", "samples", "session_end")
+_SESSION_COLUMN = {"channel_configs": 0, "events": 0, "samples": 0, "session_end": 1}
+# Errors caused by the values of a row rather than by the database itself
+_ROW_ERRORS = (sqlite3.IntegrityError, sqlite3.InterfaceError, sqlite3.ProgrammingError)
+
+
+class SessionKey:
+    """Stands in for a session's id in queued rows until the writer has inserted the session."""
+
+    __slots__ = ("id",)
+
+    def __init__(self):
+        self.id = None
+
+
+def _connect(path):
+    connection = sqlite3.connect(path, timeout=10.0, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")  # Durable at checkpoints; safe against corruption in WAL mode
+    return connection
+
+
+class SessionDatabase(LogSink):
+    def __init__(self, path, clock=None, on_error=None):
+        self.path = path
+        self.clock = clock  # SampleClock for event times; wall clock otherwise
+        self.on_error = on_error  # Called on the writer thread as on_error(error, rows lost)
+        self.session = None  # SessionKey of the open session
+        self.queue = queue.SimpleQueue()
+        self.written = 0
+        self.lost = 0
+        self.error = None
+
+        connection = _connect(path)
+        connection.executescript(SCHEMA)
+        connection.close()
+
+        self.writer = threading.Thread(target=self._run, name="session-db-writer", daemon=True)
+        self.writer.start()
+
+    @property
+    def session_id(self):
+        """Id of the open session, once the writer has inserted it."""
+        return self.session.id if self.session is not None else None
+
+    def _now(self):
+        return self.clock.now() if self.clock is not None else time.time()
+
+    # Writer side
+
+    def _run(self):
+        connection = _connect(self.path)
+        running = True
+        while running:
+            batch = {name: [] for name in _ORDER}
+            waiters = []
+            item = self.queue.get()
+            deadline = time.monotonic() + BATCH_SECONDS
+            count = 0
+            while True:
+                if item is None:
+                    running = False
+                    break
+                if item[0] == "flush":
+                    waiters.append(item[1])
+                    break
+                batch[item[0]].append(item[1])
+                count += 1
+                if count >= BATCH_SIZE:
+                    break
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            ids = {}
+            errors = []
+            try:
+                with connection:  # One transaction per batch
+                    self._write_batch(connection, batch, ids)
+            except _ROW_ERRORS:
+                ids, errors = self._write_rows(connection, batch)
+            except sqlite3.Error as e:
+                ids, errors = {}, [e] * count
+            # Ids are handed out only once committed; a rolled back session row keeps its key unset
+            for key, session_id in ids.items():
+                key.id = session_id
+            self.written += count - len(errors)
+            if errors:
+                # Acquisition carries on; the panel shows the error
+                self.error = errors[0]
+                self.lost += len(errors)
+                if self.on_error is not None:
+                    self.on_error(errors[0], len(errors))
+            for waiter in waiters:
+                waiter.set()
+        connection.close()
+
+    @staticmethod
+    def _write_batch(connection, batch, ids):
+        """Insert `batch`, adding the id of every session it starts to `ids` ({SessionKey: id})."""
+        for key, *row in batch["session_start"]:
+            ids[key] = connection.execute(_INSERT["session_start"], row).lastrowid
+        for name in _ORDER[1:]:
+            rows = batch[name]
+            if rows:
+                column = _SESSION_COLUMN[name]
+                # Swap each SessionKey for its id; rows are tuples, so rebuild them
+                connection.executemany(_INSERT[name], (
+                    row[:column] + (ids.get(row[column], row[column].id),) + row[column + 1:]
+                    if row[column] is not None else row
+                    for row in rows))
+
+    def _write_rows(self, connection, batch):
+        """Write a rejected batch one row per transaction: ({SessionKey: id} committed, errors of lost rows)."""
+        ids = {}
+        errors = []
+        for name in _ORDER:
+            for row in batch[name]:
+                single = {other: [] for other in _ORDER}
+                single[name].append(row)
+                written = dict(ids)
+                try:
+                    with connection:
+                        self._write_batch(connection, single, written)
+                except sqlite3.Error as e:
+                    errors.append(e)
+                else:
+                    ids = written
+        return ids, errors
+
+    # Producer side: every call only enqueues
+
+    def start_session(self, address=None, idn=None, metadata=None):
+        self.session = SessionKey()
+        offset = self.clock.offset if self.clock is not None else None
+        self.queue.put(("session_start", (self.session, self._now(), address, idn, offset,
+                                          json.dumps(metadata or {}))))
+        return self.session
+
+    def end_session(self):
+        if self.session is not None:
+            self.queue.put(("session_end", (self._now(), self.session)))
+            self.session = None
+
+    def log_event(self, kind, channel=None, detail=None):
+        self.queue.put(("events", (self.session, self._now(), channel, kind, detail)))
+
+    def log_channel_config(self, channel, setting, value):
+        if self.session is not None:
+            self.queue.put(("channel_configs", (self.session, self._now(), channel, setting, str(value))))
+
+    def write(self, channel, timestamp, voltage, current, latency=None):
+        self.queue.put(("samples", (self.session, channel, timestamp, voltage, current, latency)))
+
+    def mark_gap(self, start, end, reason):
+        self.queue.put(("events", (self.session, start, None, "gap", f"{end - start:.3f} s until {end:.6f}: {reason}")))
+
+    def flush(self, timeout=5.0):
+        """Wait until everything queued so far is committed."""
+        done = threading.Event()
+        self.queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self):
+        self.end_session()
+        self.queue.put(None)
+        self.writer.join(timeout=10.0)
+
+    # Queries use their own connection; WAL lets them run while the writer commits
+
+    def connect_reader(self):
+        return _connect(self.path)
+
+
+def channel_stats(connection, channel, t0=None, t1=None):
+    return connection.execute(
+        "SELECT count(*), min(t), max(t), min(voltage), max(voltage), avg(voltage), "
+        "min(current), max(current), avg(current), avg(latency) "
+        "FROM samples WHERE channel = ? AND t BETWEEN ? AND ?",
+        (channel, float("-inf") if t0 is None else t0, float("inf") if t1 is None else t1)).fetchone()
+
+
+def _parse_time(text):
+    return datetime.datetime.fromisoformat(text).timestamp() if text else None
+
+
+def _print_rows(cursor):
+    print("\t".join(column[0] for column in cursor.description))
+    for row in cursor:
+        print("\t".join("" if value is None else str(value) for value in row))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the power supply session database")
+    parser.add_argument("database")
+    parser.add_argument("command", choices=("sessions", "events", "stats", "sql"))
+    parser.add_argument("query", nargs="?", help="SQL for the sql command")
+    parser.add_argument("--channel", type=int)
+    parser.add_argument("--start", help="ISO time, e.g. 2026-10-19T14:00")
+    parser.add_argument("--end", help="ISO time")
+    args = parser.parse_args(argv)
+
+    connection = _connect(args.database)
+    t0 = _parse_time(args.start)
+    t1 = _parse_time(args.end)
+    if args.command == "sessions":
+        _print_rows(connection.execute(
+            "SELECT s.id, datetime(s.started, 'unixepoch', 'localtime') AS started, "
+            "datetime(s.ended, 'unixepoch', 'localtime') AS ended, s.address, s.idn, "
+            "(SELECT count(*) FROM samples WHERE session_id = s.id) AS samples FROM sessions s ORDER BY s.id"))
+    elif args.command == "events":
+        _print_rows(connection.execute(
+            "SELECT session_id, datetime(t, 'unixepoch', 'localtime') AS time, channel, kind, detail FROM events "
+            "WHERE t BETWEEN ? AND ? AND (? IS NULL OR channel = ?) ORDER BY t",
+            (float("-inf") if t0 is None else t0, float("inf") if t1 is None else t1, args.channel, args.channel)))
+    elif args.command == "stats":
+        channels = [args.channel] if args.channel else [row[0] for row in
+                                                        connection.execute("SELECT DISTINCT channel FROM samples")]
+        names = ("samples", "first", "last", "v_min", "v_max", "v_avg", "i_min", "i_max", "i_avg", "latency_avg")
+        for channel in channels:
+            stats = channel_stats(connection, channel, t0, t1)
+            print(f"Channel {channel}: " + ", ".join(f"{name}={value}" for name, value in zip(names, stats)))
+    else:
+        if not args.query:
+            parser.error("sql needs a query")
+        _print_rows(connection.execute(args.query))
+    connection.close()
+
+
+if __name__ == "__main__":
+    main()
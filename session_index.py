@@ -0,0 +1,272 @@
+"""Persistent block index over CSV session logs.
+
+SessionIndex scans a log once in large binary reads, cuts it into blocks of
+BLOCK_ROWS rows and keeps, per block, the byte offset, time bounds and the
+per-channel voltage/current envelope.  The index is saved next to the log
+(<log>.idx.npz) and extended incrementally when the log has grown, so
+reopening a week-long log only reads the blocks that are actually shown.
+Blocks are parsed with vectorized NumPy conversion rather than per row.
+
+Only NumPy is needed, so the log archive and the headless acquisition
+process can use it without loading Qt; session_browser draws on top of it.
+"""
+import os
+import time
+
+import numpy as np
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".idx.npz"
+BLOCK_ROWS = 4096
+READ_SIZE = 16 * 1024 * 1024
+CHANNELS = 4
+CHUNK_BLOCKS = 64  # Blocks parsed per step when streaming a long range
+COLUMNS = ("channel", "time", "voltage", "current", "latency")
+# Row layouts, told apart by the header
+LAYOUT_EPOCH = "epoch"  # Channel,Time,Voltage,Current,Latency_ms with float epoch seconds
+LAYOUT_LEGACY = "legacy"  # channel,YYYY-mm-dd HH:MM:SS,voltage,current in local time
+LAYOUT_LEGACY_SINGLE = "legacy_single"  # YYYY-mm-dd HH:MM:SS,voltage,current; read as channel 1
+
+
+class LogFormatError(ValueError):
+    pass
+
+
+def _read_header(path):
+    """Return (data offset, layout) for a log: '#' comment lines and the column header are skipped."""
+    with open(path, "rb") as file:
+        offset = 0
+        for line in file:
+            offset += len(line)
+            if line.startswith(b"#"):
+                continue
+            if line.startswith(b"Channel,"):
+                # Logs written before timestamps became float epoch seconds have no latency column
+                return offset, LAYOUT_EPOCH if b"Latency" in line else LAYOUT_LEGACY
+            if line.startswith(b"Time,"):
+                # The original panel wrote this header but still started every row with the channel
+                first = next((row for row in file if row.strip() and not row.startswith(b"#")), b"")
+                return offset, LAYOUT_LEGACY_SINGLE if first.count(b",") == 2 else LAYOUT_LEGACY
+            raise LogFormatError(f"{path} is not a power supply log")
+    raise LogFormatError(f"{path} is empty")
+
+
+def parse_rows(data, layout=LAYOUT_EPOCH):
+    """Parse complete CSV lines into an (n, 5) float array: channel, time, voltage, current, latency.
+
+    Raises LogFormatError when a line does not fit the layout.
+    """
+    try:
+        return _parse_rows(data.replace(b"\r", b""), layout)
+    except LogFormatError:
+        raise
+    except ValueError as e:
+        raise LogFormatError(f"Malformed rows in log: {e}") from None
+
+
+def _parse_rows(data, layout):
+    if not data.strip():
+        return np.empty((0, len(COLUMNS)))
+    if layout != LAYOUT_EPOCH:
+        width = 3 if layout == LAYOUT_LEGACY_SINGLE else 4
+        fields = np.array(data.rstrip(b"\n").replace(b"\n", b",").split(b",")).reshape(-1, width)
+        stamps = (np.char.replace(fields[:, width - 3].astype("U19"), " ", "T")
+                  .astype("datetime64[s]").astype(np.float64))
+        # datetime64 reads the fields as UTC; shift to local time (one offset per block, DST changes are ignored)
+        stamps += time.mktime(time.gmtime(stamps[0])) - stamps[0]
+        rows = np.empty((len(fields), len(COLUMNS)))
+        rows[:, 0] = fields[:, 0].astype(np.float64) if width == 4 else 1
+        rows[:, 1] = stamps
+        rows[:, 2] = fields[:, width - 2].astype(np.float64)
+        rows[:, 3] = fields[:, width - 1].astype(np.float64)
+        rows[:, 4] = np.nan
+        return rows
+    if b"#" in data:
+        # Gap marks from reconnects are '#' lines between the rows
+        data = b"".join(line for line in data.splitlines(True) if not line.startswith(b"#"))
+    # Rows logged without a latency end in an empty field
+    values = np.fromstring(data.replace(b",\n", b",nan\n").replace(b"\n", b","), sep=",")
+    if values.size % len(COLUMNS):
+        raise LogFormatError("Malformed rows in log")
+    return values.reshape(-1, len(COLUMNS))
+
+
+class SessionIndex:
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.data_offset, self.layout = _read_header(path)
+        self.offsets = np.array([self.data_offset], dtype=np.int64)  # Block starts plus the end of indexed data
+        self.rows = np.empty(0, dtype=np.int64)
+        self.t_min = np.empty(0)
+        self.t_max = np.empty(0)
+        # Per block and channel: row count, then min/max voltage and min/max current
+        self.counts = np.empty((0, CHANNELS), dtype=np.int64)
+        self.envelope = np.empty((0, CHANNELS, 4))
+
+    @classmethod
+    def open(cls, path, rebuild=False):
+        """Load the saved index, extend it if the log has grown, or build it from scratch."""
+        index = cls(path)
+        if not rebuild:
+            index._load()
+        if index.update():
+            index.save()
+        return index
+
+    def _load(self):
+        try:
+            saved = np.load(self.index_path)
+        except (OSError, ValueError):
+            return
+        with saved:
+            with open(self.path, "rb") as file:
+                header = file.read(self.data_offset)
+            if (int(saved["version"]) != INDEX_VERSION or bytes(saved["header"]) != header
+                    or int(saved["offsets"][-1]) > os.path.getsize(self.path)):
+                return  # Stale or for a different log
+            self.offsets = saved["offsets"]
+            self.rows = saved["rows"]
+            self.t_min = saved["t_min"]
+            self.t_max = saved["t_max"]
+            self.counts = saved["counts"]
+            self.envelope = saved["envelope"]
+
+    def save(self):
+        with open(self.path, "rb") as file:
+            header = np.frombuffer(file.read(self.data_offset), dtype=np.uint8)
+        with open(self.index_path, "wb") as file:
+            np.savez(file, version=INDEX_VERSION, header=header, offsets=self.offsets, rows=self.rows,
+                     t_min=self.t_min, t_max=self.t_max, counts=self.counts, envelope=self.envelope)
+
+    @property
+    def end(self):
+        return int(self.offsets[-1])
+
+    def update(self):
+        """Index rows appended since the last scan; returns True when anything changed."""
+        if os.path.getsize(self.path) <= self.end:
+            return False
+        if len(self.rows) and self.rows[-1] < BLOCK_ROWS:
+            self._drop_last_block()  # A partial tail block is rescanned with the new rows
+        blocks = []
+        start = self.end
+        with open(self.path, "rb") as file:
+            file.seek(start)
+            pending = b""
+            while True:
+                chunk = file.read(READ_SIZE)
+                if not chunk:
+                    break
+                data = pending + chunk
+                line_ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10) + 1
+                used = 0
+                for cut in line_ends[BLOCK_ROWS - 1::BLOCK_ROWS]:
+                    blocks.append(self._summarize(start, data[used:cut]))
+                    start += cut - used
+                    used = cut
+                pending = data[used:]
+            # The last line may still be being written; only complete lines are indexed
+            complete = pending[:pending.rfind(b"\n") + 1]
+            if complete:
+                blocks.append(self._summarize(start, complete))
+                start += len(complete)
+        if not blocks:
+            return False
+        offsets, rows, t_min, t_max, counts, envelope = zip(*blocks)
+        self.offsets = np.concatenate((self.offsets[:-1], offsets, [start]))
+        self.rows = np.concatenate((self.rows, np.array(rows, dtype=np.int64)))
+        self.t_min = np.concatenate((self.t_min, t_min))
+        self.t_max = np.concatenate((self.t_max, t_max))
+        self.counts = np.concatenate((self.counts, np.array(counts)))
+        self.envelope = np.concatenate((self.envelope, np.array(envelope)))
+        return True
+
+    def _drop_last_block(self):
+        self.offsets = self.offsets[:-1]
+        self.rows = self.rows[:-1]
+        self.t_min = self.t_min[:-1]
+        self.t_max = self.t_max[:-1]
+        self.counts = self.counts[:-1]
+        self.envelope = self.envelope[:-1]
+
+    def _summarize(self, offset, data):
+        rows = parse_rows(data, self.layout)
+        channels = rows[:, 0].astype(np.int64)
+        counts = np.zeros(CHANNELS, dtype=np.int64)
+        envelope = np.full((CHANNELS, 4), np.nan)
+        for channel in range(1, CHANNELS + 1):
+            selected = rows[channels == channel]
+            counts[channel - 1] = len(selected)
+            if len(selected):
+                envelope[channel - 1] = (selected[:, 2].min(), selected[:, 2].max(),
+                                         selected[:, 3].min(), selected[:, 3].max())
+        if not len(rows):  # Only a gap mark so far
+            return offset, 0, np.nan, np.nan, counts, envelope
+        return offset, len(rows), rows[:, 1].min(), rows[:, 1].max(), counts, envelope
+
+    def time_range(self):
+        if not len(self.rows):
+            return None
+        return float(np.nanmin(self.t_min)), float(np.nanmax(self.t_max))
+
+    def blocks_between(self, t0, t1):
+        return np.flatnonzero((self.t_max >= t0) & (self.t_min <= t1))
+
+    def rows_between(self, t0, t1, channel=None):
+        blocks = self.blocks_between(t0, t1)
+        if channel is None:
+            return int(self.rows[blocks].sum())
+        return int(self.counts[blocks, channel - 1].sum())
+
+    def _read_blocks(self, first, last, t0, t1, channels):
+        start = int(self.offsets[first])
+        end = int(self.offsets[last + 1])
+        with open(self.path, "rb") as file:
+            file.seek(start)
+            rows = parse_rows(file.read(end - start), self.layout)
+        keep = (rows[:, 1] >= t0) & (rows[:, 1] <= t1)
+        if channels is not None:
+            keep &= np.isin(rows[:, 0], list(channels))
+        return rows[keep]
+
+    def read(self, t0, t1, channels=None):
+        """Parse only the blocks overlapping [t0, t1] and return the matching rows."""
+        blocks = self.blocks_between(t0, t1)
+        if not len(blocks):
+            return np.empty((0, len(COLUMNS)))
+        return self._read_blocks(blocks[0], blocks[-1], t0, t1, channels)
+
+    def iter_rows(self, t0=-np.inf, t1=np.inf, channels=None):
+        """Like read(), but yields the rows CHUNK_BLOCKS blocks at a time so memory stays bounded."""
+        blocks = self.blocks_between(t0, t1)
+        for first in range(0, len(blocks), CHUNK_BLOCKS):
+            group = blocks[first:first + CHUNK_BLOCKS]
+            rows = self._read_blocks(group[0], group[-1], t0, t1, channels)
+            if len(rows):
+                yield rows
+
+    def overview(self, channel, t0, t1):
+        """Per-block (time, min V, max V, min I, max I) envelope for one channel."""
+        blocks = self.blocks_between(t0, t1)
+        blocks = blocks[self.counts[blocks, channel - 1] > 0]
+        envelope = self.envelope[blocks, channel - 1]
+        return self.t_min[blocks], self.t_max[blocks], envelope
+
+    def export(self, path, t0, t1, channels=None):
+        """Write the rows in [t0, t1] to a CSV file, streamed like iter_rows().  Returns the row count."""
+        count = 0
+        # Written under a temporary name so a failed export never leaves a truncated file behind
+        temp_path = path + ".tmp"
+        try:
+            with open(temp_path, "w", newline="") as file:
+                file.write(f"# exported_from: {os.path.abspath(self.path)}\n")
+                file.write("Channel,Time,Voltage,Current,Latency_ms\n")
+                for rows in self.iter_rows(t0, t1, channels):
+                    np.savetxt(file, rows, fmt=["%d", "%.6f", "%.10g", "%.10g", "%.3f"], delimiter=",")
+                    count += len(rows)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return count
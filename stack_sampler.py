@@ -0,0 +1,76 @@
+"""Sampling profiler for every thread of a process.
+
+StackSampler walks sys._current_frames() from a background thread and
+counts each distinct stack, so it needs no cooperation from the code being
+sampled.  It has no GUI dependencies, which lets the headless acquisition
+process profile itself as well as the panel.
+"""
+import collections
+import os
+import sys
+import threading
+import time
+
+SAMPLE_INTERVAL = 0.005  # Seconds between stack samples
+SUMMARY_LINES = 25
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples the Python stacks of every thread from a background thread."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.counts = collections.Counter()  # (thread name, outermost frame, ..., innermost frame) -> samples
+        self.samples = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.counts[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def run_for(self, seconds):
+        self.start()
+        time.sleep(seconds)
+        self.stop()
+        return self
+
+    def folded(self):
+        """One 'thread;outer;...;inner count' line per distinct stack."""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.counts.most_common())
+
+    def summary(self, limit=SUMMARY_LINES):
+        """Functions by the share of samples they were running in (innermost frame), per thread."""
+        leaves = collections.Counter()
+        for stack, count in self.counts.items():
+            leaves[(stack[0], stack[-1])] += count
+        lines = [f"{self.samples} samples every {self.interval * 1000:g} ms", f"{'%':>6}  {'thread':<20} function"]
+        for (thread, function), count in leaves.most_common(limit):
+            lines.append(f"{count / max(self.samples, 1) * 100:>6.1f}  {thread[:20]:<20} {function}")
+        return "\n".join(lines)
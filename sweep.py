@@ -0,0 +1,308 @@
+"""I-V characterization sweeps.
+
+A sweep steps the output voltage of one or more channels from `start` to
+`stop` and records voltage and current at every step.  Instead of a
+set/measure round trip per point, each chunk of up to MAX_LIST_STEPS steps
+is loaded into the mainframe as a voltage list and run by the instrument
+itself: one program message configures the list and the digitizer, arms
+both on a bus trigger and reads back STATus:OPERation:CONDition, *TRG is
+sent once every channel reports WTG_meas and WTG_tran, and a last message
+fetches the digitized voltage and current arrays together with the error
+queue.  The host is only involved three times per chunk, so a sweep takes
+roughly steps * (settle + aperture) plus a few round trips, however slow
+the link.
+
+Every step dwells for settle + aperture seconds; the samples taken during
+the last `aperture` seconds of a step are averaged into its point.  All
+channels of a sweep run the same list from the same trigger, so multi-
+channel sweeps cost no more time than single-channel ones.  Output state,
+voltage and current limit are restored afterwards.  The sweep window lives
+in sweep_window so this module and its command line stay free of Qt.
+
+    python sweep.py --address SIM --channels 1 2 --start 0 --stop 5 --steps 200 --output iv.csv
+"""
+import argparse
+import collections
+import csv
+import logging
+import math
+import os
+import sys
+import time
+
+import numpy as np
+import pyvisa
+
+from acquisition import open_instrument
+from sample_clock import SampleClock
+from scpi import format_channel_list
+
+CHANNELS = 4
+MAX_LIST_STEPS = 512  # Steps in one LIST:VOLT program
+MAX_POINTS = 4096  # Digitizer points per channel fetched for one chunk
+SAMPLE_INTERVAL = 20.48e-6  # Digitizer interval resolution (SENS:SWE:TINT)
+DEFAULT_APERTURE = 0.005  # Seconds averaged at the end of each step
+FETCH_MARGIN = 5.0  # Seconds added to the VISA timeout while waiting for a chunk's data
+WAITING_FOR_TRIGGER = 8 | 16  # STAT:OPER:COND bits WTG_meas and WTG_tran
+ARM_TIMEOUT = 2.0  # Seconds INIT may take to reach waiting-for-trigger on every channel
+ARM_POLL_INTERVAL = 0.005
+
+log = logging.getLogger(__name__)
+
+SweepResult = collections.namedtuple("SweepResult", "channel setpoint time voltage current")
+CSV_COLUMNS = ["Channel", "Setpoint", "Time", "Voltage", "Current"]
+
+
+class SweepError(Exception):
+    pass
+
+
+class SweepDefinition:
+    def __init__(self, start, stop, steps, settle, channels, aperture=DEFAULT_APERTURE, current_limit=None):
+        self.start = float(start)
+        self.stop = float(stop)
+        self.steps = int(steps)
+        self.settle = float(settle)
+        self.channels = sorted(set(channels))
+        self.aperture = float(aperture)
+        self.current_limit = None if current_limit is None else float(current_limit)
+        if self.steps < 2:
+            raise SweepError("A sweep needs at least 2 steps")
+        if self.settle < 0 or self.aperture <= 0:
+            raise SweepError("Settle time must be >= 0 and the aperture > 0")
+        if not self.channels:
+            raise SweepError("No channels selected")
+        if self.current_limit is not None and self.current_limit <= 0:
+            raise SweepError("Current limit must be positive")
+
+    @property
+    def dwell(self):
+        return self.settle + self.aperture
+
+    @property
+    def duration(self):
+        return self.steps * self.dwell
+
+    def setpoints(self):
+        return np.linspace(self.start, self.stop, self.steps)
+
+    def describe(self):
+        return (f"{self.start:g} V to {self.stop:g} V in {self.steps} steps, {self.dwell * 1000:g} ms each, "
+                f"channels {', '.join(str(channel) for channel in self.channels)}")
+
+
+def digitizer_setup(steps, dwell):
+    """(sample interval, points) that cover `steps` steps of `dwell` seconds within MAX_POINTS."""
+    duration = steps * dwell
+    interval = SAMPLE_INTERVAL * max(1, math.ceil(duration / (MAX_POINTS - 1) / SAMPLE_INTERVAL))
+    return interval, min(MAX_POINTS, math.ceil(duration / interval) + 1)
+
+
+def reduce_steps(samples, interval, steps, settle, dwell):
+    """Average each step's samples inside its aperture window; shape (..., points) -> (..., steps).
+
+    A step whose window holds no sample (aperture shorter than the sample
+    interval) takes the last sample before the step ends.
+    """
+    times = np.arange(samples.shape[-1]) * interval
+    step = np.floor(times / dwell).astype(np.int64)
+    selected = (step < steps) & (times - step * dwell >= settle)
+    counts = np.bincount(step[selected], minlength=steps)[:steps]
+    last = np.clip(np.floor(np.arange(1, steps + 1) * dwell / interval - 1e-9).astype(np.int64),
+                   0, samples.shape[-1] - 1)
+    reduced = np.empty(samples.shape[:-1] + (steps,))
+    for index in np.ndindex(samples.shape[:-1]):
+        sums = np.bincount(step[selected], weights=samples[index][selected], minlength=steps)[:steps]
+        reduced[index] = np.where(counts > 0, sums / np.maximum(counts, 1), samples[index][last])
+    return reduced
+
+
+def _parse_values(text, count, name):
+    values = np.array(text.split(","), dtype=float) if text.strip() else np.empty(0)
+    if len(values) != count:
+        raise SweepError(f"Expected {count} {name} values, got {len(values)}")
+    return values
+
+
+class SweepEngine:
+    def __init__(self, instrument, clock=None):
+        self.instrument = instrument
+        self.clock = clock or SampleClock()
+        self.round_trips = 0  # Messages sent by the last run()
+        self.unrestored = None  # State the last run() failed to put back, for restore() once the link is up
+
+    def run(self, definition, on_chunk=None, stop_event=None):
+        """Run `definition` and return {channel: SweepResult}.
+
+        on_chunk(results) gets the SweepResults of each chunk as soon as it
+        has been fetched.  Setting stop_event ends the sweep after the
+        current chunk; the points measured so far are returned.  If the
+        sweep fails and the state cannot be restored either, the outputs may
+        be left at a sweep voltage; the state is then kept in `unrestored`.
+        """
+        self.round_trips = 0
+        self.unrestored = None
+        channels = definition.channels
+        channel_list = format_channel_list(channels)
+        restore = self._read_state(channel_list, channels)
+        setpoints = definition.setpoints()
+        chunks = []
+        try:
+            for first in range(0, definition.steps, MAX_LIST_STEPS):
+                if stop_event is not None and stop_event.is_set():
+                    break
+                results = self._run_chunk(definition, channel_list, setpoints[first:first + MAX_LIST_STEPS],
+                                          first == 0)
+                chunks.append(results)
+                if on_chunk is not None:
+                    on_chunk(results)
+        except BaseException:
+            # The original error is the one worth reporting, so cleanup failures are only logged
+            try:
+                self.instrument.write(f"ABOR:TRAN {channel_list};:ABOR:ACQ {channel_list}")
+            except Exception:
+                pass
+            try:
+                self.restore(restore)
+            except Exception:
+                log.exception("Could not restore channels %s after the sweep failed", channel_list)
+                self.unrestored = restore
+            raise
+        self.restore(restore)
+        return {channel: SweepResult(channel, *(np.concatenate([chunk[n][field] for chunk in chunks])
+                                                if chunks else np.empty(0) for field in range(1, 5)))
+                for n, channel in enumerate(channels)}
+
+    def _write(self, message):
+        self.round_trips += 1
+        self.instrument.write(message)
+
+    def _query(self, message):
+        self.round_trips += 1
+        return self.instrument.query(message)
+
+    def _read_state(self, channel_list, channels):
+        response = self._query(f"VOLT? {channel_list};:CURR? {channel_list};:OUTP? {channel_list}")
+        groups = response.strip().split(";")
+        if len(groups) != 3:
+            raise SweepError(f"Unexpected readback: {response.strip()!r}")
+        voltages, currents, outputs = (_parse_values(group, len(channels), "readback") for group in groups)
+        return {channel: (voltages[n], currents[n], outputs[n] != 0) for n, channel in enumerate(channels)}
+
+    def restore(self, state):
+        """Put back the output state, voltage and current limit read before a sweep."""
+        parts = []
+        for channel, (voltage, current, output) in state.items():
+            channel_list = format_channel_list([channel])
+            parts += [f"VOLT:MODE FIX,{channel_list}", f"CURR {current:g},{channel_list}",
+                      f"VOLT {voltage:g},{channel_list}", f"OUTP {'ON' if output else 'OFF'},{channel_list}"]
+        self._write(";:".join(parts))
+
+    def _wait_armed(self, channel_list, count, response):
+        """Poll STAT:OPER:COND? until every channel waits for both triggers; `response` is the first reading."""
+        deadline = time.perf_counter() + ARM_TIMEOUT
+        while True:
+            conditions = _parse_values(response, count, "status").astype(np.int64)
+            if np.all(conditions & WAITING_FOR_TRIGGER == WAITING_FOR_TRIGGER):
+                return
+            if time.perf_counter() > deadline:
+                error = self._query("SYST:ERR?").strip()
+                raise SweepError(f"Channels {channel_list} not waiting for a trigger after INIT "
+                                 f"(STAT:OPER:COND {response.strip()}, last error {error})")
+            time.sleep(ARM_POLL_INTERVAL)
+            response = self._query(f"STAT:OPER:COND? {channel_list}")
+
+    def _run_chunk(self, definition, channel_list, setpoints, first):
+        steps = len(setpoints)
+        interval, points = digitizer_setup(steps, definition.dwell)
+        parts = [f"ABOR:TRAN {channel_list}", f"ABOR:ACQ {channel_list}"]
+        if first:
+            parts.insert(0, "*CLS")
+            if definition.current_limit is not None:
+                parts.append(f"CURR {definition.current_limit:g},{channel_list}")
+        parts += [
+            f"VOLT:MODE LIST,{channel_list}",
+            f"LIST:VOLT {','.join(f'{value:.6g}' for value in setpoints)},{channel_list}",
+            f"LIST:DWEL {definition.dwell:g},{channel_list}",
+            f"LIST:COUN 1,{channel_list}",
+            f"LIST:TERM:LAST ON,{channel_list}",  # Hold the last step until the next chunk starts
+            f"TRIG:TRAN:SOUR BUS,{channel_list}",
+            f"SENS:FUNC:VOLT ON,{channel_list}",
+            f"SENS:FUNC:CURR ON,{channel_list}",
+            f"SENS:SWE:TINT {interval:.6g},{channel_list}",
+            f"SENS:SWE:POIN {points},{channel_list}",
+            f"TRIG:ACQ:SOUR BUS,{channel_list}",
+        ]
+        if first:
+            parts.append(f"OUTP ON,{channel_list}")
+        # One message configures and arms the list and the digitizer and reads back whether both are armed
+        parts += [f"INIT:ACQ {channel_list}", f"INIT:TRAN {channel_list}", f"STAT:OPER:COND? {channel_list}"]
+        self._wait_armed(channel_list, len(definition.channels), self._query(";:".join(parts)))
+        before = time.perf_counter()
+        self._write("*TRG")
+        triggered = self.clock.to_wall((before + time.perf_counter()) / 2)
+
+        # FETCh blocks until the digitizer is done, so the timeout must cover the whole chunk
+        timeout = self.instrument.timeout
+        self.instrument.timeout = max(timeout or 0, (steps * definition.dwell + FETCH_MARGIN) * 1000)
+        try:
+            response = self._query(f"FETC:ARR:VOLT? {channel_list};:FETC:ARR:CURR? {channel_list};:SYST:ERR?")
+        finally:
+            self.instrument.timeout = timeout
+        groups = response.strip().split(";", 2)
+        if len(groups) != 3:
+            raise SweepError(f"No sweep data returned: {response.strip()!r}")
+        error = groups[2].strip()
+        if not error.startswith(("+0,", "0,")):
+            raise SweepError(f"Instrument error during sweep: {error}")
+        count = len(definition.channels)
+        samples = np.stack([_parse_values(group, count * points, "sample").reshape(count, points)
+                            for group in groups[:2]], axis=1)  # (channel, quantity, point)
+        reduced = reduce_steps(samples, interval, steps, definition.settle, definition.dwell)
+        times = triggered + np.arange(steps) * definition.dwell + definition.settle + definition.aperture / 2
+        return [SweepResult(channel, setpoints, times, reduced[n, 0], reduced[n, 1])
+                for n, channel in enumerate(definition.channels)]
+
+
+def write_csv(results, path):
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(CSV_COLUMNS)
+        for channel, result in sorted(results.items()):
+            for row in zip(result.setpoint, result.time, result.voltage, result.current):
+                writer.writerow([channel, f"{row[0]:.6g}", f"{row[1]:.6f}", f"{row[2]:.6g}", f"{row[3]:.6g}"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run an I-V sweep on N67xx channels")
+    parser.add_argument("--address", default="SIM")
+    parser.add_argument("--channels", type=int, nargs="+", default=[1])
+    parser.add_argument("--start", type=float, default=0.0)
+    parser.add_argument("--stop", type=float, default=5.0)
+    parser.add_argument("--steps", type=int, default=101)
+    parser.add_argument("--settle", type=float, default=0.005, help="seconds before each step is measured")
+    parser.add_argument("--aperture", type=float, default=DEFAULT_APERTURE, help="seconds averaged per step")
+    parser.add_argument("--current-limit", type=float)
+    parser.add_argument("--output", default="sweep.csv")
+    args = parser.parse_args(argv)
+
+    try:
+        definition = SweepDefinition(args.start, args.stop, args.steps, args.settle, args.channels,
+                                     aperture=args.aperture, current_limit=args.current_limit)
+    except SweepError as e:
+        sys.exit(str(e))
+    instrument = open_instrument(pyvisa.ResourceManager(os.environ.get("KEYSIGHT_VISA_LIBRARY", "")), args.address)
+    instrument.timeout = 5000
+    engine = SweepEngine(instrument)
+    start = time.perf_counter()
+    try:
+        results = engine.run(definition)
+    finally:
+        instrument.close()
+    write_csv(results, args.output)
+    print(f"{definition.describe()}: {time.perf_counter() - start:.2f} s, "
+          f"{engine.round_trips} messages -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Sweep form and live I-V plot for the panel; the sweeps themselves run in sweep."""
+import threading
+import time
+
+import pyqtgraph as pg
+from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtWidgets import (
+    QCheckBox, QGridLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QVBoxLayout, QWidget
+)
+
+from sweep import CHANNELS, DEFAULT_APERTURE, SweepDefinition, SweepError
+
+
+class SweepWindow(QWidget):
+    """Sweep form and I-V plot.
+
+    `run_sweep(definition, on_chunk, stop_event)` runs on a worker thread and
+    returns {channel: SweepResult}; the panel supplies it so the instrument
+    lock and logging stay in one place.
+    """
+
+    chunk_ready = pyqtSignal(object)
+    sweep_done = pyqtSignal(object, object, object)  # definition, results, error message
+    completed = pyqtSignal(object, object)  # definition, results; for the panel
+
+    def __init__(self, run_sweep, channels=(1,), parent=None):
+        super(SweepWindow, self).__init__(parent)
+        self.run_sweep = run_sweep
+        self.stop_event = threading.Event()
+        self.worker = None
+        self.started = 0.0
+        self.setWindowTitle("I-V Sweep")
+        self.resize(800, 600)
+
+        layout = QVBoxLayout(self)
+        form = QGridLayout()
+        self.fields = {}
+        for column, (name, label, default) in enumerate((
+                ("start", "Start (V)", "0"), ("stop", "Stop (V)", "5"), ("steps", "Steps", "101"),
+                ("settle", "Settle (ms)", "5"), ("aperture", "Aperture (ms)", f"{DEFAULT_APERTURE * 1000:g}"),
+                ("current_limit", "Current limit (A)", ""))):
+            form.addWidget(QLabel(label, self), 0, column)
+            self.fields[name] = QLineEdit(default, self)
+            form.addWidget(self.fields[name], 1, column)
+        layout.addLayout(form)
+
+        controls = QHBoxLayout()
+        self.channel_boxes = {}
+        for channel in range(1, CHANNELS + 1):
+            box = QCheckBox(f"CH{channel}", self)
+            box.setChecked(channel in channels)
+            self.channel_boxes[channel] = box
+            controls.addWidget(box)
+        controls.addStretch()
+        self.status_label = QLabel(self)
+        controls.addWidget(self.status_label)
+        self.run_button = QPushButton("Run", self)
+        self.run_button.clicked.connect(self.start)
+        controls.addWidget(self.run_button)
+        self.stop_button = QPushButton("Stop", self)
+        self.stop_button.setEnabled(False)
+        self.stop_button.clicked.connect(self.stop_event.set)
+        controls.addWidget(self.stop_button)
+        layout.addLayout(controls)
+
+        self.plot = pg.PlotWidget()
+        self.plot.setLabel('bottom', 'Voltage', units='V')
+        self.plot.setLabel('left', 'Current', units='A')
+        self.plot.showGrid(x=True, y=True, alpha=0.3)
+        self.plot.addLegend()
+        layout.addWidget(self.plot)
+        colors = {1: (230, 200, 0), 2: (0, 190, 0), 3: (40, 120, 255), 4: (230, 50, 50)}
+        self.curves = {channel: self.plot.plot(pen=colors[channel], symbol='o', symbolSize=4,
+                                               symbolBrush=colors[channel], name=f"CH{channel}")
+                       for channel in range(1, CHANNELS + 1)}
+        self.points = {}  # channel -> [voltages, currents] plotted so far
+
+        self.chunk_ready.connect(self.add_chunk)
+        self.sweep_done.connect(self.finish)
+
+    def definition(self):
+        text = {name: field.text().strip() for name, field in self.fields.items()}
+        try:
+            return SweepDefinition(
+                text["start"], text["stop"], text["steps"], float(text["settle"]) / 1000,
+                [channel for channel, box in self.channel_boxes.items() if box.isChecked()],
+                aperture=float(text["aperture"]) / 1000,
+                current_limit=float(text["current_limit"]) if text["current_limit"] else None)
+        except ValueError as e:
+            raise SweepError(f"Invalid sweep setting: {e}")
+
+    def start(self):
+        if self.worker is not None:
+            return
+        try:
+            definition = self.definition()
+        except SweepError as e:
+            self.status_label.setText(str(e))
+            return
+        self.points = {channel: [[], []] for channel in definition.channels}
+        for curve in self.curves.values():
+            curve.setData([], [])
+        self.stop_event.clear()
+        self.run_button.setEnabled(False)
+        self.stop_button.setEnabled(True)
+        self.status_label.setText(f"Sweeping, about {definition.duration:.1f} s")
+        self.started = time.perf_counter()
+        self.worker = threading.Thread(target=self._run, args=(definition,), daemon=True)
+        self.worker.start()
+
+    def _run(self, definition):
+        try:
+            results = self.run_sweep(definition, self.chunk_ready.emit, self.stop_event)
+        except Exception as e:  # Anything left uncaught would leave the form disabled
+            self.sweep_done.emit(definition, None, str(e) or type(e).__name__)
+        else:
+            self.sweep_done.emit(definition, results, None)
+
+    def add_chunk(self, results):
+        for result in results:
+            voltages, currents = self.points[result.channel]
+            voltages.extend(result.voltage.tolist())
+            currents.extend(result.current.tolist())
+            self.curves[result.channel].setData(voltages, currents)
+
+    def finish(self, definition, results, error):
+        self.worker = None
+        self.run_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+        elapsed = time.perf_counter() - self.started
+        if error is not None:
+            self.status_label.setText(f"Sweep failed: {error}")
+            return
+        done = min((len(result.setpoint) for result in results.values()), default=0)
+        stopped = " (stopped)" if done < definition.steps else ""
+        self.status_label.setText(f"{done} points in {elapsed:.2f} s{stopped}")
+        self.completed.emit(definition, results)
+
+    def closeEvent(self, event):
+        self.stop_event.set()
+        super(SweepWindow, self).closeEvent(event)
@@ -0,0 +1,46 @@
+import os
+
+import numpy as np
+import pytest
+
+from acquisition import SampleRing
+
+
+@pytest.fixture
+def ring():
+    ring = SampleRing.create(f"keysight_test_{os.getpid()}", capacity=4)
+    yield ring
+    ring.memory.close()
+    ring.memory.unlink()
+
+
+def write(ring, first, count):
+    for n in range(first, first + count):
+        ring.write(1, float(n), n / 10, n / 100)
+
+
+def test_read_returns_new_records_in_order(ring):
+    write(ring, 0, 3)
+    since, rows, lost = ring.read(0)
+    assert (since, lost) == (3, 0)
+    np.testing.assert_array_equal(rows[:, 0], [0.0, 1.0, 2.0])
+    write(ring, 3, 2)
+    since, rows, lost = ring.read(since)
+    assert (since, lost) == (5, 0)
+    np.testing.assert_array_equal(rows[:, 0], [3.0, 4.0])
+
+
+def test_read_after_wraparound_skips_slot_being_written(ring):
+    write(ring, 0, 6)  # Slots now hold records 2 to 5
+    # The writer is filling record 6, which overwrites record 2, and has not published it yet
+    ring.records[6 % ring.capacity] = np.nan
+    since, rows, lost = ring.read(0)
+    assert (since, lost) == (6, 3)
+    np.testing.assert_array_equal(rows[:, 0], [3.0, 4.0, 5.0])
+    assert not np.isnan(rows[:, :4]).any()  # Latency is NaN when not given
+
+
+def test_latest_after_wraparound(ring):
+    write(ring, 0, 10)
+    np.testing.assert_array_equal(ring.latest(2)[:, 0], [8.0, 9.0])
+    np.testing.assert_array_equal(ring.latest(10)[:, 0], [7.0, 8.0, 9.0])
@@ -0,0 +1,109 @@
+import asyncio
+import http.client
+import json
+
+import pytest
+
+from api_server import StreamServer, Subscriber
+
+
+def sample(channel, timestamp, voltage=5.0):
+    return (channel, timestamp, voltage, 0.1, 0.002)
+
+
+def batch(subscriber):
+    return [json.loads(message) for message in asyncio.run(subscriber.next_batch())]
+
+
+def test_channel_filter():
+    subscriber = Subscriber(channels={2})
+    subscriber.offer(sample(1, 0.0))
+    subscriber.offer(sample(2, 0.0))
+    assert [message["channel"] for message in batch(subscriber)] == [2]
+
+
+def test_decimation_per_channel():
+    subscriber = Subscriber(rate=10)
+    for timestamp in (0.0, 0.05, 0.1, 0.15, 0.25):
+        subscriber.offer(sample(1, timestamp))
+    subscriber.offer(sample(2, 0.05))
+    assert [(message["channel"], message["t"]) for message in batch(subscriber)] == [
+        (1, 0.0), (1, 0.1), (1, 0.25), (2, 0.05)]
+
+
+def test_full_queue_drops_oldest_and_reports_once():
+    subscriber = Subscriber(queue_size=3)
+    for n in range(5):
+        subscriber.offer(sample(1, float(n)))
+    messages = batch(subscriber)
+    assert [message["t"] for message in messages[:-1]] == [2.0, 3.0, 4.0]
+    assert messages[-1] == {"dropped": 2}
+    assert subscriber.sent == 3
+
+    subscriber.offer(sample(1, 5.0))
+    assert batch(subscriber) == [{"channel": 1, "t": 5.0, "voltage": 5.0, "current": 0.1, "latency": 0.002}]
+
+
+@pytest.fixture
+def server():
+    commands = []
+
+    def control(command):
+        commands.append(command)
+        return {"applied": command}
+
+    server = StreamServer(port=0, control=control, token="secret").start()
+    server.commands = commands
+    yield server
+    server.close()
+
+
+def post_control(server, headers, body=b'{"channel": 1, "output": "ON"}'):
+    connection = http.client.HTTPConnection("127.0.0.1", server.port, timeout=5.0)
+    try:
+        connection.request("POST", "/control", body, headers)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+JSON = {"Content-Type": "application/json"}
+
+
+def test_control_accepts_token(server):
+    status, body = post_control(server, dict(JSON, Authorization="Bearer secret"))
+    assert status == 200 and body == {"applied": {"channel": 1, "output": "ON"}}
+    assert server.commands == [{"channel": 1, "output": "ON"}]
+
+
+@pytest.mark.parametrize("headers", [
+    JSON,
+    dict(JSON, Authorization="Bearer wrong"),
+    dict(JSON, Authorization="Basic secret"),
+])
+def test_control_rejects_missing_or_wrong_token(server, headers):
+    status, body = post_control(server, headers)
+    assert status == 401 and "token" in body["error"]
+    assert server.commands == []
+
+
+@pytest.mark.parametrize("content_type", ["text/plain", "application/x-www-form-urlencoded", None])
+def test_control_rejects_other_content_types(server, content_type):
+    headers = {"Authorization": "Bearer secret"}
+    if content_type is not None:
+        headers["Content-Type"] = content_type
+    status, _ = post_control(server, headers)
+    assert status == 415
+    assert server.commands == []
+
+
+def test_control_rejects_foreign_origin(server):
+    headers = dict(JSON, Authorization="Bearer secret", Origin="http://evil.example")
+    status, body = post_control(server, headers)
+    assert status == 403 and "evil.example" in body["error"]
+    assert server.commands == []
+
+    # The server's own origin is allowed
+    status, _ = post_control(server, dict(headers, Origin=f"http://127.0.0.1:{server.port}"))
+    assert status == 200
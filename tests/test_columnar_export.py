@@ -0,0 +1,28 @@
+import json
+
+import numpy as np
+
+from columnar_export import export_rows
+
+
+def test_npz_export_holds_padded_columns_and_metadata(tmp_path):
+    path = str(tmp_path / "session.npz")
+    chunks = [np.array([[1, 100.0, 5.0, 0.1, 2.0], [2, 100.5, 3.3, 0.2, 1.5]]),
+              np.array([[1, 101.0, 5.1, 0.1, 2.1]])]
+    counts = export_rows(iter(chunks), path, {"exported_from": "/data/log.csv", "start": 100.0})
+    assert counts == {1: 2, 2: 1}
+
+    with np.load(path) as archive:
+        assert sorted(archive.files) == sorted(
+            ["metadata"] + [f"ch{channel}_{quantity}" for channel in (1, 2)
+                            for quantity in ("time", "voltage", "current", "latency_ms")])
+        np.testing.assert_array_equal(archive["ch1_voltage"], [5.0, 5.1])
+        np.testing.assert_array_equal(archive["ch2_time"], [100.5, np.nan])
+        assert json.loads(archive["metadata"][0]) == {"exported_from": "/data/log.csv", "start": 100.0}
+
+
+def test_npz_export_without_metadata(tmp_path):
+    path = str(tmp_path / "session.npz")
+    export_rows([np.array([[1, 100.0, 5.0, 0.1, 2.0]])], path)
+    with np.load(path) as archive:
+        assert json.loads(archive["metadata"][0]) == {}
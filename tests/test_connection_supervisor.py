@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+import pyvisa
+
+import connection_supervisor
+from connection_supervisor import CONNECTED, RECONNECTING, ConnectionSupervisor, classify
+from n67xx_simulator import SimulatedInstrument, SimulatedN67xx
+
+
+@pytest.mark.parametrize("error, kind", [
+    (pyvisa.VisaIOError(pyvisa.constants.VI_ERROR_TMO), "timeout"),
+    (pyvisa.VisaIOError(pyvisa.constants.VI_ERROR_CONN_LOST), "lost"),
+    (pyvisa.VisaIOError(pyvisa.constants.VI_ERROR_IO), "lost"),
+    (ConnectionResetError(), "lost"),
+    (pyvisa.VisaIOError(pyvisa.constants.VI_ERROR_RSRC_LOCKED), None),
+    (ValueError("bad reply"), None),
+])
+def test_classify(error, kind):
+    assert classify(error) == kind
+
+
+class SlowInstrument(SimulatedInstrument):
+    """Holds every MEASure for `delay` seconds, like a long acquisition."""
+
+    def __init__(self, delay):
+        super(SlowInstrument, self).__init__(SimulatedN67xx())
+        self.delay = delay
+
+    def query(self, message):
+        if message.startswith("MEAS"):
+            time.sleep(self.delay)
+        return super(SlowInstrument, self).query(message)
+
+
+def test_heartbeat_waits_for_call_in_flight(monkeypatch):
+    monkeypatch.setattr(connection_supervisor, "HEARTBEAT_SECONDS", 0.05)
+    lock = threading.RLock()
+    supervisor = ConnectionSupervisor(lambda: None, lock)
+    session = supervisor.wrap(SlowInstrument(0.5))
+
+    def long_call():
+        with lock:
+            session.query("MEAS:VOLT? (@1)")
+
+    worker = threading.Thread(target=long_call)
+    worker.start()
+    deadline = time.monotonic() + 0.4
+    while time.monotonic() < deadline:
+        supervisor.heartbeat()
+        assert supervisor.state == CONNECTED
+        time.sleep(0.02)
+    worker.join()
+    with lock:
+        assert session.query("*OPC?").strip() == "1"
+    supervisor.stop()
+
+
+def test_idle_heartbeat_probes_and_stays_connected(monkeypatch):
+    monkeypatch.setattr(connection_supervisor, "HEARTBEAT_SECONDS", 0.0)
+    supervisor = ConnectionSupervisor(lambda: None, threading.RLock())
+    supervisor.wrap(SimulatedInstrument(SimulatedN67xx()))
+    supervisor.heartbeat()
+    supervisor.worker.join(5.0)
+    assert supervisor.state == CONNECTED
+    supervisor.stop()
+
+
+def test_reconnect_after_link_loss():
+    device = SimulatedN67xx()
+    restored = threading.Event()
+    gaps = []
+
+    def on_restored(gap_start, gap_end, attempts):
+        gaps.append((gap_start, gap_end, attempts))
+        restored.set()
+
+    supervisor = ConnectionSupervisor(lambda: SimulatedInstrument(device), threading.RLock(), on_restored=on_restored)
+    session = supervisor.wrap(SimulatedInstrument(device))
+    assert session.query("*OPC?").strip() == "1"
+
+    device.drop_link(0.2)
+    with pytest.raises(pyvisa.VisaIOError):
+        session.query("*OPC?")
+    assert supervisor.state == RECONNECTING
+    # Calls fail at once while the link is down instead of waiting out a timeout
+    with pytest.raises(pyvisa.VisaIOError) as error:
+        session.query("*OPC?")
+    assert error.value.error_code == pyvisa.constants.VI_ERROR_CONN_LOST
+
+    assert restored.wait(10.0)
+    assert supervisor.state == CONNECTED and supervisor.reconnects == 1
+    assert session.query("*OPC?").strip() == "1"
+    gap_start, gap_end, attempts = gaps[0]
+    assert gap_start <= gap_end and attempts >= 1
+    supervisor.stop()
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+import log_archive
+from log_archive import ArchiveReader, SegmentedLogWriter
+
+
+@pytest.fixture
+def archive(tmp_path):
+    directory = tmp_path / "archive"
+    writer = SegmentedLogWriter(str(directory))
+    for row in range(100):
+        writer.write(row % 2 + 1, 1.7e9 + row, 5.0 + row * 0.001, 0.1, 0.002)
+    writer.close()
+    return directory
+
+
+def test_export_csv(archive, tmp_path, capsys):
+    output = tmp_path / "export.csv"
+    log_archive.main(["export", str(archive), str(output), "--channels", "2"])
+    rows = np.loadtxt(output, delimiter=",", skiprows=1)
+    assert len(rows) == 50 and set(rows[:, 0]) == {2}
+    assert "Exported 50 rows" in capsys.readouterr().out
+
+
+def test_failed_csv_export_leaves_no_file(archive, tmp_path, monkeypatch):
+    def failing_rows(self, t0, t1, channels=None):
+        yield np.array([[1, 1.7e9, 5.0, 0.1, 2.0]])
+        raise ValueError("Malformed rows in segment")
+
+    monkeypatch.setattr(ArchiveReader, "iter_rows", failing_rows)
+    output = tmp_path / "export.csv"
+    with pytest.raises(SystemExit):
+        log_archive.main(["export", str(archive), str(output)])
+    assert not output.exists()
+    assert not (tmp_path / "export.csv.tmp").exists()
@@ -0,0 +1,39 @@
+import pytest
+import pyvisa
+
+from n67xx_simulator import write_pyvisa_sim_profile
+
+pytest.importorskip("pyvisa_sim")
+
+
+@pytest.fixture
+def sim(tmp_path):
+    path = tmp_path / "n67xx.yaml"
+    write_pyvisa_sim_profile(str(path), channels=2)
+    manager = pyvisa.ResourceManager(f"{path}@sim")
+    instrument = manager.open_resource("TCPIP::localhost::INSTR", read_termination="\n", write_termination="\n")
+    yield instrument
+    instrument.close()
+    manager.close()
+
+
+def test_profile_answers_identification_and_combined_poll(sim):
+    assert "N6705B" in sim.query("*IDN?")
+    voltage, current = (float(value) for value in sim.query("MEAS:VOLT? (@2);:MEAS:CURR? (@2)").split(";"))
+    assert (voltage, current) == (0.0, 0.0)
+
+
+def test_profile_accepts_panel_setters(sim):
+    for message in ("VOLT 5, (@1)", "CURR 0.25, (@1)", "VOLT:SLEW 9.9e+37, (@1)", "VOLT:PROT 6.5, (@1)",
+                    "CURR:PROT:DEL 0.1, (@1)", "CURR:PROT:STAT ON, (@1)", "OUTP:PROT:CLE, (@1)", "OUTP ON,(@1)"):
+        sim.write(message)
+        assert sim.query("SYST:ERR?").startswith("+0"), message
+    assert float(sim.query("VOLT? (@1)")) == 5.0
+    assert float(sim.query("CURR? (@1)")) == 0.25
+    assert float(sim.query("VOLT:PROT? (@1)")) == 6.5
+    assert float(sim.query("VOLT? (@2)")) == 0.0
+
+
+def test_profile_output_follows_numeric_setter(sim):
+    sim.write("OUTP 1,(@2)")
+    assert sim.query("OUTP? (@2)") == "1"
@@ -0,0 +1,83 @@
+from n67xx_simulator import SimulatedInstrument, SimulatedN67xx
+import pytest
+
+from profiles import ProfileStore, read_state, restore_message, states_match
+
+
+def settings(voltage, current, output, slew=1000.0, ovp=20.0, ocp=False, ocp_delay=0.05):
+    return {"voltage": voltage, "current": current, "slew": slew, "ovp": ovp, "ocp": ocp,
+            "ocp_delay": ocp_delay, "output": output}
+
+
+STATE = {1: settings(5.0, 0.5, True), 2: settings(3.3, 0.5, False), 3: settings(5.0, 1.0, True, ocp=True)}
+OFF = {channel: settings(0.0, 0.1, False, ovp=10.0) for channel in STATE}
+
+
+def test_restore_message_groups_channels_and_orders_output():
+    commands = restore_message(STATE, OFF).split(";:")
+    assert commands == [
+        "OUTP OFF,(@2)",
+        "VOLT:PROT 20,(@1,2,3)",
+        "CURR 0.5,(@1,2)", "CURR 1,(@3)",
+        "CURR:PROT:DEL 0.05,(@1,2,3)",
+        "CURR:PROT:STAT OFF,(@1,2)", "CURR:PROT:STAT ON,(@3)",
+        "VOLT:SLEW 1000,(@1,2,3)",
+        "VOLT 5,(@1,3)", "VOLT 3.3,(@2)",
+        "OUTP ON,(@1,3)",
+    ]
+
+
+def test_restore_message_round_trips_through_simulator():
+    instrument = SimulatedInstrument(SimulatedN67xx())
+    channels = sorted(STATE)
+    current = read_state(instrument, channels)
+    assert not states_match(STATE, current)
+    instrument.write(restore_message(STATE, current))
+    assert instrument.query("SYST:ERR?").startswith("+0,")
+    assert states_match(STATE, read_state(instrument, channels))
+
+
+def test_restore_message_lowers_ovp_after_voltage():
+    # An output staying on while its OVP drops below the present setpoint is switched off for the change
+    commands = restore_message({1: settings(3.3, 0.5, True, ovp=5.0), 2: settings(4.0, 0.5, True, ovp=5.0)},
+                               {1: settings(12.0, 0.5, True, ovp=20.0), 2: settings(3.0, 0.5, True, ovp=20.0)})
+    commands = commands.split(";:")
+    assert commands[0] == "OUTP OFF,(@1)"
+    assert commands.index("VOLT 3.3,(@1)") < commands.index("VOLT:PROT 5,(@1,2)")
+    assert commands.index("VOLT 4,(@2)") < commands.index("VOLT:PROT 5,(@1,2)")
+    assert commands[-1] == "OUTP ON,(@1,2)"
+
+
+@pytest.mark.parametrize("start, profile", [
+    (settings(12.0, 2.0, True, ovp=20.0), settings(3.3, 2.0, True, ovp=5.0)),
+    (settings(3.3, 2.0, True, ovp=5.0), settings(12.0, 2.0, True, ovp=20.0)),
+    (settings(3.0, 2.0, True, ovp=20.0), settings(4.0, 2.0, True, ovp=5.0)),
+])
+def test_restore_on_simulator_does_not_trip_ovp(tmp_path, start, profile):
+    instrument = SimulatedInstrument(SimulatedN67xx())
+    store = ProfileStore(str(tmp_path / "profiles.json"))
+    store.profiles["bench"] = {"idn": None, "slot": None, "state": {"1": profile}}
+    instrument.write(restore_message({1: start}, read_state(instrument, [1])))
+    assert states_match({1: start}, read_state(instrument, [1]))
+
+    assert store.restore(instrument, "bench")[0] == "write"
+    assert instrument.query("STAT:QUES:COND? (@1)").strip() == "0"
+    assert states_match({1: profile}, read_state(instrument, [1]))
+
+
+def test_states_match_tolerance():
+    expected = {1: settings(5.0, 0.5, True)}
+    assert states_match(expected, {1: dict(expected[1], voltage=5.0 + 1e-7)})
+    assert not states_match(expected, {1: dict(expected[1], voltage=5.001)})
+    # Small values are compared against an absolute tolerance
+    assert states_match({1: {"current": 0.0}}, {1: {"current": 1e-7}})
+
+
+def test_states_match_booleans_and_missing_settings():
+    expected = {1: settings(5.0, 0.5, True)}
+    assert states_match(expected, {1: dict(expected[1], output=1.0)})
+    assert not states_match(expected, {1: dict(expected[1], output=False)})
+    assert not states_match(expected, {1: {"voltage": 5.0}})
+    assert not states_match(expected, {2: expected[1]})
+    # Extra channels in the readback do not matter
+    assert states_match(expected, {1: expected[1], 2: settings(0.0, 0.0, False)})
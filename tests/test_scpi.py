@@ -0,0 +1,30 @@
+import pytest
+
+from n67xx_simulator import SimulatedInstrument, SimulatedN67xx
+from scpi import normalize_header
+
+
+@pytest.mark.parametrize("header, expected", [
+    (":SOURce:VOLTage:LEVel:IMMediate:AMPLitude", "VOLT"),
+    ("VOLT:LEV?", "VOLT?"),
+    ("CURRent:PROTection:DELay?", "CURR:PROT:DEL?"),
+    ("MEASure:ARRay:VOLTage:DC?", "MEAS:ARR:VOLT?"),
+    ("MEAS:SCALar:CURRent:DC?", "MEAS:CURR?"),
+    ("FETCh:SCAL:VOLT?", "FETC:VOLT?"),
+    ("*idn?", "*IDN?"),
+])
+def test_normalize_header(header, expected):
+    assert normalize_header(header) == expected
+
+
+@pytest.mark.parametrize("message", [
+    "MEASure:ARRay:VOLTage:DC? (@1)",
+    "MEAS:SCAL:VOLT:DC? (@1)",
+    "MEAS:CURR:DC? (@1)",
+    "SOURce:VOLTage:LEVel:IMMediate:AMPLitude? (@1)",
+])
+def test_simulator_accepts_optional_nodes(message):
+    instrument = SimulatedInstrument(SimulatedN67xx())
+    instrument.write("VOLT:LEV:IMM 2,(@1);:OUTP ON,(@1)")
+    assert instrument.query(message).strip()
+    assert instrument.query("SYST:ERR?").startswith("+0,")
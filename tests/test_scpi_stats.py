@@ -0,0 +1,52 @@
+import pytest
+
+from n67xx_simulator import SimulatedInstrument, SimulatedN67xx
+from scpi_stats import InstrumentedSession, ScpiStats
+
+
+class DelayedQuerySession:
+    """Records the arguments query() gets, like pyvisa's query(message, delay=None)."""
+
+    def __init__(self):
+        self.calls = []
+
+    def query(self, message, delay=None):
+        self.calls.append((message, delay))
+        if message.startswith("BAD"):
+            raise OSError("link down")
+        return "+5.000000E+00"
+
+
+@pytest.mark.parametrize("enabled", [False, True])
+def test_query_forwards_arguments(enabled):
+    session = DelayedQuerySession()
+    stats = ScpiStats(enabled=enabled)
+    instrumented = InstrumentedSession(session, stats)
+    assert instrumented.query("VOLT? (@1)", 0.01) == "+5.000000E+00"
+    assert instrumented.query("VOLT? (@1)", delay=0.02) == "+5.000000E+00"
+    assert session.calls == [("VOLT? (@1)", 0.01), ("VOLT? (@1)", 0.02)]
+    assert ("VOLT?" in stats.snapshot()["commands"]) == enabled
+
+
+def test_query_records_bytes_and_errors():
+    stats = ScpiStats(enabled=True)
+    instrumented = InstrumentedSession(DelayedQuerySession(), stats)
+    instrumented.query("VOLT? (@1)")
+    with pytest.raises(OSError):
+        instrumented.query("BAD?")
+    commands = stats.snapshot()["commands"]
+    assert commands["VOLT?"]["count"] == 1
+    assert commands["VOLT?"]["bytes_sent"] == len("VOLT? (@1)")
+    assert commands["VOLT?"]["bytes_received"] == len("+5.000000E+00")
+    assert commands["BAD?"]["errors"] == 1
+
+
+def test_write_and_read_are_timed_as_one_query():
+    stats = ScpiStats(enabled=True)
+    instrumented = InstrumentedSession(SimulatedInstrument(SimulatedN67xx()), stats)
+    instrumented.write("MEAS:VOLT:DC? (@1)")
+    instrumented.read()
+    instrumented.write("VOLT 1,(@1)")
+    commands = stats.snapshot()["commands"]
+    assert commands["MEAS:VOLT?"]["count"] == 1
+    assert commands["VOLT"]["count"] == 1
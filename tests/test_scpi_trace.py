@@ -0,0 +1,76 @@
+import pytest
+import pyvisa
+
+from n67xx_simulator import SimulatedInstrument, SimulatedN67xx
+from scpi_trace import RecordingSession, ReplayInstrument, SessionRecorder
+
+
+class DelayedQuerySession(SimulatedInstrument):
+    """Simulator that takes pyvisa's query(message, delay=None) and remembers the delays."""
+
+    def __init__(self):
+        super(DelayedQuerySession, self).__init__(SimulatedN67xx())
+        self.delays = []
+
+    def query(self, message, delay=None):
+        self.delays.append(delay)
+        return super(DelayedQuerySession, self).query(message)
+
+
+def record(path, exchange):
+    recorder = SessionRecorder()
+    session = RecordingSession(DelayedQuerySession(), recorder)
+    recorder.start(str(path), {"address": "SIM"})
+    responses = exchange(session)
+    recorder.stop()
+    return session, responses
+
+
+def exchange(session):
+    session.write("VOLT 2.5,(@1);:OUTP ON,(@1)")
+    responses = [session.query("*IDN?"), session.query("VOLT? (@1)", 0.001),
+                 session.query("MEAS:VOLT? (@1);:MEAS:CURR? (@1)", delay=0.001)]
+    session.write("MEAS:CURR? (@2)")
+    responses.append(session.read())
+    return responses
+
+
+def test_record_replay_round_trip(tmp_path):
+    path = tmp_path / "session.kstrace.gz"
+    session, recorded = record(path, exchange)
+    assert session._session.delays == [None, 0.001, 0.001]
+
+    replay = ReplayInstrument(str(path))
+    assert replay.metadata["address"] == "SIM"
+    assert exchange(replay) == recorded
+    assert (replay.matched, replay.unmatched, replay.skipped) == (5, 0, 0)
+    replay.close()
+
+
+def test_replay_answers_unmatched_query_from_last_response(tmp_path):
+    path = tmp_path / "session.kstrace.gz"
+    _, recorded = record(path, exchange)
+    replay = ReplayInstrument(str(path))
+    exchange(replay)
+    assert replay.query("VOLT? (@1)") == recorded[1]
+    assert replay.unmatched == 1
+    with pytest.raises(pyvisa.VisaIOError):
+        replay.query("CURR? (@3)")
+    replay.close()
+
+
+def test_recorded_error_is_replayed(tmp_path):
+    path = tmp_path / "session.kstrace.gz"
+
+    def failing(session):
+        session._session.device.drop_link(1.0)
+        with pytest.raises(pyvisa.VisaIOError) as error:
+            session.query("*IDN?")
+        return error.value.error_code
+
+    _, code = record(path, failing)
+    replay = ReplayInstrument(str(path))
+    with pytest.raises(pyvisa.VisaIOError) as error:
+        replay.query("*IDN?")
+    assert error.value.error_code == code
+    replay.close()
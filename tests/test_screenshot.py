@@ -0,0 +1,97 @@
+import hashlib
+import io
+import threading
+
+import pytest
+
+from n67xx_simulator import SimulatedInstrument, SimulatedN67xx, render_screen
+from screenshot import BlockFormatError, ScreenshotCapture, read_ieee_block
+
+
+class ChunkedInstrument:
+    """Hands out canned bytes through read_chunk, like a socket that delivers them piecewise."""
+
+    def __init__(self, data, piece=3):
+        self.data = data
+        self.piece = piece
+
+    def read_chunk(self, size):
+        data, self.data = self.data[:min(size, self.piece)], self.data[min(size, self.piece):]
+        return data, not self.data
+
+
+def read_block(instrument, **kwargs):
+    out = io.BytesIO()
+    written = read_ieee_block(instrument, out, **kwargs)
+    assert written == len(out.getvalue())
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("indefinite", [False, True])
+@pytest.mark.parametrize("chunk_size", [7, 64 * 1024])
+def test_screen_dump_from_simulator(indefinite, chunk_size):
+    image = render_screen("PNG", (320, 240))
+    instrument = SimulatedInstrument(SimulatedN67xx(screen_data={"PNG": image}, indefinite_blocks=indefinite))
+    instrument.write("HCOP:SDUM:DATA:FORM PNG")
+    instrument.write("HCOP:SDUM:DATA?")
+    assert read_block(instrument, chunk_size=chunk_size) == image
+
+
+def test_definite_block_keeps_newlines_and_drops_terminator():
+    assert read_block(ChunkedInstrument(b"#15ab\ncd\n")) == b"ab\ncd"
+
+
+def test_leading_whitespace_is_skipped():
+    assert read_block(ChunkedInstrument(b"\r\n #13xyz\n")) == b"xyz"
+
+
+def test_indefinite_block_keeps_inner_newlines():
+    assert read_block(ChunkedInstrument(b"#0ab\ncd\n", piece=2)) == b"ab\ncd"
+
+
+def test_digest_covers_payload():
+    digest = hashlib.sha256()
+    read_ieee_block(ChunkedInstrument(b"#210abcdefghij\n"), io.BytesIO(), digest=digest)
+    assert digest.hexdigest() == hashlib.sha256(b"abcdefghij").hexdigest()
+
+
+@pytest.mark.parametrize("data", [
+    b"abc",  # No '#'
+    b"#x12",  # Bad digit count
+    b"#2a1xyz",  # Bad length field
+    b"#15ab",  # Truncated payload
+    b"#",  # Truncated header
+])
+def test_malformed_blocks(data):
+    with pytest.raises(BlockFormatError):
+        read_block(ChunkedInstrument(data))
+
+
+def make_capture(tmp_path):
+    instrument = SimulatedInstrument(SimulatedN67xx())
+    return ScreenshotCapture(lambda: instrument, threading.RLock(), directory=str(tmp_path))
+
+
+def test_manual_capture_keeps_unchanged_frame(tmp_path):
+    capture = make_capture(tmp_path)
+    first = capture.capture()
+    second = capture.capture()
+    assert not second.duplicate and second.path == first.path and second.digest == first.digest
+    # Only the periodic worker asks for unchanged frames to be skipped
+    assert capture.capture(timestamped=True, skip_duplicate=True).duplicate
+
+
+def test_restart_leaves_one_periodic_worker(tmp_path):
+    capture = make_capture(tmp_path)
+    errors = []
+    capture.start_periodic(60.0, lambda result: None, errors.append)
+    old = capture._periodic_thread
+    capture.stop_periodic()
+    capture.start_periodic(60.0, lambda result: None, errors.append)
+    new = capture._periodic_thread
+    old.join(5.0)
+    assert not old.is_alive()
+    assert new is not old and capture.is_periodic_running()
+    capture.stop_periodic()
+    new.join(5.0)
+    assert not new.is_alive() and not errors
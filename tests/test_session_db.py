@@ -0,0 +1,96 @@
+import threading
+
+import pytest
+
+import session_db
+from session_db import SessionDatabase
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "sessions.db")
+
+
+def test_sessions_sharing_a_file_get_their_own_ids(path):
+    first = SessionDatabase(path)
+    second = SessionDatabase(path)
+    first.start_session(address="SIM", idn="first")
+    second.start_session(address="SIM", idn="second")
+    for n in range(100):
+        first.write(1, 1000.0 + n, 5.0, 0.1, 0.002)
+        second.write(2, 1000.0 + n, 3.3, 0.2)
+    first.log_event("output", 1, "on")
+    assert first.flush() and second.flush()
+    assert {first.session_id, second.session_id} == {1, 2}
+
+    reader = first.connect_reader()
+    counts = dict(reader.execute("SELECT session_id, count(*) FROM samples GROUP BY session_id"))
+    assert counts == {first.session_id: 100, second.session_id: 100}
+    assert reader.execute("SELECT session_id, kind FROM events").fetchall() == [(first.session_id, "output")]
+    reader.close()
+    first.close()
+    second.close()
+
+
+def test_close_ends_session(path):
+    database = SessionDatabase(path)
+    database.start_session()
+    database.write(1, 1000.0, 5.0, 0.1)
+    database.flush()
+    session_id = database.session_id
+    database.close()
+    reader = database.connect_reader()
+    assert reader.execute("SELECT ended IS NOT NULL FROM sessions WHERE id = ?", (session_id,)).fetchone() == (1,)
+    reader.close()
+
+
+def test_failed_row_is_reported_and_the_rest_of_its_batch_written(path):
+    failures = []
+    reported = threading.Event()
+
+    def on_error(error, rows):
+        failures.append((error, rows))
+        reported.set()
+
+    database = SessionDatabase(path, on_error=on_error)
+    database.start_session()
+    database.write(1, 1000.0, 5.0, 0.1)
+    database.log_event(None)  # events.kind is NOT NULL
+    database.log_event("output", 1, "on")
+    database.flush()
+    assert reported.wait(5.0)
+    assert failures[0][1] == 1
+    assert database.lost == 1
+    assert database.written == 3
+    assert database.error is failures[0][0]
+
+    reader = database.connect_reader()
+    session_id = database.session_id
+    assert session_id is not None
+    assert reader.execute("SELECT session_id, kind FROM events").fetchall() == [(session_id, "output")]
+    assert reader.execute("SELECT count(*) FROM samples WHERE session_id = ?", (session_id,)).fetchone() == (1,)
+    reader.close()
+    database.close()
+
+
+def test_rolled_back_session_gets_no_id(path, monkeypatch):
+    # A database-level failure loses the whole batch, including the session row
+    monkeypatch.setitem(session_db._INSERT, "samples", "INSERT INTO missing_table VALUES (?, ?, ?, ?, ?, ?)")
+    database = SessionDatabase(path)
+    database.start_session()
+    database.write(1, 1000.0, 5.0, 0.1)
+    database.flush()
+    assert database.session_id is None
+    assert (database.written, database.lost) == (0, 2)
+    reader = database.connect_reader()
+    assert reader.execute("SELECT count(*) FROM sessions").fetchone() == (0,)
+    reader.close()
+
+    # Later batches are written normally
+    monkeypatch.undo()
+    database.start_session()
+    database.write(1, 1001.0, 5.0, 0.1)
+    database.flush()
+    assert database.session_id == 1
+    assert database.written == 2
+    database.close()
@@ -0,0 +1,97 @@
+import math
+import time
+
+import numpy as np
+import pytest
+
+import session_index
+from session_index import (
+    LAYOUT_EPOCH, LAYOUT_LEGACY, LAYOUT_LEGACY_SINGLE, LogFormatError, SessionIndex, _read_header, parse_rows
+)
+
+
+def write_log(tmp_path, text):
+    path = tmp_path / "log.csv"
+    path.write_bytes(text.encode("ascii"))
+    return str(path)
+
+
+def local_epoch(text):
+    return time.mktime(time.strptime(text, "%Y-%m-%d %H:%M:%S"))
+
+
+@pytest.mark.parametrize("text, layout", [
+    ("Channel,Time,Voltage,Current,Latency\n1,1.5,5,0.1,0.002\n", LAYOUT_EPOCH),
+    ("Channel,Time,Voltage,Current\n1,2026-10-19 14:00:00,5,0.1\n", LAYOUT_LEGACY),
+    # The original panel's header, over rows that still start with the channel
+    ("Time,Voltage,Current\n1,2026-10-19 14:00:00,5,0.1\n", LAYOUT_LEGACY),
+    ("Time,Voltage,Current\n2026-10-19 14:00:00,5,0.1\n", LAYOUT_LEGACY_SINGLE),
+])
+def test_read_header_detects_layout(tmp_path, text, layout):
+    path = write_log(tmp_path, text)
+    assert _read_header(path) == (text.index("\n") + 1, layout)
+
+
+def test_read_header_skips_comments(tmp_path):
+    header = "# address=SIM\n# idn=Keysight\nChannel,Time,Voltage,Current,Latency\n"
+    path = write_log(tmp_path, header + "1,1.5,5,0.1,0.002\n")
+    assert _read_header(path) == (len(header), LAYOUT_EPOCH)
+
+
+@pytest.mark.parametrize("text", ["", "# comment only\n", "Voltage;Current\n1;2\n"])
+def test_read_header_rejects_other_files(tmp_path, text):
+    with pytest.raises(LogFormatError):
+        _read_header(write_log(tmp_path, text))
+
+
+def test_parse_rows_epoch():
+    rows = parse_rows(b"1,100.5,5,0.1,0.002\r\n# gap 3.0 s: reconnect\n2,101.5,3.3,0.2,\n")
+    assert rows.shape == (2, 5)
+    np.testing.assert_array_equal(rows[0], [1, 100.5, 5, 0.1, 0.002])
+    np.testing.assert_array_equal(rows[1, :4], [2, 101.5, 3.3, 0.2])
+    assert math.isnan(rows[1, 4])
+
+
+def test_parse_rows_empty():
+    assert parse_rows(b"").shape == (0, 5)
+
+
+def test_parse_rows_legacy():
+    rows = parse_rows(b"3,2026-10-19 14:00:00,5,0.1\n3,2026-10-19 14:00:01,5.5,0.2\n", LAYOUT_LEGACY)
+    np.testing.assert_array_equal(rows[:, 0], [3, 3])
+    np.testing.assert_array_equal(rows[:, 1], [local_epoch("2026-10-19 14:00:00"), local_epoch("2026-10-19 14:00:01")])
+    np.testing.assert_array_equal(rows[:, 2:4], [[5, 0.1], [5.5, 0.2]])
+    assert np.isnan(rows[:, 4]).all()
+
+
+def test_parse_rows_legacy_single_channel():
+    rows = parse_rows(b"2026-10-19 14:00:00,5,0.1\n", LAYOUT_LEGACY_SINGLE)
+    np.testing.assert_array_equal(rows[0, :4], [1, local_epoch("2026-10-19 14:00:00"), 5, 0.1])
+
+
+@pytest.mark.parametrize("data, layout", [
+    (b"1,100.5,5,0.1,0.002\n1,101.5,5\n", LAYOUT_EPOCH),
+    (b"1,2026-10-19 14:00:00,5\n", LAYOUT_LEGACY),
+    (b"1,yesterday,5,0.1\n", LAYOUT_LEGACY),
+])
+def test_parse_rows_malformed(data, layout):
+    with pytest.raises(LogFormatError):
+        parse_rows(data, layout)
+
+
+def test_export_streams_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_index, "BLOCK_ROWS", 10)
+    monkeypatch.setattr(session_index, "CHUNK_BLOCKS", 2)
+    lines = "".join(f"{row % 4 + 1},{1000 + row * 0.25:.6f},{5 + row * 0.001:.3f},0.1,2.0\n" for row in range(200))
+    index = SessionIndex.open(write_log(tmp_path, "Channel,Time,Voltage,Current,Latency_ms\n" + lines))
+    expected = index.read(1005.0, 1040.0, [1, 3])
+
+    def read_everything(*args, **kwargs):
+        raise AssertionError("export must not load the whole range at once")
+
+    monkeypatch.setattr(index, "read", read_everything)
+    path = str(tmp_path / "export.csv")
+    assert index.export(path, 1005.0, 1040.0, [1, 3]) == len(expected)
+    exported = np.loadtxt(path, delimiter=",", comments="#", skiprows=2)
+    np.testing.assert_allclose(exported, expected)
+    assert not (tmp_path / "export.csv.tmp").exists()
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+import sweep
+from n67xx_simulator import SimulatedInstrument, SimulatedN67xx
+from sweep import SweepDefinition, SweepEngine, SweepError, reduce_steps
+
+
+def test_reduce_steps_averages_aperture_window():
+    # 4 samples per step; the first 2 fall in the settle time
+    samples = np.array([10 * step + position for step in range(3) for position in range(4)], dtype=float)
+    np.testing.assert_allclose(reduce_steps(samples, 1.0, 3, 2.0, 4.0), [2.5, 12.5, 22.5])
+
+
+def test_reduce_steps_keeps_leading_axes():
+    samples = np.arange(2 * 3 * 8, dtype=float).reshape(2, 3, 8)
+    reduced = reduce_steps(samples, 1.0, 2, 2.0, 4.0)
+    assert reduced.shape == (2, 3, 2)
+    np.testing.assert_allclose(reduced, (samples[..., [2, 6]] + samples[..., [3, 7]]) / 2)
+
+
+def test_reduce_steps_without_samples_in_window_takes_last_sample():
+    # Aperture shorter than the sample interval: no sample lands after the settle time
+    samples = np.array([10.0, 11.0, 12.0, 13.0])
+    np.testing.assert_allclose(reduce_steps(samples, 1.0, 2, 1.4, 1.5), [11.0, 12.0])
+
+
+def test_reduce_steps_ignores_samples_past_last_step():
+    samples = np.array([1.0, 1.0, 2.0, 2.0, 99.0, 99.0])
+    np.testing.assert_allclose(reduce_steps(samples, 1.0, 2, 0.0, 2.0), [1.0, 2.0])
+
+
+def test_sweep_on_simulator_restores_state():
+    instrument = SimulatedInstrument(SimulatedN67xx(loads={1: 10.0, 2: 5.0}))
+    instrument.write("VOLT 1.5,(@1:2);:CURR 2,(@1:2)")
+    engine = SweepEngine(instrument)
+    definition = SweepDefinition(0.0, 2.0, 21, 0.001, [1, 2], aperture=0.001)
+    results = engine.run(definition)
+
+    assert engine.round_trips == 5  # Readback, arm, trigger, fetch, restore
+    setpoints = np.linspace(0.0, 2.0, 21)
+    for channel, load in ((1, 10.0), (2, 5.0)):
+        result = results[channel]
+        np.testing.assert_allclose(result.setpoint, setpoints)
+        np.testing.assert_allclose(result.voltage, setpoints, atol=1e-6)
+        np.testing.assert_allclose(result.current, setpoints / load, atol=1e-6)
+        assert np.all(np.diff(result.time) > 0)
+    restored = instrument.query("VOLT? (@1:2);:CURR? (@1:2)").strip()
+    assert restored == "+1.500000E+00,+1.500000E+00;+2.000000E+00,+2.000000E+00"
+    assert all(instrument.device.channels[channel].voltage_mode == "FIX" for channel in (1, 2))
+
+
+class FailingInstrument:
+    """Reads back a state, never arms, and fails every restore."""
+
+    timeout = 5000
+
+    def __init__(self):
+        self.writes = []
+
+    def query(self, message):
+        if message.startswith("VOLT?"):
+            return "1;0.1;1"
+        if message == "SYST:ERR?":
+            return '-113,"Undefined header"'
+        return "0"
+
+    def write(self, message):
+        self.writes.append(message)
+        if message.startswith("VOLT:MODE FIX"):
+            raise OSError("link down")
+
+
+def test_restore_failure_does_not_hide_sweep_error(monkeypatch, caplog):
+    monkeypatch.setattr(sweep, "ARM_TIMEOUT", 0.02)
+    instrument = FailingInstrument()
+    with pytest.raises(SweepError, match="not waiting for a trigger"):
+        SweepEngine(instrument).run(SweepDefinition(0.0, 1.0, 5, 0.001, [1]))
+    assert not any(message == "*TRG" for message in instrument.writes)
+    assert "Could not restore" in caplog.text
+
+
+def test_failed_restore_is_kept_for_retry(monkeypatch):
+    monkeypatch.setattr(sweep, "ARM_TIMEOUT", 0.02)
+    instrument = FailingInstrument()
+    engine = SweepEngine(instrument)
+    with pytest.raises(SweepError):
+        engine.run(SweepDefinition(0.0, 1.0, 5, 0.001, [1]))
+    assert engine.unrestored == {1: (1.0, 0.1, True)}
+
+    # Once the link is back the same state can be written again
+    instrument.write = instrument.writes.append
+    engine.restore(engine.unrestored)
+    assert instrument.writes[-1] == "VOLT:MODE FIX,(@1);:CURR 0.1,(@1);:VOLT 1,(@1);:OUTP ON,(@1)"
+
+
+def test_successful_sweep_leaves_nothing_to_restore():
+    engine = SweepEngine(SimulatedInstrument(SimulatedN67xx()))
+    engine.run(SweepDefinition(0.0, 1.0, 5, 0.001, [1], aperture=0.001))
+    assert engine.unrestored is None
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+from PyQt5.QtGui import QPalette  # noqa: E402
+from PyQt5.QtWidgets import QApplication, QLabel  # noqa: E402
+
+from view_model import ViewModel  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+class RecordingLabel:
+    """Counts the setter calls that reach the widget."""
+
+    def __init__(self):
+        self.calls = []
+
+    def setText(self, text):
+        self.calls.append(("text", text))
+
+    def setEnabled(self, enabled):
+        self.calls.append(("enabled", enabled))
+
+
+def test_flush_applies_only_changes(app):
+    view = ViewModel()
+    label = RecordingLabel()
+    view.set_text(label, "5.000 V")
+    view.set_text(label, "5.001 V")  # Replaces the pending value; only the last one is drawn
+    view.set_enabled(label, False)
+    assert view.frame_timer.isActive()
+    assert label.calls == []
+
+    view.flush()
+    assert label.calls == [("text", "5.001 V"), ("enabled", False)]
+    assert view.applied == 2
+
+    view.set_text(label, "5.001 V")  # Already on screen
+    view.set_enabled(label, False)
+    assert view.skipped == 2 and not view.pending
+    view.flush()
+    assert len(label.calls) == 2
+
+
+def test_value_changed_back_before_flush_is_not_redrawn(app):
+    view = ViewModel()
+    label = RecordingLabel()
+    view.set_text(label, "ON")
+    view.flush()
+    view.set_text(label, "OFF")
+    view.set_text(label, "ON")
+    view.flush()
+    assert label.calls == [("text", "ON")]
+
+
+def test_indicator_palette_set_only_on_change(app):
+    view = ViewModel()
+    first, second = QLabel(), QLabel()
+    view.init_indicator(first, "red")
+    view.init_indicator(second, "red")
+    view.set_indicator(first, "red")
+    assert view.skipped == 1
+    view.set_indicator(first, "green")
+    view.set_indicator(second, "green")
+    view.flush()
+    assert first.palette().color(QPalette.Window).name() == "#008000"
+    assert first.autoFillBackground()
+    assert view.applied == 2
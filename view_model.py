@@ -0,0 +1,98 @@
+"""Change-only widget updates coalesced to the display refresh rate.
+
+The panel pushes the state it wants shown (LED text, indicator colours,
+button labels) into a ViewModel from any thread.  The ViewModel remembers
+the last value rendered for every widget, drops updates that would not
+change anything, and applies the rest together at most once per frame.
+
+Indicator colours are switched with cached QPalettes instead of
+setStyleSheet, which would re-parse the style sheet and re-polish the
+widget on every call.
+"""
+import threading
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from PyQt5.QtGui import QColor, QPalette
+
+FRAME_INTERVAL_MS = 16  # ~60 Hz
+
+_palettes = {}
+
+
+def indicator_palette(color):
+    palette = _palettes.get(color)
+    if palette is None:
+        palette = QPalette()
+        palette.setColor(QPalette.Window, QColor(color))
+        _palettes[color] = palette
+    return palette
+
+
+class ViewModel(QObject):
+    _flush_requested = pyqtSignal()
+
+    def __init__(self, parent=None, frame_interval_ms=FRAME_INTERVAL_MS):
+        super(ViewModel, self).__init__(parent)
+        self.rendered = {}  # (widget, property) -> value currently on screen
+        self.pending = {}  # (widget, property) -> value waiting for the next frame
+        self.lock = threading.Lock()
+        self.applied = 0
+        self.skipped = 0
+
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setSingleShot(True)
+        self.frame_timer.setInterval(frame_interval_ms)
+        self.frame_timer.timeout.connect(self.flush)
+        # Queued across threads, so worker threads can schedule a frame safely
+        self._flush_requested.connect(self._schedule)
+
+    def _set(self, widget, name, value):
+        key = (widget, name)
+        with self.lock:
+            if self.pending.get(key, self.rendered.get(key)) == value:
+                self.skipped += 1
+                return
+            schedule = not self.pending
+            self.pending[key] = value
+        if schedule:
+            self._flush_requested.emit()
+
+    def _schedule(self):
+        if not self.frame_timer.isActive():
+            self.frame_timer.start()
+
+    def init_indicator(self, widget, color):
+        # Palette colours only show when the widget paints its own background
+        widget.setAutoFillBackground(True)
+        widget.setPalette(indicator_palette(color))
+        self.rendered[(widget, "indicator")] = color
+
+    def set_text(self, widget, text):
+        self._set(widget, "text", text)
+
+    def set_indicator(self, widget, color):
+        self._set(widget, "indicator", color)
+
+    def set_style(self, widget, style_sheet):
+        # For widgets whose look must stay style-sheet driven; still only applied on change
+        self._set(widget, "style", style_sheet)
+
+    def set_enabled(self, widget, enabled):
+        self._set(widget, "enabled", enabled)
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for (widget, name), value in pending.items():
+            if self.rendered.get((widget, name)) == value:
+                continue
+            if name == "text":
+                widget.setText(value)
+            elif name == "indicator":
+                widget.setPalette(indicator_palette(value))
+            elif name == "style":
+                widget.setStyleSheet(value)
+            elif name == "enabled":
+                widget.setEnabled(value)
+            self.rendered[(widget, name)] = value
+            self.applied += 1